@@ -1,196 +1,659 @@
+import asyncio
+import hashlib
 import os
 import json
-import requests
+import re
+import threading
+import weakref
 from dotenv import load_dotenv
+from circuit_breaker import CircuitBreaker, parse_retry_after
+from metrics import Counter
+from response_cache import ResponseCache
+from rule_engine import RuleEngine
+from safe_math import math_evaluator
+
+PROVIDER_ERRORS = Counter('provider_errors_total', "Failed AI provider calls by kind: timeout, rate_limited, client_error or error", ['provider', 'kind'])
+
+GROQ_MODEL = "llama-3.1-8b-instant"  # Current Groq model
+GROQ_SYSTEM_PROMPT = "You are a helpful AI assistant. Provide concise and accurate answers."
+HUGGINGFACE_API_URL = "https://api-inference.huggingface.co/models/microsoft/DialoGPT-large"
+
+# A binary operator after a number or ')': '3' or '-3' alone is not a calculation
+MATH_OPERATOR = re.compile(r'[\d.)]\s*[-+*/]')
+# Words around an expression that do not make the message any less of a calculation
+MATH_FILLER_WORDS = frozenset(['calculate', 'compute', 'solve', 'what', 'whats', "what's", 'is', 'math', 'equals', 'please'])
+# Share of the message an expression must take for a confident answer
+MATH_EXPRESSION_SHARE = 0.5
+
+# Rules for get_free_ai_response, in priority order (see rule_engine.py for the format).
+# The confidence says how well a canned answer serves the question: high for small
+# talk, low for topic overviews that an AI provider would answer better. Small talk
+# is only confident when nothing else is said ("hi, explain recursion" is a question).
+FREE_AI_RULES = [
+    {
+        "name": "greetings",
+        "confidence": 0.9,
+        "max_other_words": 0,
+        "filler_words": ['everyone', 'friend', 'buddy', 'bot', 'chatbot', 'good', 'day', 'yo'],
+        "keywords": ['hello', 'hi', 'hey', 'good morning', 'good afternoon', 'good evening'],
+        "response": "Hello! I'm here to help you with questions, math, programming, and more. What would you like to know?"
+    },
+    {
+        "name": "goodbye",
+        "confidence": 0.9,
+        "max_other_words": 0,
+        "filler_words": ['later', 'soon', 'tomorrow', 'friend', 'bot', 'chatbot', 'take', 'care',
+                         'good', 'day', 'night', 'thanks', 'thank', 'everything'],
+        "keywords": ['bye', 'goodbye', 'see you', 'farewell'],
+        "response": "Goodbye! It was nice chatting with you. Feel free to come back anytime you have questions!"
+    },
+    {
+        "name": "thanks",
+        "confidence": 0.9,
+        "max_other_words": 0,
+        "filler_words": ['lot', 'much', 'help', 'answer', 'answers', 'explanation', 'info', 'information',
+                         'great', 'awesome', 'nice', 'good', 'really', 'everything'],
+        "keywords": ['thank you', 'thanks', 'appreciate'],
+        "response": "You're very welcome! I'm happy I could help. Is there anything else you'd like to know?"
+    },
+    {
+        "name": "math",
+        "keywords": ['calculate', 'math', '+', '-', '*', '/', 'equals', 'plus', 'minus', 'times', 'divided'],
+        # 'add' marks a word problem, but alone (e.g. "address") does not make a message math
+        "handler_keywords": ['add'],
+        "max_words": 10,
+        "handler": "math"
+    },
+    {
+        "name": "programming",
+        "confidence": 0.3,
+        "keywords": ['python', 'code', 'programming', 'function', 'variable', 'loop', 'if', 'javascript', 'html', 'css'],
+        "branches": [
+            {
+                "keywords": ['python'],
+                "branches": [
+                    {"keywords": ['function'], "response": "In Python, you create functions with 'def'. For example:\n\ndef greet(name):\n    return f'Hello, {name}!'\n\nWhat specific aspect of Python functions would you like to know?"},
+                    {"keywords": ['loop'], "response": "Python has two main loops:\n• for loop: for item in list:\n• while loop: while condition:\n\nWhat type of loop are you interested in?"},
+                    {"keywords": ['variable'], "response": "In Python, variables are simple: name = 'John', age = 25, is_student = True. Python automatically detects the type!"},
+                    {"response": "Python is a versatile programming language! Are you interested in basics, functions, loops, data structures, or something specific?"}
+                ]
+            },
+            {"keywords": ['javascript'], "response": "JavaScript is great for web development! It runs in browsers and servers. What aspect interests you - basics, functions, DOM manipulation, or frameworks?"},
+            {"keywords": ['html'], "response": "HTML structures web pages with tags like <div>, <p>, <h1>. What HTML concept would you like to learn about?"},
+            {"keywords": ['css'], "response": "CSS styles web pages! You can change colors, layouts, fonts and more. What CSS topic interests you?"},
+            {"response": "Programming is exciting! Which language or concept would you like to explore - Python, JavaScript, HTML, CSS, or something else?"}
+        ]
+    },
+    {
+        "name": "science",
+        "confidence": 0.3,
+        "keywords": ['science', 'physics', 'chemistry', 'biology', 'astronomy', 'atoms', 'molecules'],
+        "branches": [
+            {"keywords": ['physics'], "response": "Physics studies matter, energy, and motion! Topics include mechanics, electricity, magnetism, and quantum physics. What physics concept interests you?"},
+            {"keywords": ['chemistry'], "response": "Chemistry explores atoms, molecules, and reactions! It covers elements, compounds, acids, bases, and chemical bonds. What would you like to know?"},
+            {"keywords": ['biology'], "response": "Biology studies living things - cells, genetics, evolution, ecosystems, and how life works! What biological topic interests you?"},
+            {"keywords": ['astronomy'], "response": "Astronomy explores space - planets, stars, galaxies, and the universe! Are you curious about our solar system, distant galaxies, or something specific?"},
+            {"response": "Science is amazing! It helps us understand the world. Which field interests you - physics, chemistry, biology, astronomy, or earth science?"}
+        ]
+    },
+    {
+        "name": "technology",
+        "confidence": 0.3,
+        "keywords": ['computer', 'technology', 'internet', 'ai', 'artificial intelligence', 'machine learning'],
+        "branches": [
+            {"keywords": ['ai', 'artificial intelligence'], "response": "AI is technology that makes computers smart! It includes machine learning, neural networks, and automation. What aspect of AI interests you?"},
+            {"keywords": ['machine learning'], "response": "Machine learning teaches computers to learn patterns from data without explicit programming. It's used in recommendations, image recognition, and predictions!"},
+            {"response": "Technology shapes our world! From computers and smartphones to AI and the internet. What technology topic would you like to explore?"}
+        ]
+    },
+    {
+        "name": "education",
+        "confidence": 0.3,
+        "keywords": ['learn', 'study', 'education', 'school', 'university', 'homework'],
+        "response": "Learning is wonderful! I can help explain concepts in math, science, programming, and more. What subject would you like to study?"
+    },
+    {
+        "name": "help",
+        "confidence": 0.8,
+        "max_other_words": 0,
+        "filler_words": ['need', 'please', 'want', 'know', 'options', 'commands', 'list'],
+        "keywords": ['help', 'what can you do', 'capabilities', 'features'],
+        "response": "I can help with:\n• Math calculations and problems\n• Programming concepts (Python, JavaScript, etc.)\n• Science topics (physics, chemistry, biology)\n• General knowledge and explanations\n• Technology questions\n\nWhat would you like to explore?"
+    },
+    {
+        "name": "time",
+        "confidence": 0.5,
+        "keywords": ['time', 'date', 'day', 'today', 'now'],
+        "response": "I don't have access to real-time data, but you can check the time and date on your device. Is there something else I can help you with?"
+    },
+    {
+        "name": "weather",
+        "confidence": 0.5,
+        "keywords": ['weather', 'temperature', 'rain', 'sunny', 'cloudy'],
+        "response": "I don't have access to current weather data. Try checking a weather app or website! Is there something else I can help explain?"
+    },
+    {
+        "name": "small_talk",
+        "confidence": 0.9,
+        "max_other_words": 0,
+        "filler_words": ['today', 'going', 'things', 'life', 'feeling', 'friend', 'bot', 'chatbot'],
+        "keywords": ['how are you', 'how do you do', 'whats up'],
+        "response": "I'm doing great, thank you for asking! I'm here and ready to help with any questions you have. What's on your mind?"
+    },
+    {
+        "name": "what_is",
+        "confidence": 0.2,
+        "keywords": ['what is'],
+        "handler": "what_is"
+    },
+    {
+        "name": "how_to",
+        "confidence": 0.1,
+        "keywords": ['how to'],
+        "response": "I'd love to help you learn how to do something! I'm great with programming tutorials, math problem-solving steps, and explaining scientific processes. What specifically would you like to learn how to do?"
+    },
+    {
+        "name": "why",
+        "confidence": 0.1,
+        "keywords": ['why'],
+        "response": "That sounds like a fascinating question! I enjoy explaining the 'why' behind things, especially in science, math, and technology. Could you be more specific about what you'd like to understand?"
+    },
+    {
+        # Default response - much more engaging
+        "name": "default",
+        "confidence": 0.0,
+        "response": "I'd be happy to help you! I'm particularly good at:\n• Solving math problems\n• Explaining programming concepts\n• Discussing science topics\n• Answering technology questions\n\nWhat would you like to explore together?"
+    }
+]
+
+def expression_share(prompt, expression):
+    """Fraction of the message, not counting filler words like 'calculate', taken up by the expression"""
+    rest = sum(len(word) for word in prompt.lower().split() if word.strip('?!:.,=') not in MATH_FILLER_WORDS)
+    return len(expression.replace(' ', '')) / rest if rest else 0.0
+
 
 class AIService:
-    def __init__(self):
+    def __init__(self, connect_timeout=None, read_timeout=None, pool_size=None, async_pool_size=None,
+                 response_cache=True):
         load_dotenv()
         self.groq_api_key = os.getenv('GROQ_API_KEY')
         self.huggingface_api_key = os.getenv('HUGGINGFACE_API_KEY')
         
-    def get_groq_response(self, prompt, max_tokens=150):
-        """Get response from Groq API (requires API key)"""
-        if not self.groq_api_key or self.groq_api_key == 'your_groq_api_key_here':
+        # HTTP settings for the provider clients (seconds / connections per provider)
+        self.connect_timeout = connect_timeout if connect_timeout is not None else float(os.getenv('AI_CONNECT_TIMEOUT', '5'))
+        self.read_timeout = read_timeout if read_timeout is not None else float(os.getenv('AI_READ_TIMEOUT', '30'))
+        self.pool_size = pool_size if pool_size is not None else int(os.getenv('AI_POOL_SIZE', '10'))
+        # The async clients multiplex many in-flight requests on one event loop
+        self.async_pool_size = async_pool_size if async_pool_size is not None else int(os.getenv('AI_ASYNC_POOL_SIZE', '200'))
+        # Total seconds an async provider call may take, SDK retries included
+        self.call_timeout = float(os.getenv('AI_CALL_TIMEOUT', '30'))
+        
+        # Failing providers are skipped until their breaker lets a probe through
+        self.breakers = {
+            name: CircuitBreaker(
+                name,
+                failure_threshold=int(os.getenv('BREAKER_FAILURE_THRESHOLD', '3')),
+                reset_timeout=float(os.getenv('BREAKER_RESET_TIMEOUT', '30')),
+                max_reset_timeout=float(os.getenv('BREAKER_MAX_RESET_TIMEOUT', '300'))
+            )
+            for name in ('groq', 'huggingface')
+        }
+        
+        # Provider responses shared by all processes (True: default cache, False/None: off)
+        if response_cache is True:
+            response_cache = ResponseCache() if os.getenv('RESPONSE_CACHE', 'on') != 'off' else None
+        self.response_cache = response_cache if response_cache is not False else None
+        
+        # Compile the local responder rules once
+        self.free_ai_rules = RuleEngine(FREE_AI_RULES, handlers={
+            'math': self.solve_math,
+            'what_is': self.answer_what_is
+        })
+        
+        # Provider SDKs are imported on first use, not at module load
+        self.groq_module = None
+        
+        # Long-lived clients with keep-alive connection pools, created on first use
+        # and shared by all threads
+        self.client_lock = threading.Lock()
+        self.groq_client = None
+        self.huggingface_session = None
+        # Async clients are bound to the event loop they were created on:
+        # loop -> (httpx.AsyncClient, AsyncGroq or None)
+        self.async_clients = weakref.WeakKeyDictionary()
+        
+    def load_groq(self):
+        """Import the Groq SDK once; returns the module, or None if it is not installed"""
+        if self.groq_module is None:
+            try:
+                import groq
+                self.groq_module = groq
+            except ImportError:
+                print("Groq library not available. Install with: pip install groq")
+                self.groq_module = False
+        return self.groq_module or None
+    
+    def import_clients(self):
+        """Import the provider HTTP libraries now instead of on first use
+        
+        A server calls this before forking workers that patch the standard library
+        (gevent): httpcore imports trio when it is installed, which fails once
+        gevent has removed select.epoll. httpx itself only imports httpcore when
+        its first client is created.
+        """
+        import httpcore
+        import httpx
+        import requests
+        if self.groq_enabled():
+            self.load_groq()
+    
+    def groq_enabled(self):
+        """Whether a Groq API key is configured"""
+        return bool(self.groq_api_key) and self.groq_api_key != 'your_groq_api_key_here'
+    
+    def huggingface_enabled(self):
+        """Whether a Hugging Face API key is configured"""
+        return bool(self.huggingface_api_key) and self.huggingface_api_key != 'your_huggingface_api_key_here'
+    
+    def http_timeout(self):
+        import httpx
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+    
+    def get_groq_client(self):
+        """Return the shared Groq client, creating it on first use"""
+        if self.groq_client is None:
+            groq = self.load_groq()
+            if groq is None:
+                return None
+            with self.client_lock:
+                if self.groq_client is None:
+                    import httpx
+                    timeout = self.http_timeout()
+                    http_client = httpx.Client(
+                        timeout=timeout,
+                        limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+                    )
+                    self.groq_client = groq.Groq(api_key=self.groq_api_key, timeout=timeout, http_client=http_client)
+        return self.groq_client
+    
+    def get_huggingface_session(self):
+        """Return the shared Hugging Face HTTP session, creating it on first use"""
+        if self.huggingface_session is None:
+            with self.client_lock:
+                if self.huggingface_session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size))
+                    session.headers['Authorization'] = f"Bearer {self.huggingface_api_key}"
+                    self.huggingface_session = session
+        return self.huggingface_session
+    
+    def close(self):
+        """Close the provider connection pools"""
+        with self.client_lock:
+            if self.groq_client is not None:
+                self.groq_client.close()
+                self.groq_client = None
+            if self.huggingface_session is not None:
+                self.huggingface_session.close()
+                self.huggingface_session = None
+    
+    def get_async_clients(self):
+        """Return the (httpx.AsyncClient, AsyncGroq or None) pair for the running event loop"""
+        loop = asyncio.get_running_loop()
+        clients = self.async_clients.get(loop)
+        if clients is None:
+            import httpx
+            timeout = self.http_timeout()
+            http_client = httpx.AsyncClient(
+                timeout=timeout,
+                limits=httpx.Limits(max_connections=self.async_pool_size, max_keepalive_connections=self.async_pool_size)
+            )
+            groq = self.load_groq() if self.groq_enabled() else None
+            groq_client = None
+            if groq is not None:
+                groq_client = groq.AsyncGroq(api_key=self.groq_api_key, timeout=timeout, http_client=http_client)
+            clients = self.async_clients[loop] = (http_client, groq_client)
+        return clients
+    
+    async def aclose(self):
+        """Close the async connection pool of the running event loop"""
+        clients = self.async_clients.pop(asyncio.get_running_loop(), None)
+        if clients is not None:
+            await clients[0].aclose()
+    
+    def groq_request(self, prompt, max_tokens, history=None):
+        """Arguments for a Groq chat completion; history is a list of earlier chat messages"""
+        return {
+            "model": GROQ_MODEL,
+            "messages": [
+                {"role": "system", "content": GROQ_SYSTEM_PROMPT},
+                *(history or ()),
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": max_tokens,
+            "temperature": 0.7
+        }
+    
+    def huggingface_payload(self, prompt):
+        """Request body for the Hugging Face inference API"""
+        return {
+            "inputs": prompt,
+            "parameters": {
+                "max_length": 100,
+                "temperature": 0.7,
+                "do_sample": True
+            }
+        }
+    
+    def parse_huggingface_result(self, result):
+        """Extract the generated text from a Hugging Face response body"""
+        if isinstance(result, list) and len(result) > 0:
+            return result[0].get('generated_text', '').strip()
+        return None
+    
+    def groq_cache_params(self, max_tokens, history=None):
+        """Model parameters that distinguish cached Groq responses"""
+        params = {"model": GROQ_MODEL, "system": GROQ_SYSTEM_PROMPT, "max_tokens": max_tokens, "temperature": 0.7}
+        if history:
+            # The same prompt means something else after another conversation
+            material = json.dumps(history, sort_keys=True, ensure_ascii=False)
+            params["history"] = hashlib.sha256(material.encode('utf-8')).hexdigest()
+        return params
+    
+    def huggingface_cache_params(self):
+        """Model parameters that distinguish cached Hugging Face responses"""
+        return dict(self.huggingface_payload('')["parameters"], url=HUGGINGFACE_API_URL)
+    
+    def cached_response(self, provider, prompt, params):
+        if self.response_cache is None:
+            return None
+        return self.response_cache.get(provider, prompt, params)
+    
+    def cache_response(self, provider, prompt, response, params):
+        if self.response_cache is not None and response:
+            self.response_cache.put(provider, prompt, response, params)
+        return response
+    
+    # The async versions run the SQLite work on the loop's default executor: a lock
+    # held by another process must stall only this request, not the whole event loop
+    async def cached_response_async(self, provider, prompt, params):
+        if self.response_cache is None:
+            return None
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.response_cache.get, provider, prompt, params
+        )
+    
+    async def cache_response_async(self, provider, prompt, response, params):
+        if self.response_cache is not None and response:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.response_cache.put, provider, prompt, response, params
+            )
+        return response
+    
+    def record_failure(self, provider, error=None, status_code=None, headers=None):
+        """Report a failed provider call to its circuit breaker"""
+        if error is not None:
+            # SDK errors carry the HTTP status and response, connection errors and timeouts don't
+            status_code = getattr(error, 'status_code', status_code)
+            headers = getattr(getattr(error, 'response', None), 'headers', headers)
+        client_error = status_code is not None and 400 <= status_code < 500 and status_code not in (401, 403, 408, 429)
+        
+        if isinstance(error, TimeoutError) or 'Timeout' in type(error).__name__ or status_code == 408:
+            kind = 'timeout'
+        elif status_code == 429:
+            kind = 'rate_limited'
+        else:
+            kind = 'client_error' if client_error else 'error'
+        PROVIDER_ERRORS.labels(provider, kind).inc()
+        
+        if client_error:
+            # The request was at fault (bad input, too long, ...), not the provider
+            return
+        self.breakers[provider].record_failure(
+            error if error is not None else f"HTTP {status_code}",
+            retry_after=parse_retry_after(headers),
+            rate_limited=status_code == 429
+        )
+    
+    def breaker_status(self):
+        """State of each provider's circuit breaker"""
+        return {name: breaker.snapshot() for name, breaker in self.breakers.items()}
+    
+    def get_groq_response(self, prompt, max_tokens=150, history=None):
+        """Get response from Groq API (requires API key)
+        
+        history is an optional list of earlier chat messages ({"role", "content"})
+        sent before the prompt, e.g. ConversationContext.messages().
+        """
+        if not self.groq_enabled():
             return None
         
+        cache_params = self.groq_cache_params(max_tokens, history)
+        cached = self.cached_response('groq', prompt, cache_params)
+        if cached:
+            return cached
+        
         try:
-            from groq import Groq
-            
-            # Initialize Groq client
-            client = Groq(api_key=self.groq_api_key)
-            
-            response = client.chat.completions.create(
-                model="llama-3.1-8b-instant",  # Current Groq model
-                messages=[
-                    {"role": "system", "content": "You are a helpful AI assistant. Provide concise and accurate answers."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=max_tokens,
-                temperature=0.7
-            )
+            client = self.get_groq_client()
+            if client is None or not self.breakers['groq'].allow():
+                return None
+            
+            response = client.chat.completions.create(**self.groq_request(prompt, max_tokens, history))
+            self.breakers['groq'].record_success()
             
             content = response.choices[0].message.content
-            return content.strip() if content else ""
+            return self.cache_response('groq', prompt, content.strip() if content else "", cache_params)
             
-        except ImportError:
-            print("Groq library not available. Install with: pip install groq")
-            return None
         except Exception as e:
             print(f"Groq API Error: {e}")
+            self.record_failure('groq', e)
             return None
     
     def get_huggingface_response(self, prompt):
         """Get response from Hugging Face API (requires API key)"""
-        if not self.huggingface_api_key or self.huggingface_api_key == 'your_huggingface_api_key_here':
+        if not self.huggingface_enabled():
+            return None
+        
+        cache_params = self.huggingface_cache_params()
+        cached = self.cached_response('huggingface', prompt, cache_params)
+        if cached:
+            return cached
+        
+        if not self.breakers['huggingface'].allow():
             return None
         
         try:
-            API_URL = "https://api-inference.huggingface.co/models/microsoft/DialoGPT-large"
-            headers = {"Authorization": f"Bearer {self.huggingface_api_key}"}
-            
-            payload = {
-                "inputs": prompt,
-                "parameters": {
-                    "max_length": 100,
-                    "temperature": 0.7,
-                    "do_sample": True
-                }
-            }
+            session = self.get_huggingface_session()
             
-            response = requests.post(API_URL, headers=headers, json=payload)
+            response = session.post(HUGGINGFACE_API_URL, json=self.huggingface_payload(prompt),
+                                    timeout=(self.connect_timeout, self.read_timeout))
             
             if response.status_code == 200:
-                result = response.json()
-                if isinstance(result, list) and len(result) > 0:
-                    return result[0].get('generated_text', '').strip()
+                self.breakers['huggingface'].record_success()
+                result = self.parse_huggingface_result(response.json())
+                return self.cache_response('huggingface', prompt, result, cache_params)
             
+            self.record_failure('huggingface', status_code=response.status_code, headers=response.headers)
             return None
             
         except Exception as e:
             print(f"Hugging Face API Error: {e}")
+            self.record_failure('huggingface', e)
+            return None
+    
+    async def get_groq_response_async(self, prompt, max_tokens=150, history=None):
+        """Async version of get_groq_response; does not block a thread while waiting"""
+        if not self.groq_enabled():
+            return None
+        
+        cache_params = self.groq_cache_params(max_tokens, history)
+        cached = await self.cached_response_async('groq', prompt, cache_params)
+        if cached:
+            return cached
+        
+        try:
+            _, client = self.get_async_clients()
+            if client is None or not self.breakers['groq'].allow():
+                return None
+            
+            response = await asyncio.wait_for(
+                client.chat.completions.create(**self.groq_request(prompt, max_tokens, history)), self.call_timeout
+            )
+            self.breakers['groq'].record_success()
+            
+            content = response.choices[0].message.content
+            return await self.cache_response_async('groq', prompt, content.strip() if content else "", cache_params)
+            
+        except Exception as e:
+            print(f"Groq API Error: {str(e) or type(e).__name__}")
+            self.record_failure('groq', e)
+            return None
+    
+    async def stream_groq_response_async(self, prompt, max_tokens=150, history=None):
+        """Yield Groq's answer in pieces as it is generated; yields nothing if Groq is unavailable
+        
+        Errors before the first piece are reported like in get_groq_response. Later
+        errors are raised, so the caller knows the answer is incomplete.
+        """
+        if not self.groq_enabled():
+            return
+        
+        cache_params = self.groq_cache_params(max_tokens, history)
+        cached = await self.cached_response_async('groq', prompt, cache_params)
+        if cached:
+            yield cached
+            return
+        
+        parts = []
+        try:
+            _, client = self.get_async_clients()
+            if client is None or not self.breakers['groq'].allow():
+                return
+            
+            stream = await asyncio.wait_for(
+                client.chat.completions.create(stream=True, **self.groq_request(prompt, max_tokens, history)), self.call_timeout
+            )
+            finished = False
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content
+                if not parts and text:
+                    text = text.lstrip()
+                if text:
+                    parts.append(text)
+                    yield text
+                finished = finished or chunk.choices[0].finish_reason is not None
+            if not finished:
+                # The connection closed before the final chunk
+                raise ConnectionError("Groq stream ended before the answer was complete")
+            
+        except Exception as e:
+            self.record_failure('groq', e)
+            if parts:
+                raise
+            print(f"Groq API Error: {str(e) or type(e).__name__}")
+            return
+        
+        self.breakers['groq'].record_success()
+        await self.cache_response_async('groq', prompt, ''.join(parts).strip(), cache_params)
+    
+    async def get_huggingface_response_async(self, prompt):
+        """Async version of get_huggingface_response"""
+        if not self.huggingface_enabled():
+            return None
+        
+        cache_params = self.huggingface_cache_params()
+        cached = await self.cached_response_async('huggingface', prompt, cache_params)
+        if cached:
+            return cached
+        
+        if not self.breakers['huggingface'].allow():
+            return None
+        
+        try:
+            http_client, _ = self.get_async_clients()
+            
+            response = await asyncio.wait_for(http_client.post(
+                HUGGINGFACE_API_URL, json=self.huggingface_payload(prompt),
+                headers={"Authorization": f"Bearer {self.huggingface_api_key}"}
+            ), self.call_timeout)
+            
+            if response.status_code == 200:
+                self.breakers['huggingface'].record_success()
+                result = self.parse_huggingface_result(response.json())
+                return await self.cache_response_async('huggingface', prompt, result, cache_params)
+            
+            self.record_failure('huggingface', status_code=response.status_code, headers=response.headers)
+            return None
+            
+        except Exception as e:
+            print(f"Hugging Face API Error: {str(e) or type(e).__name__}")
+            self.record_failure('huggingface', e)
             return None
     
+    def solve_math(self, prompt, hits):
+        """Answer a math question: evaluate an expression or a simple word problem
+        
+        Only an expression that makes up most of the message is answered with full
+        confidence; in "3 times I tried to install python - why?" the 3 is no calculation.
+        """
+        try:
+            # Look for mathematical expressions
+            math_expr = re.search(r'[\d\s+\-*/().]+', prompt)
+            if math_expr:
+                safe_chars = set('0123456789+-*/(). ')
+                expr = math_expr.group().strip()
+                if expr and all(c in safe_chars for c in expr) and MATH_OPERATOR.search(expr):
+                    try:
+                        # Bounded parser instead of eval, so '9**9**9**9' cannot stall the worker
+                        result = math_evaluator.evaluate(expr)
+                        confidence = 1.0 if expression_share(prompt, expr) >= MATH_EXPRESSION_SHARE else 0.3
+                        return f"The calculation {expr} = {result}", confidence
+                    except:
+                        pass
+            
+            # Handle word problems
+            if 'plus' in hits or 'add' in hits:
+                numbers = re.findall(r'\d+', prompt)
+                if len(numbers) >= 2:
+                    result = sum(int(n) for n in numbers[:2])
+                    return f"Adding {numbers[0]} + {numbers[1]} = {result}", 0.9
+            
+            return "I can help with math! Try asking something like '25 + 15' or 'calculate 10 * 5'", 0.2
+        except:
+            return "I can help with basic math calculations. Try writing the expression clearly like '25 + 15' or '10 * 3'", 0.2
+    
+    def answer_what_is(self, prompt, hits):
+        """Answer a 'what is' question about an unknown topic"""
+        # Try to extract what they're asking about
+        what_topic = prompt.lower().replace('what is', '').replace('what\'s', '').strip()
+        if what_topic:
+            return f"That's a great question about {what_topic}! While I don't have specific detailed information about that right now, I can help with general concepts in math, science, programming, and technology. Could you ask something more specific about {what_topic}?"
+        return None
+    
     def get_free_ai_response(self, prompt):
         """Get response using free AI services (no API key required)"""
         try:
-            prompt_lower = prompt.lower()
-            
-            # Greetings
-            if any(word in prompt_lower for word in ['hello', 'hi', 'hey', 'good morning', 'good afternoon', 'good evening']):
-                return "Hello! I'm here to help you with questions, math, programming, and more. What would you like to know?"
-            
-            # Goodbyes
-            if any(word in prompt_lower for word in ['bye', 'goodbye', 'see you', 'farewell']):
-                return "Goodbye! It was nice chatting with you. Feel free to come back anytime you have questions!"
-            
-            # Thanks
-            if any(word in prompt_lower for word in ['thank you', 'thanks', 'appreciate']):
-                return "You're very welcome! I'm happy I could help. Is there anything else you'd like to know?"
-            
-            # Math questions - improved
-            if any(word in prompt_lower for word in ['calculate', 'math', '+', '-', '*', '/', 'equals', 'plus', 'minus', 'times', 'divided']):
-                try:
-                    import re
-                    # Look for mathematical expressions
-                    math_expr = re.search(r'[\d\s+\-*/().]+', prompt)
-                    if math_expr:
-                        safe_chars = set('0123456789+-*/(). ')
-                        expr = math_expr.group().strip()
-                        if expr and all(c in safe_chars for c in expr):
-                            try:
-                                result = eval(expr)
-                                return f"The calculation {expr} = {result}"
-                            except:
-                                pass
-                    
-                    # Handle word problems
-                    if 'plus' in prompt_lower or 'add' in prompt_lower:
-                        numbers = re.findall(r'\d+', prompt)
-                        if len(numbers) >= 2:
-                            result = sum(int(n) for n in numbers[:2])
-                            return f"Adding {numbers[0]} + {numbers[1]} = {result}"
-                    
-                    return "I can help with math! Try asking something like '25 + 15' or 'calculate 10 * 5'"
-                except:
-                    return "I can help with basic math calculations. Try writing the expression clearly like '25 + 15' or '10 * 3'"
-            
-            # Programming questions - much more detailed
-            if any(word in prompt_lower for word in ['python', 'code', 'programming', 'function', 'variable', 'loop', 'if', 'javascript', 'html', 'css']):
-                if 'python' in prompt_lower:
-                    if 'function' in prompt_lower:
-                        return "In Python, you create functions with 'def'. For example:\n\ndef greet(name):\n    return f'Hello, {name}!'\n\nWhat specific aspect of Python functions would you like to know?"
-                    elif 'loop' in prompt_lower:
-                        return "Python has two main loops:\n• for loop: for item in list:\n• while loop: while condition:\n\nWhat type of loop are you interested in?"
-                    elif 'variable' in prompt_lower:
-                        return "In Python, variables are simple: name = 'John', age = 25, is_student = True. Python automatically detects the type!"
-                    else:
-                        return "Python is a versatile programming language! Are you interested in basics, functions, loops, data structures, or something specific?"
-                elif 'javascript' in prompt_lower:
-                    return "JavaScript is great for web development! It runs in browsers and servers. What aspect interests you - basics, functions, DOM manipulation, or frameworks?"
-                elif 'html' in prompt_lower:
-                    return "HTML structures web pages with tags like <div>, <p>, <h1>. What HTML concept would you like to learn about?"
-                elif 'css' in prompt_lower:
-                    return "CSS styles web pages! You can change colors, layouts, fonts and more. What CSS topic interests you?"
-                else:
-                    return "Programming is exciting! Which language or concept would you like to explore - Python, JavaScript, HTML, CSS, or something else?"
-            
-            # Science questions - more detailed
-            if any(word in prompt_lower for word in ['science', 'physics', 'chemistry', 'biology', 'astronomy', 'atoms', 'molecules']):
-                if 'physics' in prompt_lower:
-                    return "Physics studies matter, energy, and motion! Topics include mechanics, electricity, magnetism, and quantum physics. What physics concept interests you?"
-                elif 'chemistry' in prompt_lower:
-                    return "Chemistry explores atoms, molecules, and reactions! It covers elements, compounds, acids, bases, and chemical bonds. What would you like to know?"
-                elif 'biology' in prompt_lower:
-                    return "Biology studies living things - cells, genetics, evolution, ecosystems, and how life works! What biological topic interests you?"
-                elif 'astronomy' in prompt_lower:
-                    return "Astronomy explores space - planets, stars, galaxies, and the universe! Are you curious about our solar system, distant galaxies, or something specific?"
-                else:
-                    return "Science is amazing! It helps us understand the world. Which field interests you - physics, chemistry, biology, astronomy, or earth science?"
-            
-            # Technology questions
-            if any(word in prompt_lower for word in ['computer', 'technology', 'internet', 'ai', 'artificial intelligence', 'machine learning']):
-                if 'ai' in prompt_lower or 'artificial intelligence' in prompt_lower:
-                    return "AI is technology that makes computers smart! It includes machine learning, neural networks, and automation. What aspect of AI interests you?"
-                elif 'machine learning' in prompt_lower:
-                    return "Machine learning teaches computers to learn patterns from data without explicit programming. It's used in recommendations, image recognition, and predictions!"
-                else:
-                    return "Technology shapes our world! From computers and smartphones to AI and the internet. What technology topic would you like to explore?"
-            
-            # Education questions
-            if any(word in prompt_lower for word in ['learn', 'study', 'education', 'school', 'university', 'homework']):
-                return "Learning is wonderful! I can help explain concepts in math, science, programming, and more. What subject would you like to study?"
-            
-            # Help questions
-            if any(word in prompt_lower for word in ['help', 'what can you do', 'capabilities', 'features']):
-                return "I can help with:\n• Math calculations and problems\n• Programming concepts (Python, JavaScript, etc.)\n• Science topics (physics, chemistry, biology)\n• General knowledge and explanations\n• Technology questions\n\nWhat would you like to explore?"
-            
-            # Time/Date questions  
-            if any(word in prompt_lower for word in ['time', 'date', 'day', 'today', 'now']):
-                return "I don't have access to real-time data, but you can check the time and date on your device. Is there something else I can help you with?"
-            
-            # Weather questions
-            if any(word in prompt_lower for word in ['weather', 'temperature', 'rain', 'sunny', 'cloudy']):
-                return "I don't have access to current weather data. Try checking a weather app or website! Is there something else I can help explain?"
-            
-            # Conversational responses for common phrases
-            if any(phrase in prompt_lower for phrase in ['how are you', 'how do you do', 'whats up']):
-                return "I'm doing great, thank you for asking! I'm here and ready to help with any questions you have. What's on your mind?"
-            
-            if 'what is' in prompt_lower:
-                # Try to extract what they're asking about
-                what_topic = prompt_lower.replace('what is', '').replace('what\'s', '').strip()
-                if what_topic:
-                    return f"That's a great question about {what_topic}! While I don't have specific detailed information about that right now, I can help with general concepts in math, science, programming, and technology. Could you ask something more specific about {what_topic}?"
-            
-            if 'how to' in prompt_lower:
-                return "I'd love to help you learn how to do something! I'm great with programming tutorials, math problem-solving steps, and explaining scientific processes. What specifically would you like to learn how to do?"
-            
-            if 'why' in prompt_lower:
-                return "That sounds like a fascinating question! I enjoy explaining the 'why' behind things, especially in science, math, and technology. Could you be more specific about what you'd like to understand?"
-            
-            # Default response - much more engaging
-            return "I'd be happy to help you! I'm particularly good at:\n• Solving math problems\n• Explaining programming concepts\n• Discussing science topics\n• Answering technology questions\n\nWhat would you like to explore together?"
+            rule, response = self.free_ai_rules.respond(prompt)
+            return response
             
         except Exception as e:
-            return None
\ No newline at end of file
+            return None
+    
+    def classify_free_ai_response(self, prompt):
+        """Return (rule name, response, confidence) from the local responder"""
+        try:
+            return self.free_ai_rules.classify(prompt)
+        except Exception as e:
+            return None, None, 0.0
+    
+    def cache_stats(self):
+        """Hit rate and size of the provider response cache, or None when it is off"""
+        return self.response_cache.stats() if self.response_cache is not None else None
+    
+    def rule_stats(self):
+        """Per-rule hit counts and evaluation timings of the local responder"""
+        return self.free_ai_rules.rule_stats()
\ No newline at end of file
@@ -0,0 +1,226 @@
+"""
+Batch mode for the AI ChatBot
+Runs every prompt of a JSONL file through the chat pipeline (the same responders,
+routing and caches as the bot) and writes one JSONL result per prompt.
+
+Input lines are objects with a "prompt" (or "message") and an optional "id"; the
+line number is used when there is no id. Output lines are
+{"id", "prompt", "response", "source", "latency_ms"}, in completion order.
+
+Prompts are read as they are processed, so memory use does not grow with the file.
+A fixed pool of workers answers them concurrently, and each provider has its own
+limit of requests in flight, so a large run stays within the API rate limits and
+its duration is about prompts / throughput. Use --deadline to bound the time of a
+single prompt. Running again with the same output file skips the prompts already
+answered, so an interrupted run can be resumed.
+
+Usage: python batch_runner.py prompts.jsonl results.jsonl [--workers 32] [--groq-concurrency 8]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+# Add current directory to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from knowledge_base import KnowledgeBase
+from ai_service import AIService
+from chat_pipeline import ChatPipeline
+
+
+def read_prompts(path):
+    """Yield (id, prompt) for each input line, skipping lines without a prompt"""
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                print(f"Skipping line {number}: {e}", file=sys.stderr)
+                continue
+            if isinstance(record, str):
+                record = {"prompt": record}
+            prompt = record.get("prompt", record.get("message")) if isinstance(record, dict) else None
+            if not isinstance(prompt, str) or not prompt.strip():
+                print(f"Skipping line {number}: no prompt", file=sys.stderr)
+                continue
+            yield record.get("id", number), prompt
+
+
+def count_prompts(path):
+    """Number of non-empty input lines, for progress reporting"""
+    with open(path, encoding='utf-8') as f:
+        return sum(1 for line in f if line.strip())
+
+
+def load_done_ids(path):
+    """Ids already in an output file; drops a last line cut off by an interrupted run"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, 'rb+') as f:
+        complete = 0
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            complete += len(line)
+            try:
+                done.add(json.dumps(json.loads(line)["id"]))
+            except (ValueError, KeyError):
+                pass
+        f.truncate(complete)
+    return done
+
+
+def limit_concurrency(ask, semaphore):
+    """Wrap a pipeline provider so at most the semaphore's value of its requests run at once"""
+    async def limited_ask(user_input, history=None):
+        async with semaphore:
+            return await ask(user_input, history)
+    return limited_ask
+
+
+class BatchRunner:
+    """Answers a prompt file with a bounded pool of pipeline workers"""
+
+    def __init__(self, pipeline, workers=32, provider_limits=None, progress_interval=10.0):
+        self.pipeline = pipeline
+        self.workers = workers
+        # Provider name -> maximum requests in flight (missing: only bounded by workers)
+        self.provider_limits = provider_limits or {}
+        # Seconds between progress lines, 0 to disable
+        self.progress_interval = progress_interval
+
+        self.done = 0
+        self.skipped = 0
+        self.failed = 0
+        self.total = 0
+        self.sources = Counter()
+        self.latencies = []
+
+    async def run(self, input_path, output_path):
+        """Answer every prompt of input_path not yet in output_path"""
+        self.pipeline.providers = [
+            (name, limit_concurrency(ask, asyncio.Semaphore(self.provider_limits[name])))
+            if self.provider_limits.get(name) else (name, ask)
+            for name, ask in self.pipeline.providers
+        ]
+        done_ids = load_done_ids(output_path)
+        self.total = count_prompts(input_path)
+        self.start = time.monotonic()
+
+        # Bounded, so the input is read only as fast as it is answered
+        prompts = asyncio.Queue(maxsize=self.workers * 2)
+        progress = asyncio.ensure_future(self.report_progress()) if self.progress_interval > 0 else None
+        try:
+            with open(output_path, 'a', encoding='utf-8') as output:
+                # A worker error (e.g. the disk is full) ends the run instead of stalling the queue
+                await asyncio.gather(
+                    self.feed(input_path, done_ids, prompts),
+                    *(self.work(prompts, output) for _ in range(self.workers))
+                )
+        finally:
+            if progress is not None:
+                progress.cancel()
+            await self.pipeline.ai_service.aclose()
+        self.print_progress()
+
+    async def feed(self, input_path, done_ids, prompts):
+        """Queue the prompts not answered yet, then one end marker per worker"""
+        for prompt_id, prompt in read_prompts(input_path):
+            if json.dumps(prompt_id) in done_ids:
+                self.skipped += 1
+                continue
+            await prompts.put((prompt_id, prompt))
+        for _ in range(self.workers):
+            await prompts.put(None)
+
+    async def work(self, prompts, output):
+        """Answer prompts from the queue until the end marker"""
+        while True:
+            item = await prompts.get()
+            if item is None:
+                return
+            prompt_id, prompt = item
+            start = time.perf_counter()
+            try:
+                response, source = await self.pipeline.get_response_async(prompt)
+            except Exception as e:
+                # Not written, so a resumed run tries it again
+                print(f"Prompt {prompt_id!r} failed: {e}", file=sys.stderr)
+                self.failed += 1
+                continue
+            latency = time.perf_counter() - start
+            record = {
+                "id": prompt_id,
+                "prompt": prompt,
+                "response": response,
+                "source": source,
+                "latency_ms": round(latency * 1000, 1)
+            }
+            output.write(json.dumps(record, ensure_ascii=False) + '\n')
+            output.flush()
+            self.done += 1
+            self.sources[source] += 1
+            self.latencies.append(latency)
+
+    async def report_progress(self):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            self.print_progress()
+
+    def print_progress(self):
+        """Print counts, throughput, estimated time left and latency percentiles"""
+        elapsed = time.monotonic() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.skipped - self.done - self.failed
+        eta = f"{remaining / rate:.0f}s" if rate > 0 else "?"
+        line = (f"{self.done + self.skipped}/{self.total} done ({self.skipped} resumed, {self.failed} failed), "
+                f"{rate:.1f}/s, ETA {eta}")
+        if len(self.latencies) >= 2:
+            percentiles = statistics.quantiles(self.latencies, n=100)
+            line += f", p50 {percentiles[49] * 1000:.0f}ms p95 {percentiles[94] * 1000:.0f}ms"
+        if self.sources:
+            line += " | " + ", ".join(f"{source}: {count}" for source, count in self.sources.most_common())
+        print(line, file=sys.stderr, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of prompts with the chat pipeline")
+    parser.add_argument('input', help="JSONL file of {\"id\", \"prompt\"} objects")
+    parser.add_argument('output', help="JSONL results file; existing results are kept and their prompts skipped")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('BATCH_WORKERS', '32')),
+                        help="prompts answered concurrently")
+    parser.add_argument('--groq-concurrency', type=int, default=int(os.getenv('BATCH_GROQ_CONCURRENCY', '8')),
+                        help="Groq requests in flight at most (0: no limit)")
+    parser.add_argument('--huggingface-concurrency', type=int, default=int(os.getenv('BATCH_HUGGINGFACE_CONCURRENCY', '4')),
+                        help="Hugging Face requests in flight at most (0: no limit)")
+    parser.add_argument('--strategy', default=None, help="provider strategy: sequential, hedged or race")
+    parser.add_argument('--deadline', type=float, default=None, help="seconds per prompt before the local fallback answers")
+    parser.add_argument('--progress', type=float, default=10.0, help="seconds between progress lines (0: off)")
+    args = parser.parse_args()
+
+    pipeline = ChatPipeline(KnowledgeBase(), AIService(), strategy=args.strategy, deadline=args.deadline)
+    runner = BatchRunner(
+        pipeline,
+        workers=max(args.workers, 1),
+        provider_limits={"Groq": args.groq_concurrency, "Hugging Face": args.huggingface_concurrency},
+        progress_interval=args.progress
+    )
+    try:
+        asyncio.run(runner.run(args.input, args.output))
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume.", file=sys.stderr)
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
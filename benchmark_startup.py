@@ -0,0 +1,119 @@
+"""
+Cold-start benchmark for the AI ChatBot
+Measures, in fresh interpreters, how long each entry point takes to import,
+to build its components and to produce the first response, and which heavy
+libraries were loaded along the way.
+
+Usage: python benchmark_startup.py [--runs 5] [--budget-ms 1500]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+HEAVY_MODULES = ['nltk', 'sklearn', 'numpy', 'scipy', 'groq', 'requests', 'flask']
+
+# Each probe runs in its own interpreter and prints one JSON line of timings (seconds)
+PROBE = r"""
+import json, sys, time
+sys.path.insert(0, {current_dir!r})
+start = time.perf_counter()
+{import_code}
+imported = time.perf_counter()
+{setup_code}
+ready = time.perf_counter()
+{response_code}
+responded = time.perf_counter()
+print(json.dumps({{
+    'import': imported - start,
+    'setup': ready - imported,
+    'first_response': responded - ready,
+    'heavy_modules': sorted(m for m in {heavy_modules!r} if m in sys.modules)
+}}))
+"""
+
+ENTRY_POINTS = {
+    'chatbot.py': (
+        "import chatbot",
+        "bot = chatbot.ChatBot()",
+        "bot.get_response('Hello there!')"
+    ),
+    'demo.py': (
+        "import demo",
+        "kb = demo.KnowledgeBase(); ai = demo.AIService()",
+        "ai.get_free_ai_response('Hello there!') or kb.get_response('Hello there!')"
+    ),
+    'web_app.py': (
+        "import web_app",
+        "client = web_app.app.test_client()",
+        "client.post('/chat', json={'message': 'Hello there!'})"
+    ),
+}
+
+
+def run_probe(import_code, setup_code, response_code):
+    """Run one entry point in a fresh interpreter and return its timings"""
+    code = PROBE.format(
+        current_dir=current_dir,
+        import_code=import_code,
+        setup_code=setup_code,
+        response_code=response_code,
+        heavy_modules=HEAVY_MODULES
+    )
+    # Measure the local path only: without API keys no provider is contacted
+    env = dict(os.environ, GROQ_API_KEY='', HUGGINGFACE_API_KEY='')
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=current_dir, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def benchmark(runs):
+    """Return median timings in milliseconds per entry point"""
+    results = {}
+    for name, (import_code, setup_code, response_code) in ENTRY_POINTS.items():
+        samples = [run_probe(import_code, setup_code, response_code) for _ in range(runs)]
+        results[name] = {
+            phase: statistics.median(sample[phase] for sample in samples) * 1000
+            for phase in ('import', 'setup', 'first_response')
+        }
+        results[name]['total'] = sum(results[name][phase] for phase in ('import', 'setup', 'first_response'))
+        results[name]['heavy_modules'] = samples[-1]['heavy_modules']
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start time of the chatbot entry points")
+    parser.add_argument('--runs', type=int, default=5, help="fresh interpreters per entry point (median is reported)")
+    parser.add_argument('--budget-ms', type=float, default=None, help="fail if any entry point takes longer in total")
+    args = parser.parse_args()
+
+    print("⏱️  AI ChatBot Cold-Start Benchmark")
+    print("=" * 78)
+    print(f"{'Entry point':<14}{'import':>10}{'setup':>10}{'1st reply':>11}{'total':>10}  heavy libraries loaded")
+    print("-" * 78)
+
+    results = benchmark(args.runs)
+    over_budget = []
+    for name, timings in results.items():
+        print(f"{name:<14}{timings['import']:>8.0f}ms{timings['setup']:>8.0f}ms{timings['first_response']:>9.0f}ms"
+              f"{timings['total']:>8.0f}ms  {', '.join(timings['heavy_modules']) or '-'}")
+        if args.budget_ms is not None and timings['total'] > args.budget_ms:
+            over_budget.append(name)
+
+    print("-" * 78)
+    if args.budget_ms is not None:
+        if over_budget:
+            print(f"❌ Over the {args.budget_ms:.0f}ms budget: {', '.join(over_budget)}")
+            sys.exit(1)
+        print(f"✅ All entry points within the {args.budget_ms:.0f}ms budget")
+
+
+if __name__ == "__main__":
+    main()
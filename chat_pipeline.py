@@ -0,0 +1,381 @@
+"""
+Async chat response pipeline
+
+ChatPipeline runs the responder fallback chain (Groq, Hugging Face, the local
+rule-based responder, the knowledge base) as a coroutine, so provider calls wait
+on the network without holding a thread. Async callers await get_response_async;
+synchronous callers (the CLI, Flask views) use get_response, which submits the
+coroutine to one shared event loop running in a background thread. All in-flight
+provider requests of the process are multiplexed on that loop.
+
+How the providers are asked is set by the strategy:
+
+    sequential  ask Groq, then Hugging Face once Groq has failed (the default)
+    hedged      start Hugging Face as a backup if Groq has not answered within
+                hedge_delay seconds (or as soon as it fails)
+    race        ask all providers at once
+
+In the hedged and race modes the first good answer wins and the other requests
+are cancelled. With a deadline, providers that have not answered in time are
+cancelled and the local responders answer instead.
+
+Before any provider is asked, the local responders (the rule-based responder and
+the knowledge base) rate how well they can answer. Small talk and other messages
+they answer with confidence of at least routing_threshold never leave the process;
+open-ended questions go to the providers. With routing_log (ROUTING_LOG) set, each
+routing decision, message text included, is appended to a JSONL log to tune the
+threshold; a background thread writes it and rotates it at ROUTING_LOG_MAX_MB.
+
+Provider answers are remembered in a SemanticCache, which answers later prompts
+that are near duplicates before any provider is asked.
+
+A message can come with the earlier turns of its conversation as history (chat
+messages, see ConversationContext), which Groq receives before the message. A
+message with history is a follow-up whose answer depends on that history, so it
+neither uses nor fills the semantic cache.
+
+stream_response_async / stream_response deliver the answer as events while Groq
+generates it:
+
+    {'type': 'chunk', 'text': ..., 'source': ...}      a piece of the answer
+    {'type': 'done', 'response': ..., 'source': ...}   the complete answer
+
+Streaming asks Groq alone (the deadline bounds its time to the first token); if it
+produces nothing, the other providers and the local responders answer in one chunk.
+
+Answers are counted and timed per source, and in-flight messages and provider
+requests are tracked, in the metrics of metrics.py.
+"""
+
+import asyncio
+import os
+import queue
+import threading
+import time
+
+from jsonl_log import JsonlLog
+from metrics import Counter, Gauge, Histogram
+from semantic_cache import SemanticCache
+
+STRATEGIES = ('sequential', 'hedged', 'race')
+
+CHAT_REQUESTS = Counter('chat_requests_total', "Chat messages answered, by answer source", ['source'])
+CHAT_LATENCY = Histogram('chat_request_duration_seconds', "Time to answer a chat message, by answer source", ['source'])
+CHAT_IN_FLIGHT = Gauge('chat_requests_in_flight', "Chat messages being answered")
+PROVIDER_IN_FLIGHT = Gauge('provider_requests_in_flight', "AI provider requests awaiting an answer", ['provider'])
+DEADLINE_EXCEEDED = Counter('chat_deadline_exceeded_total', "Messages the AI providers did not answer within the deadline")
+
+
+class ChatPipeline:
+    """Fallback chain of responders with an async core and a sync wrapper"""
+
+    def __init__(self, knowledge_base, ai_service, strategy=None, hedge_delay=None, deadline=None,
+                 semantic_cache=True, routing_threshold=None, routing_log=None):
+        self.knowledge_base = knowledge_base
+        self.ai_service = ai_service
+
+        self.strategy = strategy or os.getenv('CHAT_STRATEGY', 'sequential')
+        if self.strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy {self.strategy!r}, expected one of {', '.join(STRATEGIES)}")
+        # Seconds before the backup provider is started in hedged mode
+        self.hedge_delay = hedge_delay if hedge_delay is not None else float(os.getenv('CHAT_HEDGE_DELAY', '1.0'))
+        # Seconds the providers get per message before the local fallback answers (None: no limit)
+        if deadline is None and os.getenv('CHAT_DEADLINE'):
+            deadline = float(os.getenv('CHAT_DEADLINE'))
+        self.deadline = deadline
+
+        # LLM providers in order of preference
+        self.providers = [
+            ("Groq", self.ask_groq),
+            ("Hugging Face", self.ask_huggingface),
+        ]
+
+        # Local answers at least this confident are not escalated to the providers (above 1: always escalate)
+        self.routing_threshold = routing_threshold if routing_threshold is not None else float(os.getenv('ROUTING_THRESHOLD', '0.7'))
+        # Path of the routing decision log (it records the messages), '' for none
+        routing_log = routing_log if routing_log is not None else os.getenv('ROUTING_LOG', '')
+        max_bytes = int(float(os.getenv('ROUTING_LOG_MAX_MB', '10')) * 1024 * 1024)
+        self.routing_log = JsonlLog(routing_log, max_bytes, name="Routing log") if routing_log else None
+
+        # Near-duplicate answer cache (True: default cache, False/None: off)
+        if semantic_cache is True:
+            semantic_cache = SemanticCache(self.preprocess) if os.getenv('SEMANTIC_CACHE', 'on') != 'off' else None
+        self.semantic_cache = semantic_cache if semantic_cache is not False else None
+
+        # Background event loop for get_response, started on first use
+        self.loop = None
+        self.loop_pid = None
+        self.loop_lock = threading.Lock()
+
+    async def get_response_async(self, user_input, history=None):
+        """Return (response, source) for user input from the first responder that answers"""
+        start = time.perf_counter()
+        CHAT_IN_FLIGHT.inc()
+        try:
+            response, source = await self.respond(user_input, history)
+        finally:
+            CHAT_IN_FLIGHT.dec()
+        self.record_answer(source, start)
+        return response, source
+
+    async def stream_response_async(self, user_input, history=None):
+        """Yield the answer for user input as chunk events followed by a done event"""
+        start = time.perf_counter()
+        CHAT_IN_FLIGHT.inc()
+        try:
+            async for event in self.stream_events(user_input, history):
+                if event['type'] == 'done':
+                    self.record_answer(event['source'], start)
+                yield event
+        finally:
+            CHAT_IN_FLIGHT.dec()
+
+    def record_answer(self, source, start):
+        CHAT_REQUESTS.labels(source).inc()
+        CHAT_LATENCY.labels(source).observe(time.perf_counter() - start)
+
+    async def respond(self, user_input, history=None):
+        local = self.route(user_input)
+        if local is not None:
+            return local
+        cached = self.cached_answer(user_input, history)
+        if cached is not None:
+            return cached
+        return await self.answer(user_input, self.providers, self.deadline, history)
+
+    async def stream_events(self, user_input, history=None):
+        answer = self.route(user_input)
+        if answer is None:
+            answer = self.cached_answer(user_input, history)
+        if answer is None and self.ai_service.groq_enabled():
+            start = time.monotonic()
+            parts = []
+            async for text in self.stream_groq(user_input, parts, history):
+                yield {'type': 'chunk', 'text': text, 'source': "Groq"}
+            if parts:
+                yield {'type': 'done', 'response': ''.join(parts).strip(), 'source': "Groq"}
+                return
+            # Groq gave nothing: the remaining providers get what is left of the deadline
+            deadline = None if self.deadline is None else max(self.deadline - (time.monotonic() - start), 0)
+            answer = await self.answer(user_input, [p for p in self.providers if p[0] != "Groq"], deadline, history)
+        elif answer is None:
+            answer = await self.answer(user_input, self.providers, self.deadline, history)
+
+        response, source = answer
+        yield {'type': 'chunk', 'text': response, 'source': source}
+        yield {'type': 'done', 'response': response, 'source': source}
+
+    async def stream_groq(self, user_input, parts, history=None):
+        """Yield Groq's answer in pieces, collecting them in parts; caches the answer if it completes"""
+        stream = self.ai_service.stream_groq_response_async(user_input, history=history)
+        PROVIDER_IN_FLIGHT.labels("Groq").inc()
+        try:
+            try:
+                text = await asyncio.wait_for(stream.__anext__(), self.deadline)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                DEADLINE_EXCEEDED.inc()
+                print(f"Groq did not start answering within {self.deadline}s")
+                return
+            while True:
+                parts.append(text)
+                yield text
+                try:
+                    text = await stream.__anext__()
+                except StopAsyncIteration:
+                    break
+                except Exception as e:
+                    # The answer so far has been delivered; just don't cache it
+                    print(f"Groq stream interrupted: {e}")
+                    return
+        finally:
+            PROVIDER_IN_FLIGHT.labels("Groq").dec()
+            await stream.aclose()
+        self.remember_answer(user_input, ''.join(parts).strip(), "Groq", history)
+
+    def route(self, user_input):
+        """Return a local (response, source) when it is confident enough, None to ask the providers"""
+        if not self.providers_enabled():
+            # Nothing to escalate to; the local fallback answers anyway
+            return None
+
+        rule, rule_response, rule_confidence = self.ai_service.classify_free_ai_response(user_input)
+        # One knowledge base for the match and the answer, even if a reload swaps it meanwhile
+        knowledge_base = self.knowledge_base.snapshot()
+        category, kb_confidence = knowledge_base.match(user_input)
+        if category is None:
+            kb_confidence = 0.0
+        else:
+            # How well the category's canned answers serve a matching question
+            kb_confidence *= knowledge_base.data[category].get('confidence', 1.0)
+
+        if rule_response and rule_confidence >= kb_confidence:
+            answer, confidence = (rule_response, "AI Service"), rule_confidence
+        elif category is not None:
+            answer, confidence = (knowledge_base.choose_response(category), "Knowledge Base"), kb_confidence
+        else:
+            answer, confidence = None, 0.0
+        local = confidence >= self.routing_threshold
+
+        if self.routing_log is not None:
+            self.routing_log.write({
+                'timestamp': time.time(),
+                'message': user_input,
+                'rule': rule,
+                'rule_confidence': round(rule_confidence, 4),
+                'kb_category': category,
+                'kb_confidence': round(kb_confidence, 4),
+                'threshold': self.routing_threshold,
+                'decision': answer[1] if local else 'providers'
+            })
+        return answer if local else None
+
+    def cached_answer(self, user_input, history=None):
+        """(response, source) of a near-duplicate prompt answered before, or None"""
+        if self.semantic_cache is None or history or not self.providers_enabled():
+            return None
+        return self.semantic_cache.get(user_input)
+
+    def remember_answer(self, user_input, response, source, history=None):
+        if self.semantic_cache is not None and not history:
+            self.semantic_cache.put(user_input, response, source)
+
+    async def answer(self, user_input, providers, deadline, history=None):
+        """Return (response, source) from the providers within the deadline, else from the local responders"""
+        try:
+            ai_response, source = await asyncio.wait_for(self.ask_providers(user_input, providers, history), deadline)
+        except asyncio.TimeoutError:
+            DEADLINE_EXCEEDED.inc()
+            print(f"AI providers did not answer within {deadline}s, using local responses")
+            ai_response, source = None, None
+        if ai_response:
+            self.remember_answer(user_input, ai_response, source, history)
+            return ai_response, source
+
+        # The local responders are CPU-only and take microseconds
+        ai_response = self.ai_service.get_free_ai_response(user_input)
+        if ai_response:
+            return ai_response, "AI Service"
+
+        # Fall back to knowledge base
+        kb_response = self.knowledge_base.get_response(user_input)
+        return kb_response, "Knowledge Base"
+
+    def preprocess(self, text):
+        # Looked up on every call: a reloading knowledge base may have been replaced
+        return self.knowledge_base.preprocess_text(text)
+
+    def providers_enabled(self):
+        """Whether any LLM provider is configured"""
+        return self.ai_service.groq_enabled() or self.ai_service.huggingface_enabled()
+
+    async def ask_groq(self, user_input, history=None):
+        PROVIDER_IN_FLIGHT.labels("Groq").inc()
+        try:
+            return await self.ai_service.get_groq_response_async(user_input, history=history)
+        finally:
+            PROVIDER_IN_FLIGHT.labels("Groq").dec()
+
+    async def ask_huggingface(self, user_input, history=None):
+        PROVIDER_IN_FLIGHT.labels("Hugging Face").inc()
+        try:
+            # The DialoGPT inference API takes a single text, so Hugging Face answers without the history
+            return await self.ai_service.get_huggingface_response_async(user_input)
+        finally:
+            PROVIDER_IN_FLIGHT.labels("Hugging Face").dec()
+
+    async def ask_providers(self, user_input, providers, history=None):
+        """Return (response, source) from the LLM providers, or (None, None) if none answered"""
+        if not providers:
+            return None, None
+        if self.strategy == 'sequential':
+            for name, ask in providers:
+                ai_response = await ask(user_input, history)
+                if ai_response:
+                    return ai_response, name
+            return None, None
+
+        tasks = {}
+        waiting = list(providers)
+
+        def start_next():
+            name, ask = waiting.pop(0)
+            tasks[asyncio.ensure_future(ask(user_input, history))] = name
+
+        start_next()
+        while self.strategy == 'race' and waiting:
+            start_next()
+
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(
+                    tasks, timeout=self.hedge_delay if waiting else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    name = tasks.pop(task)
+                    if task.result():
+                        return task.result(), name
+                # Hedge after the delay, or right away when a provider failed
+                if waiting:
+                    start_next()
+            return None, None
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def get_response(self, user_input, history=None):
+        """Blocking version of get_response_async"""
+        return self.run(self.get_response_async(user_input, history))
+
+    def stream_response(self, user_input, history=None):
+        """Blocking version of stream_response_async: a generator of the same events"""
+        events = queue.Queue()
+
+        async def produce():
+            try:
+                async for event in self.stream_response_async(user_input, history):
+                    events.put(event)
+            finally:
+                events.put(None)
+
+        future = asyncio.run_coroutine_threadsafe(produce(), self.get_loop())
+        try:
+            while True:
+                event = events.get()
+                if event is None:
+                    break
+                yield event
+            future.result()
+        finally:
+            # Stops the provider request if the consumer went away early
+            future.cancel()
+
+    def run(self, coroutine):
+        """Run a coroutine on the background event loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.get_loop()).result()
+
+    def get_loop(self):
+        """Return the background event loop, starting it on first use (and again after a fork)"""
+        if self.loop is None or self.loop_pid != os.getpid():
+            with self.loop_lock:
+                if self.loop is None or self.loop_pid != os.getpid():
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(target=loop.run_forever, name="chat-pipeline-loop", daemon=True)
+                    thread.start()
+                    self.loop = loop
+                    self.loop_pid = os.getpid()
+        return self.loop
+
+    def close(self):
+        """Close the async provider clients, stop the background event loop and flush the logs"""
+        if self.routing_log is not None:
+            self.routing_log.close()
+        if self.semantic_cache is not None:
+            self.semantic_cache.close()
+        with self.loop_lock:
+            loop, self.loop = self.loop, None
+        if loop is not None and self.loop_pid == os.getpid():
+            asyncio.run_coroutine_threadsafe(self.ai_service.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
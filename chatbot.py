@@ -14,12 +14,18 @@ sys.path.append(current_dir)
 
 from knowledge_base import KnowledgeBase
 from ai_service import AIService
+from chat_pipeline import ChatPipeline
+from conversation_context import ConversationContext, Turn
 
 class ChatBot:
     def __init__(self):
         self.knowledge_base = KnowledgeBase()
         self.ai_service = AIService()
+        self.pipeline = ChatPipeline(self.knowledge_base, self.ai_service)
+        # Transcript as compact Turn records, turned into JSON only when saved
         self.conversation_history = []
+        # Recent turns sent to the AI with each message (CONTEXT_MAX_TOKENS)
+        self.context = ConversationContext()
         self.user_name = "User"
         
     def setup_nltk(self):
@@ -62,7 +68,7 @@ class ChatBot:
             conversation_data = {
                 "timestamp": datetime.now().isoformat(),
                 "user_name": self.user_name,
-                "messages": self.conversation_history
+                "messages": [self.turn_record(turn) for turn in self.conversation_history]
             }
             
             with open(filename, 'w', encoding='utf-8') as f:
@@ -73,25 +79,52 @@ class ChatBot:
         except Exception as e:
             print(f"{Fore.RED}✗ Error saving conversation: {e}")
     
+    def turn_record(self, turn):
+        """JSON form of a transcript Turn"""
+        record = {
+            "timestamp": datetime.fromtimestamp(turn.timestamp).isoformat(),
+            "sender": turn.sender,
+            "message": turn.message
+        }
+        if turn.source is not None:
+            record["source"] = turn.source
+        return record
+    
     def get_response(self, user_input):
-        """Get the best available response for user input"""
-        
-        # First, try AI services if available
-        ai_response = self.ai_service.get_groq_response(user_input)
-        if ai_response:
-            return ai_response, "Groq"
-        
-        ai_response = self.ai_service.get_huggingface_response(user_input)
-        if ai_response:
-            return ai_response, "Hugging Face"
-        
-        ai_response = self.ai_service.get_free_ai_response(user_input)
-        if ai_response:
-            return ai_response, "AI Service"
-        
-        # Fall back to knowledge base
-        kb_response = self.knowledge_base.get_response(user_input)
-        return kb_response, "Knowledge Base"
+        """Get the best available response for user input, as a follow-up of the conversation so far"""
+        response, source = self.pipeline.get_response(user_input, history=self.context.messages())
+        self.remember_exchange(user_input, response)
+        return response, source
+    
+    def remember_exchange(self, user_input, response):
+        """Add a message and its answer to the context sent with the next messages"""
+        self.context.add("user", user_input)
+        self.context.add("assistant", response)
+    
+    def print_streamed_response(self, user_input):
+        """Print the response as it is generated; returns (response, source)"""
+        response, source = "", "Knowledge Base"
+        started = False
+        for event in self.pipeline.stream_response(user_input, history=self.context.messages()):
+            source = event['source']
+            if event['type'] == 'chunk':
+                if not started:
+                    print(f"{self.source_color(source)}ChatBot ({source}): ", end="", flush=True)
+                    started = True
+                print(f"{self.source_color(source)}{event['text']}", end="", flush=True)
+            elif event['type'] == 'done':
+                response = event['response']
+        print()
+        return response, source
+    
+    def source_color(self, source):
+        """Color used for responses from a source"""
+        return {
+            "Groq": Fore.BLUE,
+            "Hugging Face": Fore.GREEN,
+            "AI Service": Fore.CYAN,
+            "Knowledge Base": Fore.MAGENTA
+        }.get(source, Fore.MAGENTA)
     
     def print_welcome(self):
         """Print welcome message"""
@@ -143,33 +176,15 @@ class ChatBot:
                     continue
                 
                 # Record user message
-                self.conversation_history.append({
-                    "timestamp": datetime.now().isoformat(),
-                    "sender": self.user_name,
-                    "message": user_input
-                })
+                self.conversation_history.append(Turn(time.time(), self.user_name, user_input, None))
                 
-                # Get response
+                # Get response, printed with its source indicator as it streams in
                 print(f"{Fore.YELLOW}🤔 Thinking...")
-                response, source = self.get_response(user_input)
-                
-                # Display response with source indicator
-                source_color = {
-                    "Groq": Fore.BLUE,
-                    "Hugging Face": Fore.GREEN,
-                    "AI Service": Fore.CYAN,
-                    "Knowledge Base": Fore.MAGENTA
-                }.get(source, Fore.MAGENTA)
-                
-                print(f"{source_color}ChatBot ({source}): {response}")
+                response, source = self.print_streamed_response(user_input)
+                self.remember_exchange(user_input, response)
                 
                 # Record bot response
-                self.conversation_history.append({
-                    "timestamp": datetime.now().isoformat(),
-                    "sender": "ChatBot",
-                    "message": response,
-                    "source": source
-                })
+                self.conversation_history.append(Turn(time.time(), "ChatBot", response, source))
                 
             except KeyboardInterrupt:
                 print(f"\n{Fore.YELLOW}Chat interrupted by user.")
@@ -0,0 +1,114 @@
+"""
+Circuit breakers for remote providers
+
+A breaker is closed while its provider works. After failure_threshold failures
+in a row it opens: calls are refused without contacting the provider, so the
+chat pipeline moves straight on to the next source. After reset_timeout seconds
+it turns half-open and lets a single probe request through. A successful probe
+closes the breaker; a failed one opens it again for twice as long (up to
+max_reset_timeout).
+
+A rate-limit response opens the breaker at once, for the time the provider asks
+for in Retry-After (negative caching), instead of counting towards the threshold.
+"""
+
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def parse_retry_after(headers):
+    """Seconds from a Retry-After header given in seconds, or None"""
+    value = headers.get('retry-after') if headers is not None else None
+    try:
+        return max(float(value), 0.0) if value is not None else None
+    except ValueError:
+        return None
+
+
+class CircuitBreaker:
+    """Thread-safe closed / open / half-open breaker for one provider"""
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=30.0, max_reset_timeout=300.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.open_timeout = reset_timeout
+        self.opened_until = 0.0
+        self.probe_started = None
+        self.failures = 0
+        self.successes = 0
+        self.rejected = 0
+        self.last_error = None
+
+    def allow(self):
+        """Whether a request may be sent now"""
+        now = time.monotonic()
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and now >= self.opened_until:
+                self.state = HALF_OPEN
+                self.probe_started = None
+            if self.state == HALF_OPEN:
+                # One probe at a time; a probe that never reported back (e.g. it was
+                # cancelled) is replaced after reset_timeout
+                if self.probe_started is None or now - self.probe_started >= self.reset_timeout:
+                    self.probe_started = now
+                    return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.state = CLOSED
+            self.open_timeout = self.reset_timeout
+            self.probe_started = None
+
+    def record_failure(self, error=None, retry_after=None, rate_limited=False):
+        """Count a failure; rate_limited opens the breaker at once for retry_after seconds"""
+        now = time.monotonic()
+        with self.lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = str(error) if error is not None else None
+            if rate_limited:
+                self.trip(now, retry_after if retry_after is not None else self.open_timeout)
+            elif self.state == HALF_OPEN:
+                # The probe failed: back off for longer
+                self.open_timeout = min(self.open_timeout * 2, self.max_reset_timeout)
+                self.trip(now, self.open_timeout)
+            elif self.consecutive_failures >= self.failure_threshold:
+                self.trip(now, max(self.open_timeout, retry_after or 0.0))
+
+    def trip(self, now, duration):
+        self.state = OPEN
+        self.opened_until = now + duration
+        self.probe_started = None
+
+    def snapshot(self):
+        """Current state and counters, for health reporting"""
+        now = time.monotonic()
+        with self.lock:
+            state = self.state
+            if state == OPEN and now >= self.opened_until:
+                state = HALF_OPEN
+            return {
+                'state': state,
+                'consecutive_failures': self.consecutive_failures,
+                'retry_in': round(max(self.opened_until - now, 0.0), 1) if state == OPEN else 0.0,
+                'failures': self.failures,
+                'successes': self.successes,
+                'rejected': self.rejected,
+                'last_error': self.last_error
+            }
@@ -0,0 +1,130 @@
+"""
+Token-budgeted conversation context
+
+ConversationContext keeps the recent turns of a conversation as chat messages
+for the AI provider, within a token budget. It is updated incrementally as turns
+are added: turns that no longer fit are dropped from the front of the window and
+condensed into a short running summary of what the user asked earlier, which is
+itself capped. Sending the context therefore costs at most max_tokens, however
+long the conversation gets.
+
+Tokens are estimated at four characters each (no tokenizer needed); that is close
+for English text with the Llama and GPT tokenizers.
+
+A web worker holds one context per session, so the object is kept small: slots,
+plain tuples and lists (an empty deque alone takes 760 bytes).
+"""
+
+import os
+import re
+from collections import namedtuple
+
+CHARS_PER_TOKEN = 4
+# Words of a dropped user message kept in the summary
+SUMMARY_TOPIC_WORDS = 16
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s')
+SUMMARY_PREFIX = "Earlier in this conversation the user asked: "
+
+# Compact record of one message of a conversation transcript (timestamp in epoch seconds)
+Turn = namedtuple('Turn', 'timestamp sender message source')
+
+
+def estimate_tokens(text):
+    """Approximate token count of a text"""
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text, tokens):
+    """Cut text to about the given number of tokens, keeping its beginning"""
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    return text[:max(limit - 3, 0)].rstrip() + '...'
+
+
+class ConversationContext:
+    """Recent turns plus a summary of older ones, within a token budget"""
+
+    __slots__ = ('max_tokens', 'summary_tokens', 'turns', 'turn_tokens', 'topics', 'topic_tokens', 'dropped_turns')
+
+    def __init__(self, max_tokens=None, summary_tokens=None):
+        # Budget for everything sent as history: summary and turns
+        self.max_tokens = max_tokens if max_tokens is not None else int(os.getenv('CONTEXT_MAX_TOKENS', '1024'))
+        # Part of the budget the summary of dropped turns may use
+        self.summary_tokens = summary_tokens if summary_tokens is not None else max(self.max_tokens // 8, 0)
+
+        self.turns = []          # (role, content, tokens)
+        self.turn_tokens = 0
+        self.topics = []         # (topic, tokens) of dropped user turns
+        self.topic_tokens = 0
+        self.dropped_turns = 0
+
+    def add(self, role, content):
+        """Append a turn ('user' or 'assistant'), dropping the oldest turns beyond the budget"""
+        content = truncate_to_tokens(content, max(self.max_tokens - self.summary_tokens, 0))
+        tokens = estimate_tokens(content)
+        self.turns.append((role, content, tokens))
+        self.turn_tokens += tokens
+        while self.turns and self.tokens() > self.max_tokens:
+            self.drop_oldest()
+
+    def drop_oldest(self):
+        """Move the oldest turn out of the window, keeping the gist of user turns in the summary"""
+        role, content, tokens = self.turns.pop(0)
+        self.turn_tokens -= tokens
+        self.dropped_turns += 1
+        if role != 'user' or self.summary_tokens <= 0:
+            return
+
+        words = SENTENCE_END.split(content, 1)[0].split()
+        topic = ' '.join(words[:SUMMARY_TOPIC_WORDS]) + ('...' if len(words) > SUMMARY_TOPIC_WORDS else '')
+        topic_tokens = estimate_tokens(topic) + 1
+        self.topics.append((topic, topic_tokens))
+        self.topic_tokens += topic_tokens
+        # Oldest topics go first when the summary is over its share
+        while self.topics and self.summary_size() > self.summary_tokens:
+            _, old_tokens = self.topics.pop(0)
+            self.topic_tokens -= old_tokens
+
+    def messages(self):
+        """History as chat messages: a summary of dropped turns, then the recent turns"""
+        messages = []
+        if self.topics:
+            summary = '; '.join(topic for topic, _ in self.topics)
+            messages.append({"role": "system", "content": SUMMARY_PREFIX + summary})
+        messages.extend({"role": role, "content": content} for role, content, _ in self.turns)
+        return messages
+
+    def summary_size(self):
+        """Estimated tokens of the summary message"""
+        return self.topic_tokens + estimate_tokens(SUMMARY_PREFIX) if self.topics else 0
+
+    def tokens(self):
+        """Estimated tokens of the history as sent"""
+        return self.turn_tokens + self.summary_size()
+
+    def state(self):
+        """JSON-serializable contents, for load_state"""
+        return {"turns": self.turns, "topics": self.topics, "dropped_turns": self.dropped_turns}
+
+    def load_state(self, state):
+        """Replace the contents with those saved by state()"""
+        self.turns = [tuple(turn) for turn in state["turns"]]
+        self.topics = [tuple(topic) for topic in state["topics"]]
+        self.turn_tokens = sum(turn[2] for turn in self.turns)
+        self.topic_tokens = sum(topic[1] for topic in self.topics)
+        self.dropped_turns = state["dropped_turns"]
+        # The budget may have been lowered since
+        while self.turns and self.tokens() > self.max_tokens:
+            self.drop_oldest()
+
+    def clear(self):
+        self.turns = []
+        self.topics = []
+        self.turn_tokens = 0
+        self.topic_tokens = 0
+        self.dropped_turns = 0
+
+    def __len__(self):
+        return len(self.turns)
@@ -0,0 +1,105 @@
+"""
+Gunicorn settings for serving the web interface in production
+
+    gunicorn web_app:app
+
+(Gunicorn reads this file from the current directory.) The app, with its
+knowledge base and compiled index, is loaded once in the master process before
+the workers are forked, so all workers share that memory copy-on-write. Each
+worker warms up its responders before it accepts requests.
+
+Graceful restart: `kill -HUP <master pid>` starts new workers and lets the old
+ones finish their requests (up to graceful_timeout). As the app is preloaded, a
+code change needs a new master: `kill -USR2 <master pid>`, then `kill -QUIT` the
+old master once the new one is up. Edits to knowledge_base.json are picked up by
+every worker without a restart.
+
+Workers export their metrics to METRICS_DIR (by default a temporary directory
+of this server), so /metrics and /health report all of them.
+"""
+
+import gc
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# Objects created while the app is loaded are frozen before forking (see when_ready);
+# collections before that would touch every page and defeat the copy-on-write sharing
+gc.disable()
+
+bind = os.getenv('WEB_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_WORKERS', str(multiprocessing.cpu_count())))
+# Threads per worker; requests mostly wait on the AI providers
+threads = int(os.getenv('WEB_THREADS', '8'))
+# An open WebSocket holds a thread of a gthread worker until it is closed for idling
+# (see WEBSOCKET_MAX_CONNECTIONS). gevent workers serve them as greenlets instead:
+# WEB_WORKER_CLASS=gevent
+worker_class = os.getenv('WEB_WORKER_CLASS', 'gthread')
+# Connections a gevent or eventlet worker serves at once
+worker_connections = int(os.getenv('WEB_WORKER_CONNECTIONS', '1000'))
+# WebSockets per worker: half its threads or connections, so HTTP requests always find one free
+os.environ.setdefault('WEBSOCKET_MAX_CONNECTIONS', str(
+    (worker_connections if worker_class in ('gevent', 'eventlet') else threads) // 2
+))
+preload_app = True
+# Must exceed the slowest answer, streamed ones included
+timeout = int(os.getenv('WEB_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+# '' turns the access log off
+accesslog = os.getenv('WEB_ACCESS_LOG', '-') or None
+
+# Set before the app is loaded, which reads it; kept when this file runs again on HUP
+default_metrics_dir = os.path.join(tempfile.gettempdir(), f'chatbot-metrics-{os.getpid()}')
+os.environ.setdefault('METRICS_DIR', default_metrics_dir)
+
+
+def on_starting(server):
+    """Drop metrics files left by an earlier server using the same directory"""
+    import metrics
+    metrics.clear_directory()
+
+
+def when_ready(server):
+    """The app is loaded: move its objects out of the collector's reach before forking"""
+    import web_app
+    # Before gevent workers patch the standard library, and shared copy-on-write
+    web_app.ai_service.import_clients()
+    gc.freeze()
+    gc.enable()
+    server.log.info("Knowledge base preloaded, starting %s %s workers", workers, worker_class)
+
+
+def post_fork(server, worker):
+    # This file is executed again on HUP, which disables the collector in the master again
+    gc.enable()
+
+
+def post_worker_init(worker):
+    """Warm up the worker before it accepts requests"""
+    import metrics
+    import web_app
+    web_app.warm_up()
+    metrics.start_exporting()
+
+
+def worker_exit(server, worker):
+    """Close the provider connections of a stopping worker and export its last metrics"""
+    import metrics
+    import web_app
+    web_app.pipeline.close()
+    if metrics.MULTIPROCESS_DIR:
+        metrics.export()
+
+
+def child_exit(server, worker):
+    """Keep the counters of a stopped worker, drop its gauges"""
+    import metrics
+    metrics.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    import metrics
+    if metrics.MULTIPROCESS_DIR == default_metrics_dir:
+        shutil.rmtree(default_metrics_dir, ignore_errors=True)
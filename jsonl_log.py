@@ -0,0 +1,82 @@
+"""
+Append-only JSONL logs written off the request path
+
+The routing decisions of ChatPipeline and the near hits of SemanticCache are
+logged for tuning. Requests only queue a record; a background thread per process
+appends them in batches and moves a full log to <path>.1.
+"""
+
+import json
+import os
+import queue
+import threading
+
+
+class JsonlLog:
+    """JSONL file of records, appended by a background thread and rotated at max_bytes
+
+    Requests only queue their record. If the writer falls more than max_pending
+    records behind, new records are dropped instead of piling up in memory.
+    """
+
+    def __init__(self, path, max_bytes, max_pending=10000, name="JSONL log"):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_pending = max_pending
+        # Used in the writer thread's name and error messages
+        self.name = name
+        self.records = None
+        self.thread = None
+        self.pid = None
+        self.lock = threading.Lock()
+        self.dropped = 0
+
+    def write(self, record):
+        if self.pid != os.getpid():
+            self.start()
+        try:
+            self.records.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        """Start the writer thread of this process (threads do not survive a fork)"""
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.records = queue.Queue(self.max_pending)
+            thread_name = self.name.lower().replace(' ', '-')
+            self.thread = threading.Thread(target=self.run, args=(self.records,), name=thread_name, daemon=True)
+            self.thread.start()
+            self.pid = os.getpid()
+
+    def run(self, records):
+        while True:
+            batch = [records.get()]
+            while not records.empty() and batch[-1] is not None:
+                batch.append(records.get_nowait())
+            lines = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in batch if record is not None)
+            try:
+                self.rotate()
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(lines)
+            except OSError as e:
+                print(f"{self.name} error: {e}")
+            if batch[-1] is None:
+                return
+
+    def rotate(self):
+        """Move a full log to <path>.1, replacing the previous one"""
+        try:
+            if os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, self.path + '.1')
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        """Write the queued records and stop the writer thread"""
+        if self.thread is not None and self.pid == os.getpid():
+            self.records.put(None)
+            self.thread.join(5)
+            self.thread = None
+            self.pid = None
@@ -0,0 +1,240 @@
+"""
+Compiled pattern index for the knowledge base
+
+Patterns are preprocessed once and stored in an inverted index from lemma to
+pattern. The index can be written to a compact binary sidecar file next to the
+knowledge base file and memory-mapped, so every worker process shares the same
+pages instead of rebuilding the index in its own memory.
+
+Sidecar layout (little endian):
+    header      magic, version, flags, digest of source file + preprocessing,
+                counts, section offsets
+    categories  (string offset, string length) per category
+    patterns    (category id, string offset, string length) per pattern
+    words       (string offset, string length, postings start, postings count)
+                per lemma, sorted by lemma bytes for binary search
+    postings    u32 pattern ids
+    lemmas      (form offset, form length, lemma offset, lemma length) per
+                surface form, sorted by form bytes
+    strings     UTF-8 blob
+"""
+
+import mmap
+import os
+import struct
+
+MAGIC = b'KBIX'
+VERSION = 2
+
+# Header flags
+FLAG_WORDNET = 1  # the lemma table was computed with WordNet
+
+HEADER = struct.Struct('<4sHH32sIIII6Q')
+CATEGORY = struct.Struct('<II')
+PATTERN = struct.Struct('<III')
+WORD = struct.Struct('<IIII')
+POSTING = struct.Struct('<I')
+LEMMA = struct.Struct('<IIII')
+
+
+class PatternIndex:
+    """In-memory pattern index built from (category, processed_pattern) pairs
+    
+    Also carries the lemma table (surface form -> lemma) used to preprocess
+    text against this knowledge base.
+    """
+
+    def __init__(self, patterns=(), lemmas=None, flags=0):
+        self.lemmas = dict(lemmas or {})
+        self.flags = flags
+        # Each entry is (category, processed_pattern, pattern_words)
+        self.patterns = []
+        self.words = {}
+
+        for category, processed_pattern in patterns:
+            self.add_pattern(category, processed_pattern)
+
+    def add_pattern(self, category, processed_pattern):
+        """Append a preprocessed pattern and index it by its lemmas"""
+        pattern_words = frozenset(processed_pattern.split())
+        pattern_id = len(self.patterns)
+        self.patterns.append((category, processed_pattern, pattern_words))
+
+        for word in pattern_words:
+            self.words.setdefault(word, []).append(pattern_id)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def __getitem__(self, pattern_id):
+        return self.patterns[pattern_id]
+
+    def __iter__(self):
+        return iter(self.patterns)
+
+    def postings(self, word):
+        """Return ids of patterns containing the lemma"""
+        return self.words.get(word, ())
+
+    def lemma(self, form):
+        """Return the lemma of a surface form from the lemma table, or None"""
+        return self.lemmas.get(form)
+
+    def candidates(self, input_words):
+        """Return ids of patterns sharing at least one lemma with the input, in table order"""
+        candidates = set()
+        for word in input_words:
+            candidates.update(self.postings(word))
+        return sorted(candidates)
+
+    def close(self):
+        """Nothing to release; same interface as MappedPatternIndex"""
+
+    def save(self, path, digest):
+        """Write the index to a binary sidecar file, atomically replacing any old one"""
+        strings = bytearray()
+
+        def add_string(text):
+            data = text.encode('utf-8')
+            offset = len(strings)
+            strings.extend(data)
+            return offset, len(data)
+
+        category_ids = {}
+        category_table = bytearray()
+        pattern_table = bytearray()
+        for category, processed_pattern, _ in self.patterns:
+            if category not in category_ids:
+                category_ids[category] = len(category_ids)
+                category_table += CATEGORY.pack(*add_string(category))
+            pattern_table += PATTERN.pack(category_ids[category], *add_string(processed_pattern))
+
+        word_table = bytearray()
+        postings = bytearray()
+        for word in sorted(self.words, key=lambda w: w.encode('utf-8')):
+            pattern_ids = self.words[word]
+            word_table += WORD.pack(*add_string(word), len(postings) // POSTING.size, len(pattern_ids))
+            for pattern_id in pattern_ids:
+                postings += POSTING.pack(pattern_id)
+
+        categories_offset = HEADER.size
+        patterns_offset = categories_offset + len(category_table)
+        words_offset = patterns_offset + len(pattern_table)
+        lemma_table = bytearray()
+        for form in sorted(self.lemmas, key=lambda f: f.encode('utf-8')):
+            lemma_table += LEMMA.pack(*add_string(form), *add_string(self.lemmas[form]))
+
+        postings_offset = words_offset + len(word_table)
+        lemmas_offset = postings_offset + len(postings)
+        strings_offset = lemmas_offset + len(lemma_table)
+        header = HEADER.pack(
+            MAGIC, VERSION, self.flags, digest,
+            len(category_ids), len(self.patterns), len(self.words), len(self.lemmas),
+            categories_offset, patterns_offset, words_offset, postings_offset, lemmas_offset, strings_offset
+        )
+
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            for section in (header, category_table, pattern_table, word_table, postings, lemma_table, strings):
+                f.write(section)
+        os.replace(temp_path, path)
+
+
+class MappedPatternIndex:
+    """Read-only pattern index backed by a memory-mapped sidecar file"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            (magic, version, self.flags, self.digest,
+             self.category_count, self.pattern_count, self.word_count, self.lemma_count,
+             self.categories_offset, self.patterns_offset, self.words_offset,
+             self.postings_offset, self.lemmas_offset, self.strings_offset) = HEADER.unpack_from(self.buffer, 0)
+        except struct.error:
+            self.buffer.close()
+            raise
+        if magic != MAGIC or version != VERSION:
+            self.buffer.close()
+            raise ValueError(f"Not a knowledge base index: {path}")
+
+        # Category names are few and looked up constantly
+        self.categories = [
+            self.read_string(*CATEGORY.unpack_from(self.buffer, self.categories_offset + i * CATEGORY.size))
+            for i in range(self.category_count)
+        ]
+
+    def read_string(self, offset, length):
+        start = self.strings_offset + offset
+        return self.buffer[start:start + length].decode('utf-8')
+
+    def __len__(self):
+        return self.pattern_count
+
+    def __getitem__(self, pattern_id):
+        if not 0 <= pattern_id < self.pattern_count:
+            raise IndexError(pattern_id)
+        category_id, offset, length = PATTERN.unpack_from(self.buffer, self.patterns_offset + pattern_id * PATTERN.size)
+        processed_pattern = self.read_string(offset, length)
+        return self.categories[category_id], processed_pattern, frozenset(processed_pattern.split())
+
+    def __iter__(self):
+        for pattern_id in range(self.pattern_count):
+            yield self[pattern_id]
+
+    def search(self, table_offset, count, record, key):
+        """Binary search a table sorted by its leading string field; returns the record or None"""
+        target = key.encode('utf-8')
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            fields = record.unpack_from(self.buffer, table_offset + middle * record.size)
+            string_start = self.strings_offset + fields[0]
+            current = self.buffer[string_start:string_start + fields[1]]
+            if current < target:
+                low = middle + 1
+            elif current > target:
+                high = middle
+            else:
+                return fields
+        return None
+
+    def postings(self, word):
+        """Return ids of patterns containing the lemma"""
+        fields = self.search(self.words_offset, self.word_count, WORD, word)
+        if fields is None:
+            return ()
+        _, _, start, count = fields
+        first = self.postings_offset + start * POSTING.size
+        return [pattern_id for (pattern_id,) in POSTING.iter_unpack(self.buffer[first:first + count * POSTING.size])]
+
+    def lemma(self, form):
+        """Return the lemma of a surface form from the lemma table, or None"""
+        fields = self.search(self.lemmas_offset, self.lemma_count, LEMMA, form)
+        if fields is None:
+            return None
+        return self.read_string(fields[2], fields[3])
+
+    def candidates(self, input_words):
+        """Return ids of patterns sharing at least one lemma with the input, in table order"""
+        candidates = set()
+        for word in input_words:
+            candidates.update(self.postings(word))
+        return sorted(candidates)
+
+    def close(self):
+        """Unmap the file; the index cannot be used afterwards"""
+        self.buffer.close()
+
+
+def load_index(path, digest):
+    """Map a sidecar index if it exists and was compiled from the same source; otherwise None"""
+    try:
+        index = MappedPatternIndex(path)
+    except (OSError, ValueError, struct.error):
+        return None
+    if index.digest != digest:
+        index.close()
+        return None
+    return index
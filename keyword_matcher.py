@@ -0,0 +1,81 @@
+"""
+Single-pass multi-keyword matching
+
+KeywordMatcher compiles a fixed set of keywords once and reports every keyword
+that occurs anywhere in a text (plain substring semantics, like `keyword in text`)
+in one pass, instead of one scan per keyword.
+
+Uses an Aho-Corasick automaton from the optional `pyahocorasick` package when it
+is installed, and otherwise a trie-shaped regular expression.
+"""
+
+import re
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+def trie_pattern(keywords):
+    """Build a regex alternation shaped like a trie, matching the longest keyword at a position"""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = '(?:' + '|'.join(branches) + ')'
+        # A keyword ending here makes the longer continuations optional
+        return body + '?' if '' in node else body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Find all occurrences of a fixed keyword set in one pass over the text"""
+
+    def __init__(self, keywords):
+        self.keywords = frozenset(keywords)
+        # Single characters are cheapest to find with the C-level `in` scan, and would
+        # otherwise produce one automaton hit per occurrence in pasted code
+        self.single_chars = frozenset(k for k in self.keywords if len(k) == 1)
+        words = sorted(k for k in self.keywords if len(k) > 1)
+        # Every keyword contained in a hit is a hit as well
+        self.contained = {k: frozenset(other for other in words if other in k) for k in words}
+
+        self.automaton = None
+        self.regex = None
+        if ahocorasick is not None and words:
+            self.automaton = ahocorasick.Automaton()
+            for word in words:
+                self.automaton.add_word(word, word)
+            self.automaton.make_automaton()
+        elif words:
+            self.regex = re.compile(trie_pattern(words))
+
+    def find(self, text):
+        """Return the set of keywords that occur in text"""
+        found = {char for char in self.single_chars if char in text}
+
+        if self.automaton is not None:
+            for _, word in self.automaton.iter(text):
+                found.add(word)
+        elif self.regex is not None:
+            search = self.regex.search
+            position = 0
+            while True:
+                match = search(text, position)
+                if match is None:
+                    break
+                # The regex reports the longest keyword starting here; shorter ones are
+                # its prefixes, picked up through `contained`
+                found.update(self.contained[match.group()])
+                position = match.start() + 1
+
+        return found
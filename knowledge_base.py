@@ -1,166 +1,250 @@
 import json
-import re
+import os
+import hashlib
 import random
-import nltk
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
+import threading
+import time
+from caching import LRUCache
+from kb_index import FLAG_WORDNET, PatternIndex, load_index
+from text_processing import (ENGLISH_STOP_WORDS, PREPROCESSING_VERSION, build_lemma_table,
+                             fast_tokenize, load_wordnet_lemmatizer, normalize)
+
+DEFAULT_KNOWLEDGE_BASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'knowledge_base.json')
 
 class KnowledgeBase:
-    def __init__(self):
-        self.data = {
-            "greetings": {
-                "patterns": ["hello", "hi", "hey", "good morning", "good afternoon", "good evening"],
-                "responses": [
-                    "Hello! How can I help you today?",
-                    "Hi there! What would you like to know?",
-                    "Hey! I'm here to answer your questions.",
-                    "Greetings! How may I assist you?"
-                ]
-            },
-            "goodbye": {
-                "patterns": ["bye", "goodbye", "see you", "farewell", "exit", "quit"],
-                "responses": [
-                    "Goodbye! Have a great day!",
-                    "See you later! Feel free to come back anytime.",
-                    "Bye! It was nice chatting with you.",
-                    "Farewell! Take care!"
-                ]
-            },
-            "thanks": {
-                "patterns": ["thank you", "thanks", "appreciate", "grateful"],
-                "responses": [
-                    "You're welcome!",
-                    "Happy to help!",
-                    "No problem at all!",
-                    "Glad I could assist you!"
-                ]
-            },
-            "weather": {
-                "patterns": ["weather", "temperature", "rain", "sunny", "cloudy", "forecast"],
-                "responses": [
-                    "I don't have access to real-time weather data, but I recommend checking a weather app or website for current conditions.",
-                    "For accurate weather information, please check your local weather service or a weather app.",
-                    "I'd love to help with weather, but I don't have current weather data. Try a weather website!"
-                ]
-            },
-            "time": {
-                "patterns": ["time", "date", "day", "hour", "minute", "clock"],
-                "responses": [
-                    "I don't have access to current time, but you can check the time on your device.",
-                    "You can find the current time and date on your computer or phone.",
-                    "I don't have real-time clock access. Please check your system time."
-                ]
-            },
-            "programming": {
-                "patterns": ["python", "code", "programming", "javascript", "html", "css", "java", "c++", "software"],
-                "responses": [
-                    "Programming is a great skill! What specific programming topic would you like to know about?",
-                    "I can help with programming concepts! Are you interested in a particular language?",
-                    "Programming questions are welcome! What would you like to learn?",
-                    "There are many programming languages. What are you working on?"
-                ]
-            },
-            "math": {
-                "patterns": ["math", "mathematics", "calculate", "equation", "algebra", "geometry", "calculus"],
-                "responses": [
-                    "I can help with basic math concepts! What mathematical topic interests you?",
-                    "Mathematics is fascinating! What specific area would you like to explore?",
-                    "I'd be happy to discuss math topics. What would you like to know?",
-                    "Math questions are great! What calculation or concept can I help with?"
-                ]
-            },
-            "science": {
-                "patterns": ["science", "physics", "chemistry", "biology", "astronomy", "research"],
-                "responses": [
-                    "Science is amazing! What scientific topic would you like to explore?",
-                    "I love science questions! Which field interests you most?",
-                    "Science covers so many areas. What would you like to learn about?",
-                    "Scientific inquiry is wonderful! What aspect interests you?"
-                ]
-            },
-            "help": {
-                "patterns": ["help", "what can you do", "capabilities", "features", "commands"],
-                "responses": [
-                    "I can help answer questions on various topics like programming, math, science, and general knowledge. Just ask me anything!",
-                    "I'm here to assist with information and answer your questions. Try asking me about different subjects!",
-                    "I can discuss topics like technology, science, math, and more. What would you like to know?",
-                    "Feel free to ask me questions about various subjects. I'll do my best to help!"
-                ]
-            }
-        }
+    def __init__(self, path=None, matcher='overlap', similarity_threshold=0.3,
+                 text_cache_size=4096, lemma_cache_size=16384, compiled_index=True,
+                 nltk_fallback=False):
+        # Intents are loaded from an external JSON file; the compiled index lives next to it
+        self.path = path or os.getenv('KNOWLEDGE_BASE_PATH') or DEFAULT_KNOWLEDGE_BASE_PATH
+        self.index_path = os.path.splitext(self.path)[0] + '.idx'
+        self.compiled_index = compiled_index
+        with open(self.path, 'rb') as f:
+            source = f.read()
+        self.data = json.loads(source)
+        self.source_digest = hashlib.sha256(source).digest()
         
-        # Initialize NLTK components
-        self.lemmatizer = WordNetLemmatizer()
-        try:
-            self.stop_words = set(stopwords.words('english'))
-        except LookupError:
-            # If stopwords not downloaded, use basic set
-            self.stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'}
+        # Built-in tokenizer and stop words; lemmas come from the index's lemma table.
+        # With nltk_fallback, words outside the knowledge base vocabulary are lemmatized
+        # with WordNet (loaded on first use) instead of being kept as they are.
+        self.stop_words = ENGLISH_STOP_WORDS
+        self.nltk_fallback = nltk_fallback
+        self.fallback_lemmatizer = None
+        self.fallback_lock = threading.Lock()
+        
+        # Memoize normalized messages and per-token lemmas
+        self.text_cache = LRUCache(text_cache_size)
+        self.lemma_cache = LRUCache(lemma_cache_size)
+        
+        # Matching engine: 'overlap' (word overlap) or 'tfidf' (vectorized cosine)
+        if matcher not in ('overlap', 'tfidf'):
+            raise ValueError(f"Unknown matcher: {matcher}")
+        self.matcher = matcher
+        self.similarity_threshold = similarity_threshold
+        self.vectorizer = None
+        self.tfidf_matrix = None
+        
+        # Preprocess every pattern once and index it by lemma
+        self.build_pattern_index()
+        if self.matcher == 'tfidf':
+            self.build_tfidf_index()
     
     def preprocess_text(self, text):
         """Clean and preprocess text for better matching"""
-        # Convert to lowercase
-        text = text.lower()
-        # Remove punctuation and special characters
-        text = re.sub(r'[^\w\s]', '', text)
-        # Tokenize
-        try:
-            tokens = word_tokenize(text)
-        except LookupError:
-            # If punkt tokenizer not available, use simple split
-            tokens = text.split()
+        cached = self.text_cache.get(text)
+        if cached is not None:
+            return cached
+        
+        # Lowercase, strip punctuation and tokenize
+        tokens = fast_tokenize(normalize(text))
         
         # Remove stop words and lemmatize
         processed_tokens = []
         for token in tokens:
             if token not in self.stop_words:
-                try:
-                    lemmatized = self.lemmatizer.lemmatize(token)
-                    processed_tokens.append(lemmatized)
-                except:
-                    processed_tokens.append(token)
+                processed_tokens.append(self.lemmatize_token(token))
         
-        return ' '.join(processed_tokens)
+        processed = ' '.join(processed_tokens)
+        self.text_cache.put(text, processed)
+        return processed
     
-    def find_best_match(self, user_input):
-        """Find the best matching response category"""
+    def lemmatize_token(self, token):
+        """Lemmatize a single token from the lemma table, memoized"""
+        lemma = self.lemma_cache.get(token)
+        if lemma is None:
+            lemma = self.pattern_index.lemma(token)
+            if lemma is None:
+                lemma = self.fallback_lemma(token)
+            self.lemma_cache.put(token, lemma)
+        return lemma
+    
+    def fallback_lemma(self, token):
+        """Lemma of a word outside the knowledge base vocabulary"""
+        if not self.nltk_fallback:
+            return token
+        with self.fallback_lock:
+            if self.fallback_lemmatizer is None:
+                self.fallback_lemmatizer = load_wordnet_lemmatizer() or False
+        if not self.fallback_lemmatizer:
+            return token
+        return self.fallback_lemmatizer.lemmatize(token)
+    
+    def cache_stats(self):
+        """Return hit, miss and eviction counters of the preprocessing caches"""
+        return {
+            'text': self.text_cache.stats(),
+            'lemma': self.lemma_cache.stats()
+        }
+    
+    def build_pattern_index(self):
+        """Map the compiled sidecar index, or preprocess all patterns and compile it"""
+        digest = hashlib.sha256(self.source_digest + PREPROCESSING_VERSION.encode('utf-8')).digest()
+        if self.compiled_index:
+            index = load_index(self.index_path, digest)
+            # An index compiled without WordNet is stale once WordNet is used for the fallback
+            if index is not None and not (self.nltk_fallback and not index.flags & FLAG_WORDNET
+                                          and load_wordnet_lemmatizer() is not None):
+                self.pattern_index = index
+                return
+        
+        # The lemma table covers every word the patterns use, plus its inflections
+        vocabulary = {
+            token
+            for data in self.data.values()
+            for pattern in data['patterns']
+            for token in fast_tokenize(normalize(pattern))
+            if token not in self.stop_words
+        }
+        lemmatizer = load_wordnet_lemmatizer()
+        self.pattern_index = PatternIndex(
+            lemmas=build_lemma_table(vocabulary, lemmatizer),
+            flags=FLAG_WORDNET if lemmatizer is not None else 0
+        )
+        for category, data in self.data.items():
+            for pattern in data['patterns']:
+                self.pattern_index.add_pattern(category, self.preprocess_text(pattern))
+        
+        if self.compiled_index:
+            try:
+                self.pattern_index.save(self.index_path, digest)
+            except OSError as e:
+                print(f"Could not write knowledge base index {self.index_path}: {e}")
+    
+    def build_tfidf_index(self):
+        """Fit a TF-IDF matrix over all preprocessed patterns"""
+        # scikit-learn and NumPy are only needed by the TF-IDF engine
+        import numpy as np
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        
+        # Keep single-character tokens so short patterns still get a vector
+        self.vectorizer = TfidfVectorizer(token_pattern=r'(?u)\b\w+\b')
+        self.tfidf_matrix = self.vectorizer.fit_transform(
+            [processed_pattern for _, processed_pattern, _ in self.pattern_index]
+        )
+        self.pattern_categories = np.array(
+            [category for category, _, _ in self.pattern_index], dtype=object
+        )
+    
+    def match(self, user_input):
+        """Return (category, confidence) for the best match; category is None below the threshold"""
+        if self.matcher == 'tfidf':
+            return self.match_tfidf(user_input)
+        return self.match_overlap(user_input)
+    
+    def match_overlap(self, user_input):
+        """Score candidate patterns by word overlap; confidence is the best score scaled to 0-1"""
         processed_input = self.preprocess_text(user_input)
+        input_words = set(processed_input.split())
         best_match = None
         best_score = 0
         
-        for category, data in self.data.items():
-            for pattern in data['patterns']:
-                processed_pattern = self.preprocess_text(pattern)
-                
-                # Simple keyword matching
-                if processed_pattern in processed_input or processed_input in processed_pattern:
-                    score = len(processed_pattern.split())
-                    if score > best_score:
-                        best_score = score
-                        best_match = category
-                
-                # Calculate similarity using basic word overlap
-                input_words = set(processed_input.split())
-                pattern_words = set(processed_pattern.split())
-                overlap = len(input_words.intersection(pattern_words))
-                if overlap > 0:
-                    similarity = overlap / max(len(input_words), len(pattern_words))
-                    if similarity > 0.3 and similarity * 10 > best_score:
-                        best_score = similarity * 10
-                        best_match = category
-        
-        return best_match
+        # Only patterns that share a lemma with the input can score
+        for pattern_id in self.pattern_index.candidates(input_words):
+            category, processed_pattern, pattern_words = self.pattern_index[pattern_id]
+            
+            # Simple keyword matching
+            if processed_pattern in processed_input or processed_input in processed_pattern:
+                score = len(processed_pattern.split())
+                if score > best_score:
+                    best_score = score
+                    best_match = category
+            
+            # Calculate similarity using basic word overlap
+            overlap = len(input_words.intersection(pattern_words))
+            similarity = overlap / max(len(input_words), len(pattern_words))
+            if similarity > self.similarity_threshold and similarity * 10 > best_score:
+                best_score = similarity * 10
+                best_match = category
+        
+        return best_match, min(best_score / 10, 1.0)
     
-    def get_response(self, user_input):
-        """Get appropriate response for user input"""
-        best_match = self.find_best_match(user_input)
+    def match_tfidf(self, user_input):
+        """Score the input against every pattern with one sparse matrix product"""
+        categories, scores = self.classify_batch([user_input])
+        return categories[0], float(scores[0])
+    
+    def score_tfidf(self, processed_texts):
+        """Return the best pattern id and cosine score for each preprocessed text"""
+        import numpy as np
+        
+        if self.tfidf_matrix is None:
+            self.build_tfidf_index()
         
-        if best_match:
-            responses = self.data[best_match]['responses']
+        queries = self.vectorizer.transform(processed_texts)
+        # Rows are L2-normalized, so the dot product is the cosine similarity
+        scores = (queries @ self.tfidf_matrix.T).tocsr()
+        # Sorted column indices make argmax ties resolve in table order
+        scores.sort_indices()
+        best_patterns = np.asarray(scores.argmax(axis=1)).ravel()
+        best_scores = np.asarray(scores.max(axis=1).todense()).ravel()
+        return best_patterns, best_scores
+    
+    def classify_batch(self, messages, chunk_size=1024):
+        """Classify many messages with the TF-IDF engine, chunk by chunk to bound memory
+        
+        Returns (categories, scores) as arrays; a category is None below the threshold.
+        """
+        import numpy as np
+        
+        categories = np.empty(len(messages), dtype=object)
+        scores = np.zeros(len(messages), dtype=float)
+        if not len(messages) or not len(self.pattern_index):
+            return categories, scores
+        
+        for start in range(0, len(messages), chunk_size):
+            chunk = messages[start:start + chunk_size]
+            # Logged traffic repeats a lot, so preprocess and score each distinct message once
+            unique_ids = {}
+            positions = np.array([unique_ids.setdefault(m, len(unique_ids)) for m in chunk])
+            best_patterns, best_scores = self.score_tfidf([self.preprocess_text(m) for m in unique_ids])
+            
+            end = start + len(chunk)
+            matched = best_scores > self.similarity_threshold
+            chunk_categories = np.where(matched, self.pattern_categories[best_patterns], None)
+            categories[start:end] = chunk_categories[positions]
+            scores[start:end] = best_scores[positions]
+        
+        return categories, scores
+    
+    def get_responses_batch(self, messages, chunk_size=1024):
+        """Classify many messages and pick a response for each
+        
+        Returns (categories, scores, responses) as arrays.
+        """
+        import numpy as np
+        
+        categories, scores = self.classify_batch(messages, chunk_size=chunk_size)
+        responses = np.array([self.choose_response(category) for category in categories], dtype=object)
+        return categories, scores, responses
+    
+    def find_best_match(self, user_input):
+        """Find the best matching response category"""
+        return self.match(user_input)[0]
+    
+    def choose_response(self, category):
+        """Pick a random response for a category, or a default one when there is no match"""
+        if category:
+            responses = self.data[category]['responses']
             return random.choice(responses)
         else:
             # Default responses when no match found
@@ -171,4 +255,97 @@ class KnowledgeBase:
                 "I'm still learning! Could you try asking in a different way?",
                 "That's beyond my current knowledge. What else would you like to know?"
             ]
-            return random.choice(default_responses)
\ No newline at end of file
+            return random.choice(default_responses)
+    
+    def get_response(self, user_input):
+        """Get appropriate response for user input"""
+        best_match = self.find_best_match(user_input)
+        return self.choose_response(best_match)
+    
+    def snapshot(self):
+        """The KnowledgeBase to use for all lookups of one request (see ReloadingKnowledgeBase)"""
+        return self
+    
+    def close(self):
+        """Release the memory-mapped index"""
+        self.pattern_index.close()
+
+class ReloadingKnowledgeBase:
+    """KnowledgeBase proxy that picks up changes to the knowledge base file without a restart
+    
+    The file is checked at most every check_interval seconds when the knowledge base
+    is used. A changed file is loaded into a new KnowledgeBase on a background thread
+    and swapped in atomically once it is ready; requests keep using the old one meanwhile.
+    The old one's index is unmapped retire_delay seconds after the swap, once the
+    requests still using it are done.
+    """
+    
+    def __init__(self, path=None, check_interval=2.0, retire_delay=10.0, **kwargs):
+        self.kwargs = kwargs
+        self.check_interval = check_interval
+        self.retire_delay = retire_delay
+        self.current = KnowledgeBase(path, **kwargs)
+        self.path = self.current.path
+        self.file_state = self.read_file_state()
+        self.next_check = time.monotonic() + check_interval
+        self.reload_lock = threading.Lock()
+        self.reloading = False
+    
+    def read_file_state(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+    
+    def check_for_changes(self):
+        """Start a background rebuild if the knowledge base file changed"""
+        now = time.monotonic()
+        if now < self.next_check:
+            return
+        self.next_check = now + self.check_interval
+        
+        file_state = self.read_file_state()
+        if file_state is None or file_state == self.file_state:
+            return
+        with self.reload_lock:
+            if self.reloading:
+                return
+            self.reloading = True
+        threading.Thread(target=self.reload, args=(file_state,), daemon=True).start()
+    
+    def reload(self, file_state):
+        """Build a new KnowledgeBase, swap it in and release the old one"""
+        previous = None
+        try:
+            new_knowledge_base = KnowledgeBase(self.path, **self.kwargs)
+            previous, self.current = self.current, new_knowledge_base
+            print(f"Reloaded knowledge base from {self.path}")
+        except Exception as e:
+            print(f"Error reloading knowledge base, keeping the previous one: {e}")
+        finally:
+            # Remember the state either way so a broken file is not retried on every request
+            self.file_state = file_state
+            self.reloading = False
+        
+        if previous is not None:
+            # Requests that looked up the old knowledge base just before the swap may still be matching
+            time.sleep(self.retire_delay)
+            try:
+                previous.close()
+            except BufferError as e:
+                print(f"Could not unmap the previous knowledge base index: {e}")
+    
+    def snapshot(self):
+        """The current KnowledgeBase, which a reload does not change under the caller
+        
+        Each attribute lookup on the proxy may see a newer knowledge base, so a
+        request that matches a category and then reads its responses takes one
+        snapshot for both.
+        """
+        self.check_for_changes()
+        return self.current
+    
+    def __getattr__(self, name):
+        self.check_for_changes()
+        return getattr(self.current, name)
\ No newline at end of file
@@ -0,0 +1,373 @@
+"""
+Process metrics in the Prometheus text format
+
+Counter, Gauge and Histogram are minimal, dependency-free versions of the
+prometheus_client types. A metric is created once at module level and updated
+through labels(...), e.g.
+
+    REQUESTS = Counter('chat_requests_total', "Chat messages answered", ['source'])
+    REQUESTS.labels('Groq').inc()
+
+Updating costs a dict lookup and an uncontended lock (about a microsecond), so
+instrumentation can stay on in production. Metrics whose value lives elsewhere
+(cache hit counts, ...) take a callback that is read when render() is called.
+
+Values are kept per process. In a multi-process server (gunicorn), set
+METRICS_DIR to a directory shared by the workers: each worker then writes its
+values there every METRICS_EXPORT_INTERVAL seconds (start_exporting), and
+render() reports the totals of all workers, whichever one is scraped. Counters
+and histograms of stopped workers are kept (mark_process_dead); gauges are added
+up over the live workers, or take their maximum, or are reported per worker with
+a pid label (Gauge multiprocess_mode 'sum', 'max' or 'all').
+"""
+
+import bisect
+import json
+import math
+import os
+import threading
+import time
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; spans local answers (microseconds) to slow provider calls
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Every metric created, in creation order
+REGISTRY = []
+
+# Directory the processes of a multi-process server export their values to ('' for none)
+MULTIPROCESS_DIR = os.getenv('METRICS_DIR', '')
+# Seconds between exports, the most a scrape lags behind the other processes
+EXPORT_INTERVAL = float(os.getenv('METRICS_EXPORT_INTERVAL', '1.0'))
+# Counters and histograms of processes that have stopped
+ARCHIVE_FILE = 'archive.json'
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+class Value:
+    """A single counter or gauge value"""
+
+    __slots__ = ('value', 'lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class HistogramValue:
+    """Bucket counts and sum of the observations of one label set"""
+
+    __slots__ = ('upper_bounds', 'counts', 'sum', 'lock')
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.upper_bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Metric:
+    """Base for the metric types: a named family of values, one per label set"""
+
+    kind = 'untyped'
+    # How the values of several processes are combined
+    multiprocess_mode = 'sum'
+
+    def __init__(self, name, documentation, labelnames=(), callback=None, registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Function returning {label values tuple: value}, read at render time instead of stored values
+        self.callback = callback
+        self.lock = threading.Lock()
+        self.children = {}
+        if not self.labelnames and callback is None:
+            # Reported from the start, as 0
+            self.labels()
+        registry.append(self)
+
+    def labels(self, *values):
+        """The value for one combination of label values"""
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self.lock:
+                child = self.children.setdefault(values, self.new_child())
+        return child
+
+    def new_child(self):
+        return Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def values(self):
+        """{label values: value} of this process"""
+        if self.callback is not None:
+            return self.callback()
+        return {k: v.value for k, v in list(self.children.items())}
+
+    def render(self, values=None, per_process=False):
+        """Text exposition of the values (default: this process's); per_process values carry a pid label last"""
+        values = self.values() if values is None else values
+        labelnames = self.labelnames + ('pid',) if per_process and self.multiprocess_mode == 'all' else self.labelnames
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for label_values, value in values.items():
+            lines.append(f'{self.name}{format_labels(labelnames, label_values)} {format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """A value that only goes up"""
+
+    kind = 'counter'
+
+
+class Gauge(Metric):
+    """A value that goes up and down"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback=None, registry=REGISTRY, multiprocess_mode='sum'):
+        if multiprocess_mode not in ('sum', 'max', 'all'):
+            raise ValueError(f"Unknown multiprocess mode: {multiprocess_mode}")
+        self.multiprocess_mode = multiprocess_mode
+        super().__init__(name, documentation, labelnames, callback, registry)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS, registry=REGISTRY):
+        self.upper_bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry=registry)
+
+    def new_child(self):
+        return HistogramValue(self.upper_bounds)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def values(self):
+        """{label values: (bucket counts, sum)} of this process"""
+        values = {}
+        for label_values, child in list(self.children.items()):
+            with child.lock:
+                values[label_values] = (list(child.counts), child.sum)
+        return values
+
+    def render(self, values=None, per_process=False):
+        values = self.values() if values is None else values
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        bucket_labels = self.labelnames + ('le',)
+        for label_values, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.upper_bounds + (math.inf,), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{format_labels(bucket_labels, label_values + (format_value(bound),))} {cumulative}')
+            labels = format_labels(self.labelnames, label_values)
+            lines.append(f'{self.name}_sum{labels} {format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return '\n'.join(lines)
+
+
+def render(registry=REGISTRY, directory=None):
+    """All metrics of a registry in the Prometheus text exposition format, over all processes in multi-process mode"""
+    directory = MULTIPROCESS_DIR if directory is None else directory
+    if not directory:
+        return '\n'.join(metric.render() for metric in registry) + '\n'
+    combined = collect(registry, directory)
+    return '\n'.join(metric.render(combined.get(metric.name, {}), per_process=True) for metric in registry) + '\n'
+
+
+def current_values(metric, directory=None):
+    """{label values: value} of one metric, over all processes in multi-process mode"""
+    directory = MULTIPROCESS_DIR if directory is None else directory
+    if not directory:
+        return metric.values()
+    return collect([metric], directory).get(metric.name, {})
+
+
+# Multi-process mode
+
+def process_file(directory, pid):
+    return os.path.join(directory, f'{pid}.json')
+
+
+def write_json(path, data):
+    """Replace a file atomically, so readers never see a partial one"""
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+
+def read_json(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Gone (a process stopped meanwhile) or unreadable: skip it
+        return {}
+
+
+def export(registry=REGISTRY, directory=None):
+    """Write the values of this process to its file in the metrics directory"""
+    directory = MULTIPROCESS_DIR if directory is None else directory
+    data = {
+        metric.name: {
+            'kind': metric.kind,
+            'mode': metric.multiprocess_mode,
+            'samples': [[list(label_values), value] for label_values, value in metric.values().items()]
+        }
+        for metric in registry
+    }
+    os.makedirs(directory, exist_ok=True)
+    write_json(process_file(directory, os.getpid()), data)
+
+
+def add_sample(kind, mode, values, label_values, value, pid=None):
+    """Combine a process's value into values according to the metric kind"""
+    if kind == 'histogram':
+        counts, total = values.get(label_values, ([0] * len(value[0]), 0.0))
+        values[label_values] = ([a + b for a, b in zip(counts, value[0])], total + value[1])
+    elif mode == 'all':
+        values[label_values + (str(pid),)] = value
+    elif mode == 'max':
+        values[label_values] = max(values.get(label_values, value), value)
+    else:
+        values[label_values] = values.get(label_values, 0) + value
+
+
+def collect(registry=REGISTRY, directory=None):
+    """{metric name: {label values: value}} over the live processes and the archive of stopped ones"""
+    directory = MULTIPROCESS_DIR if directory is None else directory
+    # This process's own values are up to date; the others lag by at most EXPORT_INTERVAL
+    export(registry, directory)
+    names = {metric.name for metric in registry}
+    combined = {}
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith('.json'):
+            continue
+        pid = file_name[:-len('.json')]
+        for name, data in read_json(os.path.join(directory, file_name)).items():
+            if name not in names:
+                continue
+            values = combined.setdefault(name, {})
+            for label_values, value in data['samples']:
+                add_sample(data['kind'], data['mode'], values, tuple(label_values), value, pid)
+    return combined
+
+
+def process_count(directory=None):
+    """Number of processes reporting metrics (1 outside multi-process mode)"""
+    directory = MULTIPROCESS_DIR if directory is None else directory
+    if not directory:
+        return 1
+    try:
+        return sum(1 for name in os.listdir(directory) if name.endswith('.json') and name != ARCHIVE_FILE)
+    except OSError:
+        return 0
+
+
+def mark_process_dead(pid, directory=None):
+    """Move the counters and histograms of a stopped process to the archive and drop its gauges
+    
+    Called by the parent process only (gunicorn's child_exit), so the archive has one writer.
+    """
+    directory = MULTIPROCESS_DIR if directory is None else directory
+    if not directory:
+        return
+    path = process_file(directory, pid)
+    data = read_json(path)
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+    archive = read_json(archive_path)
+    for name, metric in data.items():
+        if metric['kind'] == 'gauge':
+            continue
+        values = {tuple(label_values): value for label_values, value in archive.get(name, {}).get('samples', [])}
+        for label_values, value in metric['samples']:
+            add_sample(metric['kind'], metric['mode'], values, tuple(label_values), value)
+        archive[name] = {'kind': metric['kind'], 'mode': metric['mode'],
+                         'samples': [[list(label_values), value] for label_values, value in values.items()]}
+    if data:
+        write_json(archive_path, archive)
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def clear_directory(directory=None):
+    """Remove the files of an earlier server run"""
+    directory = MULTIPROCESS_DIR if directory is None else directory
+    if not directory or not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.endswith('.json') or name.endswith('.tmp'):
+            os.remove(os.path.join(directory, name))
+
+
+exporter_pid = None
+
+
+def start_exporting(registry=REGISTRY, directory=None, interval=None):
+    """Export this process's values every interval seconds from a background thread"""
+    global exporter_pid
+    directory = MULTIPROCESS_DIR if directory is None else directory
+    interval = EXPORT_INTERVAL if interval is None else interval
+    if not directory or exporter_pid == os.getpid():
+        return
+    exporter_pid = os.getpid()
+
+    def run():
+        while True:
+            try:
+                export(registry, directory)
+            except OSError as e:
+                print(f"Metrics export error: {e}")
+            time.sleep(interval)
+
+    export(registry, directory)
+    threading.Thread(target=run, name="metrics-export", daemon=True).start()
@@ -0,0 +1,186 @@
+"""
+Persistent cache of LLM provider responses
+
+Responses are stored in a SQLite database (WAL mode), so every process of the
+web app and the CLI share one cache. Entries are keyed by provider, normalized
+prompt and the model parameters, expire after a TTL, and the least recently used
+entries are evicted once the stored responses exceed a byte budget. The running
+byte total is kept by triggers, so it stays exact across processes.
+
+Cache errors (locked or unwritable database, ...) are reported and treated as a
+miss; they never fail a chat request.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RESPONSE_CACHE_PATH = os.path.join(current_dir, 'response_cache.sqlite3')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL);
+INSERT OR IGNORE INTO totals (id, bytes) VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS responses_insert AFTER INSERT ON responses BEGIN
+    UPDATE totals SET bytes = bytes + NEW.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS responses_delete AFTER DELETE ON responses BEGIN
+    UPDATE totals SET bytes = bytes - OLD.size WHERE id = 0;
+END;
+"""
+
+# Eviction frees space down to this fraction of the budget, so it runs once per
+# few percent of churn instead of on every insert
+LOW_WATER = 0.9
+
+
+def normalize_prompt(prompt):
+    """Case- and whitespace-insensitive form of a prompt"""
+    return ' '.join(prompt.lower().split())
+
+
+class ResponseCache:
+    """TTL- and byte-bounded response cache in a SQLite file shared by all processes"""
+
+    def __init__(self, path=None, ttl=None, max_bytes=None, busy_timeout=0.1):
+        self.path = path or os.getenv('RESPONSE_CACHE_PATH', DEFAULT_RESPONSE_CACHE_PATH)
+        # Seconds a response stays valid
+        self.ttl = ttl if ttl is not None else float(os.getenv('RESPONSE_CACHE_TTL', '86400'))
+        # Budget for the stored response text, in bytes
+        self.max_bytes = max_bytes if max_bytes is not None else int(float(os.getenv('RESPONSE_CACHE_MAX_MB', '50')) * 1024 * 1024)
+        # Seconds to wait for another process's write lock before giving up on an operation
+        self.busy_timeout = busy_timeout
+
+        # One connection per thread, opened on first use (and reopened after a fork)
+        self.local = threading.local()
+        self.stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def connection(self):
+        """Return this thread's connection, opening the database on first use"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            # Makes INSERT OR REPLACE fire the delete trigger for the row it replaces
+            connection.execute('PRAGMA recursive_triggers=ON')
+            connection.executescript(SCHEMA)
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    def make_key(self, provider, prompt, params=None):
+        """Cache key for a provider request"""
+        material = json.dumps([provider, normalize_prompt(prompt), params or {}], sort_keys=True)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, provider, prompt, params=None):
+        """Return the cached response for a request, or None"""
+        key = self.make_key(provider, prompt, params)
+        now = time.time()
+        try:
+            connection = self.connection()
+            row = connection.execute(
+                'SELECT response FROM responses WHERE key = ? AND created > ?', (key, now - self.ttl)
+            ).fetchone()
+            if row is not None:
+                connection.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+        except sqlite3.Error as e:
+            self.record_error(e)
+            return None
+
+        with self.stats_lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return row[0] if row is not None else None
+
+    def put(self, provider, prompt, response, params=None):
+        """Store a response, evicting expired and least recently used entries over the byte budget"""
+        if not response or self.max_bytes <= 0:
+            return
+        key = self.make_key(provider, prompt, params)
+        size = len(response.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        try:
+            connection = self.connection()
+            connection.execute(
+                'INSERT OR REPLACE INTO responses (key, provider, response, size, created, accessed) '
+                'VALUES (?, ?, ?, ?, ?, ?)', (key, provider, response, size, now, now)
+            )
+            if self.total_bytes(connection) > self.max_bytes:
+                self.evict(connection, now)
+        except sqlite3.Error as e:
+            self.record_error(e)
+
+    def evict(self, connection, now):
+        """Drop expired entries, then the least recently used ones until under the byte budget"""
+        evicted = connection.execute('DELETE FROM responses WHERE created <= ?', (now - self.ttl,)).rowcount
+        excess = self.total_bytes(connection) - int(self.max_bytes * LOW_WATER)
+        if excess > 0:
+            keys = []
+            for key, size in connection.execute('SELECT key, size FROM responses ORDER BY accessed'):
+                keys.append((key,))
+                excess -= size
+                if excess <= 0:
+                    break
+            connection.executemany('DELETE FROM responses WHERE key = ?', keys)
+            evicted += len(keys)
+        with self.stats_lock:
+            self.evictions += evicted
+
+    def total_bytes(self, connection):
+        return connection.execute('SELECT bytes FROM totals WHERE id = 0').fetchone()[0]
+
+    def clear(self):
+        """Drop all entries; counters are kept"""
+        try:
+            self.connection().execute('DELETE FROM responses')
+        except sqlite3.Error as e:
+            self.record_error(e)
+
+    def record_error(self, error):
+        with self.stats_lock:
+            self.errors += 1
+        print(f"Response cache error: {error}")
+
+    def stats(self):
+        """Hit rate of this process and size of the shared cache"""
+        try:
+            connection = self.connection()
+            entries = connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            bytes_used = self.total_bytes(connection)
+        except sqlite3.Error as e:
+            self.record_error(e)
+            entries = bytes_used = None
+        with self.stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': entries,
+                'bytes': bytes_used,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'errors': self.errors,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
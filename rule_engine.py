@@ -0,0 +1,186 @@
+"""
+Declarative keyword rule engine
+
+A rule table is a list of dicts, in priority order:
+
+    {
+        "name": "greetings",
+        "keywords": ["hello", "hi"],      # rule applies if any keyword occurs in the text
+        "confidence": 0.9,                # how likely the answer fits (0-1, default 0.5)
+        "max_words": 6,                   # optional: less confident for longer messages
+        "max_other_words": 0,             # optional: less confident when more content words than
+                                          # this are left besides the keywords and stop words
+        "filler_words": ["there"],        # optional: words max_other_words does not count
+        "handler_keywords": ["add"],      # optional: also reported to the handler in its hits,
+                                          # but they do not select the rule
+        "response": "Hello!",             # fixed answer, or
+        "handler": "math",                # name of a handler function, or
+        "branches": [                     # nested rules, first match wins;
+            {"keywords": ["python"], "response": "..."},
+            {"response": "..."}           # a branch without keywords always matches
+        ]
+    }
+
+A rule without keywords is a catch-all. A handler returning None (and branches
+without a match) fall through to the next applicable rule. A handler may also
+return (answer, confidence), and a branch may set its own confidence.
+
+classify() reports the confidence of the answer, lowered when the keywords that
+selected the rule only occur inside other words ("hi" in "this"), the message
+is longer than max_words or it says more than the keywords (max_other_words: "hi,
+explain recursion" is no greeting), so callers can decide whether the answer is
+good enough.
+
+The table is compiled once: all keywords go into one KeywordMatcher, and each
+keyword maps to the rules that use it, so evaluating a message only visits the
+rules whose keywords actually occur instead of testing every rule in turn.
+"""
+
+import re
+import threading
+import time
+
+from keyword_matcher import KeywordMatcher
+from text_processing import ENGLISH_STOP_WORDS
+
+DEFAULT_CONFIDENCE = 0.5
+# Confidence factors for keywords matched only inside other words, for long messages,
+# and for messages with more content words than max_other_words
+PARTIAL_WORD_FACTOR = 0.3
+LONG_MESSAGE_FACTOR = 0.3
+OTHER_WORDS_FACTOR = 0.3
+
+WORD = re.compile(r'\w+')
+
+
+def whole_word_pattern(keyword):
+    """Regex finding keyword not preceded or followed by more word characters ('+' matches anywhere)"""
+    start = r'(?<!\w)' if keyword[:1].isalnum() else ''
+    end = r'(?!\w)' if keyword[-1:].isalnum() else ''
+    return re.compile(start + re.escape(keyword) + end)
+
+
+class RuleStats:
+    """Counters for one rule"""
+
+    __slots__ = ('name', 'evaluations', 'hits', 'total_time')
+
+    def __init__(self, name):
+        self.name = name
+        self.evaluations = 0
+        self.hits = 0
+        self.total_time = 0.0
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'evaluations': self.evaluations,
+            'hits': self.hits,
+            'total_time_ms': self.total_time * 1000,
+            'avg_time_us': self.total_time / self.evaluations * 1e6 if self.evaluations else 0.0
+        }
+
+
+class RuleEngine:
+    """Compiled rule table with per-rule hit counters and evaluation timings"""
+
+    def __init__(self, rules, handlers=None):
+        self.rules = list(rules)
+        self.handlers = handlers or {}
+        self.stats = [RuleStats(rule['name']) for rule in self.rules]
+        self.stats_lock = threading.Lock()
+
+        keywords = set()
+        self.keyword_rules = {}
+        self.catch_all_rules = []
+        for rule_id, rule in enumerate(self.rules):
+            if rule.get('handler') and rule['handler'] not in self.handlers:
+                raise ValueError(f"Rule {rule['name']!r} uses unknown handler {rule['handler']!r}")
+            if rule.get('keywords'):
+                for keyword in rule['keywords']:
+                    self.keyword_rules.setdefault(keyword, []).append(rule_id)
+            else:
+                self.catch_all_rules.append(rule_id)
+            keywords.update(self.branch_keywords(rule))
+        self.matcher = KeywordMatcher(keywords)
+        self.whole_word_patterns = {keyword: whole_word_pattern(keyword) for keyword in keywords}
+
+    def branch_keywords(self, rule):
+        """All keywords a rule and its nested branches look for"""
+        keywords = set(rule.get('keywords', ())) | set(rule.get('handler_keywords', ()))
+        for branch in rule.get('branches', ()):
+            keywords.update(self.branch_keywords(branch))
+        return keywords
+
+    def candidate_rules(self, hits):
+        """Ids of the rules that can apply, in priority order"""
+        candidates = set(self.catch_all_rules)
+        for keyword in hits:
+            candidates.update(self.keyword_rules.get(keyword, ()))
+        return sorted(candidates)
+
+    def evaluate(self, rule, text, hits, confidence=DEFAULT_CONFIDENCE):
+        """Produce (answer, confidence) for a matched rule; the answer is None to fall through"""
+        confidence = rule.get('confidence', confidence)
+        if 'response' in rule:
+            return rule['response'], confidence
+        if 'handler' in rule:
+            answer = self.handlers[rule['handler']](text, hits)
+            if isinstance(answer, tuple):
+                return answer
+            return answer, confidence
+        for branch in rule.get('branches', ()):
+            if not branch.get('keywords') or not hits.isdisjoint(branch['keywords']):
+                return self.evaluate(branch, text, hits, confidence)
+        return None, confidence
+
+    def adjust_confidence(self, rule, text, hits, confidence):
+        """Lower the confidence for keywords found only inside other words, for long messages
+        and for messages that say more than the keywords"""
+        lowered = text.lower()
+        keywords = hits.intersection(rule.get('keywords', ()))
+        if keywords and not any(self.whole_word_patterns[keyword].search(lowered) for keyword in keywords):
+            confidence *= PARTIAL_WORD_FACTOR
+        if 'max_words' in rule and len(text.split()) > rule['max_words']:
+            confidence *= LONG_MESSAGE_FACTOR
+        if 'max_other_words' in rule and len(self.other_words(rule, lowered, keywords)) > rule['max_other_words']:
+            confidence *= OTHER_WORDS_FACTOR
+        return confidence
+
+    def other_words(self, rule, lowered, keywords):
+        """Content words of a lowercased message besides the rule's keywords, stop words and filler words"""
+        for keyword in keywords:
+            lowered = self.whole_word_patterns[keyword].sub(' ', lowered)
+        filler_words = rule.get('filler_words', ())
+        return [word for word in WORD.findall(lowered) if word not in ENGLISH_STOP_WORDS and word not in filler_words]
+
+    def respond(self, text):
+        """Return (rule name, answer) for the first rule that answers text, or (None, None)"""
+        name, answer, _ = self.classify(text)
+        return name, answer
+
+    def classify(self, text):
+        """Return (rule name, answer, confidence) for the first rule that answers text, or (None, None, 0.0)"""
+        hits = self.matcher.find(text.lower())
+
+        for rule_id in self.candidate_rules(hits):
+            rule = self.rules[rule_id]
+            start = time.perf_counter()
+            answer, confidence = self.evaluate(rule, text, hits)
+            elapsed = time.perf_counter() - start
+
+            stats = self.stats[rule_id]
+            with self.stats_lock:
+                stats.evaluations += 1
+                stats.total_time += elapsed
+                if answer is not None:
+                    stats.hits += 1
+            if answer is not None:
+                return rule['name'], answer, self.adjust_confidence(rule, text, hits, confidence)
+
+        return None, None, 0.0
+
+    def rule_stats(self):
+        """Per-rule evaluation and hit counts with timings, in priority order"""
+        with self.stats_lock:
+            return [stats.as_dict() for stats in self.stats]
@@ -0,0 +1,210 @@
+"""
+Safe, bounded arithmetic evaluator
+
+Parses and evaluates plain arithmetic (numbers, + - * / // **, unary signs and
+parentheses) with the same results as Python's eval for normal expressions, but
+with hard limits on expression length, nesting depth, evaluation steps and the
+size of integer results, so a single request cannot pin the CPU or grow memory
+without bound (e.g. `9**9**9**9`).
+"""
+
+import operator
+import re
+
+from caching import LRUCache
+
+TOKEN = re.compile(r'\s*(?:(\d+\.?\d*|\.\d+)|(\*\*|//|[-+*/()]))')
+
+BINARY_OPERATORS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '//': operator.floordiv,
+    '**': operator.pow,
+}
+
+
+class MathError(ValueError):
+    """Raised for expressions that are invalid or exceed the evaluation limits"""
+
+
+class ExpressionParser:
+    """Recursive-descent parser for one expression, following Python's operator precedence"""
+
+    def __init__(self, expression, max_length, max_depth):
+        if len(expression) > max_length:
+            raise MathError("Expression is too long")
+        self.tokens = self.tokenize(expression)
+        self.position = 0
+        self.depth = 0
+        self.max_depth = max_depth
+
+    def parse(self):
+        """Return the expression tree as nested tuples"""
+        tree = self.parse_expression()
+        if self.position != len(self.tokens):
+            raise MathError("Unexpected input after expression")
+        return tree
+
+    def tokenize(self, expression):
+        tokens = []
+        position = 0
+        expression = expression.rstrip()
+        while position < len(expression):
+            match = TOKEN.match(expression, position)
+            if not match:
+                raise MathError(f"Invalid character at position {position}")
+            number, symbol = match.groups()
+            if number is not None:
+                # Like Python, reject decimal integers with leading zeros such as 05
+                if '.' not in number and len(number) > 1 and number[0] == '0' and number.strip('0'):
+                    raise MathError("Leading zeros are not allowed in integers")
+                tokens.append(('number', float(number) if '.' in number else int(number)))
+            else:
+                tokens.append(('op', symbol))
+            position = match.end()
+        return tokens
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def take_op(self, *symbols):
+        kind, value = self.peek()
+        if kind == 'op' and value in symbols:
+            self.position += 1
+            return value
+        return None
+
+    def parse_expression(self):
+        # expression := term (('+' | '-') term)*
+        node = self.parse_term()
+        while True:
+            symbol = self.take_op('+', '-')
+            if symbol is None:
+                return node
+            node = ('binary', symbol, node, self.parse_term())
+
+    def parse_term(self):
+        # term := factor (('*' | '/' | '//') factor)*
+        node = self.parse_factor()
+        while True:
+            symbol = self.take_op('*', '/', '//')
+            if symbol is None:
+                return node
+            node = ('binary', symbol, node, self.parse_factor())
+
+    def parse_factor(self):
+        # factor := ('+' | '-') factor | power
+        symbol = self.take_op('+', '-')
+        if symbol is not None:
+            self.enter()
+            node = ('unary', symbol, self.parse_factor())
+            self.depth -= 1
+            return node
+        return self.parse_power()
+
+    def parse_power(self):
+        # power := atom ['**' factor]   (right associative, binds tighter than a left unary sign)
+        node = self.parse_atom()
+        if self.take_op('**') is not None:
+            self.enter()
+            node = ('binary', '**', node, self.parse_factor())
+            self.depth -= 1
+        return node
+
+    def parse_atom(self):
+        # atom := number | '(' expression ')'
+        kind, value = self.peek()
+        if kind == 'number':
+            self.position += 1
+            return ('number', value)
+        if self.take_op('(') is not None:
+            self.enter()
+            node = self.parse_expression()
+            if self.take_op(')') is None:
+                raise MathError("Missing closing parenthesis")
+            self.depth -= 1
+            return node
+        raise MathError("Expected a number or '('")
+
+    def enter(self):
+        self.depth += 1
+        if self.depth > self.max_depth:
+            raise MathError("Expression is nested too deeply")
+
+
+class SafeMathEvaluator:
+    """Arithmetic evaluator with bounded cost and a cache of parsed expressions"""
+
+    def __init__(self, max_length=256, max_depth=32, max_steps=512, max_bits=4096, cache_size=1024):
+        self.max_length = max_length
+        self.max_depth = max_depth
+        self.max_steps = max_steps
+        self.max_bits = max_bits
+        # Parsed expressions (or the error they raised), keyed by expression text
+        self.cache = LRUCache(cache_size)
+
+    def evaluate(self, expression):
+        """Evaluate an arithmetic expression, raising MathError if it is invalid or too costly"""
+        tree = self.cache.get(expression)
+        if tree is None:
+            try:
+                tree = ExpressionParser(expression, self.max_length, self.max_depth).parse()
+            except MathError as e:
+                tree = e
+            self.cache.put(expression, tree)
+        if isinstance(tree, MathError):
+            raise tree
+
+        steps = [0]
+        try:
+            return self.evaluate_node(tree, steps)
+        except (ArithmeticError, ValueError) as e:
+            # ZeroDivisionError, float OverflowError, ... exactly like eval would raise
+            raise MathError(str(e)) from e
+
+    # Evaluation
+
+    def evaluate_node(self, node, steps):
+        steps[0] += 1
+        if steps[0] > self.max_steps:
+            raise MathError("Expression takes too many steps")
+
+        if node[0] == 'number':
+            return node[1]
+        if node[0] == 'unary':
+            value = self.evaluate_node(node[2], steps)
+            return -value if node[1] == '-' else +value
+
+        _, symbol, left_node, right_node = node
+        left = self.evaluate_node(left_node, steps)
+        right = self.evaluate_node(right_node, steps)
+        self.check_size(symbol, left, right)
+        return BINARY_OPERATORS[symbol](left, right)
+
+    def check_size(self, symbol, left, right):
+        """Refuse integer operations whose result would exceed max_bits, before computing them"""
+        if not (isinstance(left, int) and isinstance(right, int)):
+            return
+        if symbol == '*':
+            bits = left.bit_length() + right.bit_length()
+        elif symbol == '**':
+            if right < 0 or abs(left) <= 1:
+                return
+            bits = (abs(left).bit_length() - 1) * right + 1
+        else:
+            return
+        if bits > self.max_bits:
+            raise MathError("Result is too large")
+
+
+# Shared evaluator; parsed expressions are cached across requests
+math_evaluator = SafeMathEvaluator()
+
+
+def evaluate(expression):
+    """Evaluate an arithmetic expression with the shared bounded evaluator"""
+    return math_evaluator.evaluate(expression)
@@ -0,0 +1,184 @@
+"""
+Near-duplicate answer cache
+
+Reuses an LLM answer for a prompt that says the same thing in other words, e.g.
+"what is python" and "What's Python?". A prompt is reduced to the set of its
+content words (the knowledge base preprocessing: stop words removed,
+lemmatized), and two prompts are near duplicates when the Jaccard similarity of
+those sets reaches a threshold.
+
+Lookups are sublinear: every cached prompt gets a MinHash signature, split into
+bands that are indexed in hash tables. Only prompts sharing at least one band
+with the query are compared, and prompts without common words never share one.
+With 8 bands of 3 rows, a prompt of similarity 0.8 is found with probability
+0.997, one of similarity 0.3 is even looked at with probability 0.2.
+
+With audit_log (SEMANTIC_CACHE_AUDIT_LOG) set, each hit on a prompt that is not
+the same text is appended to a JSONL audit log (prompt, cached prompt,
+similarity), to review false hits and tune the threshold. It is off by default,
+as it records what users write; a background thread writes it and rotates it at
+SEMANTIC_CACHE_AUDIT_LOG_MAX_MB.
+Note that negations are stop words, so "is python not slow" and "is python slow"
+are the same prompt to this cache.
+"""
+
+import hashlib
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from jsonl_log import JsonlLog
+from text_processing import ENGLISH_STOP_WORDS
+
+# Stop-word contractions as they look once punctuation is stripped ("what's" -> "whats")
+CONTRACTION_STOP_WORDS = frozenset(
+    [word.replace("'", '') for word in ENGLISH_STOP_WORDS if "'" in word] +
+    ['whats', 'hows', 'whos', 'wheres', 'whens', 'whys', 'thats', 'theres', 'heres', 'im', 'ive', 'lets']
+)
+
+MERSENNE_PRIME = (1 << 61) - 1
+
+
+def token_hash(token):
+    """Stable 64-bit hash of a token (the same in every process)"""
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def jaccard(a, b):
+    """Jaccard similarity of two sets"""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class SemanticCache:
+    """Bounded near-duplicate prompt -> answer cache with MinHash LSH lookups"""
+
+    def __init__(self, preprocess, threshold=None, bands=8, rows=3, maxsize=10000, audit_log=None):
+        # Function reducing a prompt to space-separated content words
+        self.preprocess = preprocess
+        self.threshold = threshold if threshold is not None else float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.8'))
+        self.bands = bands
+        self.rows = rows
+        self.maxsize = maxsize
+        # Path of the near-hit audit log (it records the prompts), '' for none
+        audit_log = audit_log if audit_log is not None else os.getenv('SEMANTIC_CACHE_AUDIT_LOG', '')
+        max_bytes = int(float(os.getenv('SEMANTIC_CACHE_AUDIT_LOG_MAX_MB', '10')) * 1024 * 1024)
+        self.audit_log = JsonlLog(audit_log, max_bytes, name="Semantic cache audit log") if audit_log else None
+
+        # Universal hash functions h(x) = (a*x + b) mod p, one per signature row
+        generator = random.Random(0)
+        self.permutations = [
+            (generator.randrange(1, MERSENNE_PRIME), generator.randrange(MERSENNE_PRIME))
+            for _ in range(bands * rows)
+        ]
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()   # id -> (words, band keys, prompt, response, source)
+        self.buckets = {}              # band key -> set of ids
+        self.next_id = 0
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def words(self, prompt):
+        """The set of content words of a prompt"""
+        return frozenset(word for word in self.preprocess(prompt).split() if word not in CONTRACTION_STOP_WORDS)
+
+    def band_keys(self, words):
+        """MinHash signature of a word set, as one hashable key per band"""
+        hashes = [token_hash(word) for word in words]
+        signature = [min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in self.permutations]
+        return [(band,) + tuple(signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def get(self, prompt):
+        """Return (response, source) cached for a near-duplicate prompt, or None"""
+        words = self.words(prompt)
+        if not words:
+            return None
+        keys = self.band_keys(words)
+
+        with self.lock:
+            candidates = set()
+            for key in keys:
+                candidates.update(self.buckets.get(key, ()))
+            best_id, best_similarity = None, 0.0
+            for entry_id in candidates:
+                similarity = jaccard(words, self.entries[entry_id][0])
+                if similarity > best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None or best_similarity < self.threshold:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(best_id)
+            _, _, cached_prompt, response, source = self.entries[best_id]
+            self.hits += 1
+            near = ' '.join(prompt.lower().split()) != ' '.join(cached_prompt.lower().split())
+            if near:
+                self.near_hits += 1
+
+        if near:
+            self.audit(prompt, cached_prompt, best_similarity, source)
+        return response, source
+
+    def put(self, prompt, response, source):
+        """Remember the answer to a prompt, evicting the least recently used beyond maxsize"""
+        words = self.words(prompt)
+        if not words or not response or self.maxsize <= 0:
+            return
+        keys = self.band_keys(words)
+
+        with self.lock:
+            entry_id = self.next_id
+            self.next_id += 1
+            self.entries[entry_id] = (words, keys, prompt, response, source)
+            for key in keys:
+                self.buckets.setdefault(key, set()).add(entry_id)
+            while len(self.entries) > self.maxsize:
+                old_id, (_, old_keys, _, _, _) = self.entries.popitem(last=False)
+                for key in old_keys:
+                    bucket = self.buckets[key]
+                    bucket.discard(old_id)
+                    if not bucket:
+                        del self.buckets[key]
+                self.evictions += 1
+
+    def audit(self, prompt, cached_prompt, similarity, source):
+        """Queue a near hit for the audit log"""
+        if self.audit_log is None:
+            return
+        self.audit_log.write({
+            'timestamp': time.time(),
+            'prompt': prompt,
+            'cached_prompt': cached_prompt,
+            'similarity': round(similarity, 4),
+            'threshold': self.threshold,
+            'source': source
+        })
+
+    def close(self):
+        """Write the queued audit records"""
+        if self.audit_log is not None:
+            self.audit_log.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        """Size and hit-rate counters"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'near_hits': self.near_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
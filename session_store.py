@@ -0,0 +1,248 @@
+"""
+Conversation sessions for the web interface, shared by all server processes
+
+SessionStore keeps a ConversationContext per session id, so the web chat can
+send the recent turns of each conversation to the AI like the CLI does. Every
+session is bounded by its token budget (CONTEXT_MAX_TOKENS).
+
+The sessions live in a SQLite file (WAL mode) that all gunicorn workers use:
+each exchange is written through to it, and a worker reads a session from it
+when it has not seen the session yet or holds an older version of it. So a
+follow-up message finds its history whichever worker it reaches. Each process
+also keeps the sessions it used recently in memory, within a byte budget (least
+recently used first out), so an unchanged session is not decoded again.
+Sessions idle for longer than idle_timeout are forgotten, in memory and in the
+file. With path '' sessions are kept in memory only, which suits a single
+process.
+
+Memory use is estimated from the sizes of the stored strings and containers
+(sys.getsizeof), which is close to what the Python allocator actually holds.
+"""
+
+import json
+import os
+import secrets
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from conversation_context import ConversationContext
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SESSION_STORE_PATH = os.path.join(current_dir, 'sessions.sqlite3')
+
+SESSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chat_sessions_last_seen ON chat_sessions (last_seen);
+"""
+
+SESSION_ID_MAX_LENGTH = 64
+# Per-session bytes besides the turns: the context object, its lists, the LRU entry and the id
+SESSION_OVERHEAD = sys.getsizeof(ConversationContext(1, 0)) + 2 * sys.getsizeof([]) + 200
+# Seconds between deletions of expired sessions from the file
+PURGE_INTERVAL = 60.0
+
+
+def valid_session_id(session_id):
+    """Whether a client-supplied session id is acceptable"""
+    return (isinstance(session_id, str) and 0 < len(session_id) <= SESSION_ID_MAX_LENGTH
+            and all(c.isalnum() or c in '-_' for c in session_id))
+
+
+def context_bytes(context):
+    """Estimated memory held by a ConversationContext"""
+    size = SESSION_OVERHEAD + sys.getsizeof(context.turns) + sys.getsizeof(context.topics)
+    for _, content, _ in context.turns:
+        size += 64 + sys.getsizeof(content)     # the tuple (roles are shared constants)
+    for topic, _ in context.topics:
+        size += 56 + sys.getsizeof(topic)
+    return size
+
+
+class SessionStore:
+    """Thread- and process-safe session id -> ConversationContext map, cached in memory within limits"""
+
+    def __init__(self, max_bytes=None, idle_timeout=None, context_tokens=None, path=None):
+        # Budget for the sessions cached in memory, in bytes
+        self.max_bytes = max_bytes if max_bytes is not None else int(float(os.getenv('SESSION_STORE_MAX_MB', '128')) * 1024 * 1024)
+        # Seconds without a message after which a session is forgotten
+        self.idle_timeout = idle_timeout if idle_timeout is not None else float(os.getenv('SESSION_IDLE_TIMEOUT', '1800'))
+        # History budget of each session (None: CONTEXT_MAX_TOKENS)
+        self.context_tokens = context_tokens
+        # SQLite file shared by the server processes, '' to keep sessions in this process only
+        self.path = path if path is not None else os.getenv('SESSION_STORE_PATH', DEFAULT_SESSION_STORE_PATH)
+
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()   # id -> [context, bytes, last seen, version], least recently used first
+        self.bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.loaded = 0
+        self.stored = 0
+        self.conflicts = 0
+        self.next_purge = 0.0
+        self.local = threading.local()
+
+    def session_id(self, requested=None):
+        """The client's session id if it is valid, else a new one"""
+        return requested if valid_session_id(requested) else secrets.token_urlsafe(16)
+
+    def history(self, session_id):
+        """Chat messages of the session so far ([] for a new one)"""
+        self.refresh(session_id, time.time())
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            return entry[0].messages() if entry is not None else []
+
+    def add_exchange(self, session_id, user_message, response):
+        """Record a user message and the answer given, and write the session through to the file"""
+        now = time.time()
+        self.refresh(session_id, now)
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            if entry is None:
+                entry = self.sessions[session_id] = [ConversationContext(self.context_tokens), 0, now, 0]
+            context = entry[0]
+            context.add("user", user_message)
+            context.add("assistant", response)
+            entry[3] += 1
+            size = context_bytes(context)
+            self.bytes += size - entry[1]
+            entry[1] = size
+            state, version = json.dumps(context.state(), ensure_ascii=False), entry[3]
+            self.evict()
+        if not self.write(session_id, state, version, now):
+            # Another process stored this version first: read its copy next time
+            self.drop(session_id)
+
+    def forget(self, session_id):
+        self.drop(session_id)
+        try:
+            connection = self.connection()
+            if connection is not None:
+                connection.execute('DELETE FROM chat_sessions WHERE id = ?', (session_id,))
+        except sqlite3.Error as e:
+            print(f"Session store error: {e}")
+
+    def drop(self, session_id):
+        """Remove a session from memory only"""
+        with self.lock:
+            entry = self.sessions.pop(session_id, None)
+            if entry is not None:
+                self.bytes -= entry[1]
+
+    def refresh(self, session_id, now):
+        """Mark the session as just used, first reading it from the file if another process changed it"""
+        with self.lock:
+            self.expire(now)
+            entry = self.sessions.get(session_id)
+            version = entry[3] if entry is not None else 0
+        row = self.read(session_id, version)
+        with self.lock:
+            if row is not None and now - row[2] < self.idle_timeout:
+                state, version, _ = row
+                context = ConversationContext(self.context_tokens)
+                context.load_state(json.loads(state))
+                previous = self.sessions.pop(session_id, None)
+                if previous is not None:
+                    self.bytes -= previous[1]
+                entry = self.sessions[session_id] = [context, context_bytes(context), now, version]
+                self.bytes += entry[1]
+                self.loaded += 1
+                self.evict()
+            elif session_id in self.sessions:
+                self.sessions.move_to_end(session_id)
+                self.sessions[session_id][2] = now
+
+    def expire(self, now):
+        """Forget idle sessions; the least recently used come first (lock held)"""
+        while self.sessions:
+            session_id, entry = next(iter(self.sessions.items()))
+            if now - entry[2] < self.idle_timeout:
+                break
+            del self.sessions[session_id]
+            self.bytes -= entry[1]
+            self.expirations += 1
+
+    def evict(self):
+        """Remove least recently used sessions over the byte budget from memory (lock held)"""
+        while self.bytes > self.max_bytes and len(self.sessions) > 1:
+            session_id, entry = self.sessions.popitem(last=False)
+            self.bytes -= entry[1]
+            self.evictions += 1
+
+    def connection(self):
+        """This thread's connection to the session file, or None without one"""
+        if not self.path:
+            return None
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SESSION_SCHEMA)
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    def read(self, session_id, version):
+        """(state, version, last seen) of the session in the file if newer than version, else None"""
+        try:
+            connection = self.connection()
+            if connection is None:
+                return None
+            return connection.execute(
+                'SELECT state, version, last_seen FROM chat_sessions WHERE id = ? AND version > ?',
+                (session_id, version)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Session store error: {e}")
+            return None
+
+    def write(self, session_id, state, version, now):
+        """Store a version of the session unless the file already has it; returns whether it was stored"""
+        try:
+            connection = self.connection()
+            if connection is None:
+                return True
+            cursor = connection.execute(
+                'INSERT INTO chat_sessions (id, state, version, last_seen) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (id) DO UPDATE SET state = excluded.state, version = excluded.version, '
+                'last_seen = excluded.last_seen WHERE chat_sessions.version < excluded.version',
+                (session_id, state, version, now)
+            )
+            if cursor.rowcount == 0:
+                self.conflicts += 1
+                return False
+            self.stored += 1
+            if now >= self.next_purge:
+                self.next_purge = now + PURGE_INTERVAL
+                connection.execute('DELETE FROM chat_sessions WHERE last_seen < ?', (now - self.idle_timeout,))
+        except sqlite3.Error as e:
+            print(f"Session store error: {e}")
+        return True
+
+    def stats(self):
+        """Sessions and estimated memory in use by this process"""
+        with self.lock:
+            return {
+                'sessions': len(self.sessions),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'average_session_bytes': self.bytes // len(self.sessions) if self.sessions else 0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'loaded': self.loaded,
+                'stored': self.stored,
+                'conflicts': self.conflicts
+            }
+
+    def __len__(self):
+        return len(self.sessions)
@@ -0,0 +1,36 @@
+"""
+Tests for the CLI chatbot's conversation bookkeeping
+"""
+
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from chatbot import ChatBot
+
+
+class RecordingPipeline:
+    """Stands in for ChatPipeline and records the history each message comes with"""
+
+    def __init__(self):
+        self.histories = []
+
+    def get_response(self, user_input, history=None):
+        self.histories.append(history)
+        return f"answer to {user_input}", "Groq"
+
+
+def test_get_response_sends_the_conversation_so_far():
+    bot = ChatBot()
+    bot.pipeline = RecordingPipeline()
+
+    assert bot.get_response("What is the capital of France?") == ("answer to What is the capital of France?", "Groq")
+    bot.get_response("How big is it?")
+
+    assert bot.pipeline.histories[0] == []
+    assert bot.pipeline.histories[1] == [
+        {"role": "user", "content": "What is the capital of France?"},
+        {"role": "assistant", "content": "answer to What is the capital of France?"},
+    ]
@@ -0,0 +1,162 @@
+"""
+Tests for the provider circuit breakers, driven by a fake clock
+"""
+
+import os
+import sys
+
+import pytest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+import circuit_breaker
+from ai_service import AIService
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, parse_retry_after
+
+
+class Clock:
+    """Stands in for the time module; advanced by hand"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker, 'time', clock)
+    return clock
+
+
+def open_breaker(breaker, failures=3):
+    for _ in range(failures):
+        assert breaker.allow()
+        breaker.record_failure("boom")
+
+
+def test_opens_after_the_threshold_and_refuses_calls(clock):
+    breaker = CircuitBreaker('groq', failure_threshold=3, reset_timeout=30)
+    open_breaker(breaker, 2)
+    assert breaker.state == CLOSED
+    breaker.record_failure("boom")
+
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.snapshot()['rejected'] == 1
+    assert breaker.snapshot()['retry_in'] == 30
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker('groq', failure_threshold=3)
+    open_breaker(breaker, 2)
+    breaker.record_success()
+    open_breaker(breaker, 2)
+    assert breaker.state == CLOSED
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker('groq', failure_threshold=3, reset_timeout=30)
+    open_breaker(breaker)
+    clock.advance(29.9)
+    assert not breaker.allow()
+    clock.advance(0.1)
+    assert breaker.snapshot()['state'] == HALF_OPEN
+
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_cancelled_probe_is_replaced_after_reset_timeout(clock):
+    breaker = CircuitBreaker('groq', failure_threshold=3, reset_timeout=30)
+    open_breaker(breaker)
+    clock.advance(30)
+    # The probe never reports back, as when its request is cancelled
+    assert breaker.allow()
+    clock.advance(29)
+    assert not breaker.allow()
+    clock.advance(1)
+    assert breaker.allow()
+
+
+def test_failed_probe_doubles_the_back_off_up_to_the_maximum(clock):
+    breaker = CircuitBreaker('groq', failure_threshold=3, reset_timeout=30, max_reset_timeout=100)
+    open_breaker(breaker)
+    for expected in (60, 100, 100):
+        clock.advance(breaker.opened_until - clock.now)
+        assert breaker.allow()
+        breaker.record_failure("still down")
+        assert breaker.state == OPEN
+        assert breaker.snapshot()['retry_in'] == expected
+
+    clock.advance(100)
+    assert breaker.allow()
+    breaker.record_success()
+    # A later outage starts from reset_timeout again
+    open_breaker(breaker)
+    assert breaker.snapshot()['retry_in'] == 30
+
+
+def test_rate_limit_opens_at_once_for_retry_after(clock):
+    breaker = CircuitBreaker('groq', failure_threshold=3, reset_timeout=30)
+    breaker.record_failure("HTTP 429", retry_after=120, rate_limited=True)
+    assert breaker.state == OPEN
+    clock.advance(119)
+    assert not breaker.allow()
+    clock.advance(1)
+    assert breaker.allow()
+
+
+def test_rate_limit_without_retry_after_uses_the_current_back_off(clock):
+    breaker = CircuitBreaker('groq', failure_threshold=3, reset_timeout=30)
+    breaker.record_failure("HTTP 429", rate_limited=True)
+    assert breaker.snapshot()['retry_in'] == 30
+
+
+def test_parse_retry_after():
+    assert parse_retry_after({'retry-after': '12'}) == 12.0
+    assert parse_retry_after({'retry-after': '-5'}) == 0.0
+    assert parse_retry_after({'retry-after': 'Wed, 21 Oct 2026 07:28:00 GMT'}) is None
+    assert parse_retry_after({}) is None
+    assert parse_retry_after(None) is None
+
+
+def test_client_errors_do_not_count_against_the_provider(clock):
+    service = AIService(response_cache=False)
+    breaker = service.breakers['groq']
+    for status in (400, 404, 413, 422):
+        for _ in range(breaker.failure_threshold):
+            service.record_failure('groq', status_code=status)
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+
+    for _ in range(breaker.failure_threshold):
+        service.record_failure('groq', status_code=503)
+    assert breaker.state == OPEN
+
+
+@pytest.mark.parametrize('status', [401, 403, 408])
+def test_auth_errors_and_timeouts_count(clock, status):
+    service = AIService(response_cache=False)
+    for _ in range(service.breakers['groq'].failure_threshold):
+        service.record_failure('groq', status_code=status)
+    assert service.breakers['groq'].state == OPEN
+
+
+def test_provider_429_opens_for_its_retry_after(clock):
+    service = AIService(response_cache=False)
+    service.record_failure('huggingface', status_code=429, headers={'retry-after': '45'})
+    breaker = service.breakers['huggingface']
+    assert breaker.state == OPEN
+    assert breaker.snapshot()['retry_in'] == 45
+    assert service.breakers['groq'].state == CLOSED
@@ -0,0 +1,105 @@
+"""
+End-to-end test of the gunicorn setup: answers reach the AI provider under each worker class
+
+gunicorn serves the app with gunicorn.conf.py, with Groq pointed at a local stub
+server, so a message that is not small talk must come back from "Groq".
+"""
+
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+pytest.importorskip('gunicorn')
+if sys.platform == 'win32':
+    pytest.skip("gunicorn does not run on Windows", allow_module_level=True)
+
+
+class StubGroq(BaseHTTPRequestHandler):
+    """Answers chat completions with "stub answer to <message>" """
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        message = body['messages'][-1]['content']
+        self.server.prompts.append(message)
+        answer = json.dumps({
+            "id": "stub", "object": "chat.completion", "created": 0, "model": body['model'],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": f"stub answer to {message}"},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(answer)))
+        self.end_headers()
+        self.wfile.write(answer)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def groq():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubGroq)
+    server.prompts = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def post(url, message):
+    request = urllib.request.Request(url, data=json.dumps({'message': message}).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.load(response)
+
+
+@pytest.mark.parametrize('worker_class', ['gthread', 'gevent'])
+def test_provider_answers_under_worker_class(groq, tmp_path, worker_class):
+    if worker_class == 'gevent':
+        pytest.importorskip('gevent')
+    port = free_port()
+    env = dict(
+        os.environ,
+        GROQ_API_KEY='test', GROQ_BASE_URL=f'http://127.0.0.1:{groq.server_port}', HUGGINGFACE_API_KEY='',
+        RESPONSE_CACHE='off', SEMANTIC_CACHE='off', SESSION_STORE_PATH='', METRICS_DIR=str(tmp_path),
+        WEB_BIND=f'127.0.0.1:{port}', WEB_WORKERS='1', WEB_WORKER_CLASS=worker_class, WEB_ACCESS_LOG=''
+    )
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'web_app:app'], cwd=current_dir, env=env,
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=5).close()
+                break
+            except (urllib.error.URLError, OSError):
+                assert server.poll() is None and time.monotonic() < deadline, "gunicorn did not start"
+                time.sleep(0.2)
+
+        answer = post(f'http://127.0.0.1:{port}/chat', "explain how tides work")
+        assert (answer['source'], answer['response']) == ("Groq", "stub answer to explain how tides work")
+        assert groq.prompts == ["explain how tides work"]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        output = server.communicate(timeout=30)[0].decode(errors='replace')
+    assert 'Groq API Error' not in output, output
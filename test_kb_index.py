@@ -0,0 +1,95 @@
+"""
+Tests for the compiled knowledge base index: saving, mapping and reading it back
+"""
+
+import json
+import os
+import shutil
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from kb_index import FLAG_WORDNET, MappedPatternIndex, PatternIndex, load_index
+from knowledge_base import KnowledgeBase, ReloadingKnowledgeBase
+
+PATTERNS = [
+    ("greeting", "hello"),
+    ("greeting", "good morning"),
+    ("python", "python function"),
+    ("café", "café crème"),
+    ("python", "python"),
+]
+LEMMAS = {"functions": "function", "mornings": "morning", "cafés": "café", "hello": "hello"}
+DIGEST = b'd' * 32
+
+
+def build(path):
+    index = PatternIndex(PATTERNS, lemmas=LEMMAS, flags=FLAG_WORDNET)
+    index.save(str(path), DIGEST)
+    return index
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / 'kb.idx'
+    index = build(path)
+    mapped = MappedPatternIndex(str(path))
+    try:
+        assert len(mapped) == len(index)
+        assert list(mapped) == list(index)
+        assert mapped.flags == FLAG_WORDNET
+        assert mapped.digest == DIGEST
+        for word in ["hello", "python", "function", "café", "crème", "morning", "missing"]:
+            assert list(mapped.postings(word)) == list(index.postings(word))
+        for form in list(LEMMAS) + ["missing", ""]:
+            assert mapped.lemma(form) == index.lemma(form)
+        assert mapped.candidates(["python", "hello"]) == index.candidates(["python", "hello"]) == [0, 2, 4]
+    finally:
+        mapped.close()
+
+
+def test_load_index_checks_the_digest(tmp_path):
+    path = tmp_path / 'kb.idx'
+    build(path)
+    index = load_index(str(path), DIGEST)
+    assert index is not None
+    index.close()
+    assert load_index(str(path), b'x' * 32) is None
+
+
+def test_load_index_rejects_missing_and_invalid_files(tmp_path):
+    assert load_index(str(tmp_path / 'missing.idx'), DIGEST) is None
+    path = tmp_path / 'bad.idx'
+    path.write_bytes(b'not an index' * 20)
+    assert load_index(str(path), DIGEST) is None
+    path.write_bytes(b'KB')
+    assert load_index(str(path), DIGEST) is None
+
+
+def test_save_replaces_an_existing_index(tmp_path):
+    path = tmp_path / 'kb.idx'
+    build(path)
+    PatternIndex([("other", "something else")]).save(str(path), DIGEST)
+    index = load_index(str(path), DIGEST)
+    assert list(index) == [("other", "something else", frozenset({"something", "else"}))]
+    index.close()
+    assert [p for p in os.listdir(tmp_path) if p.endswith('.tmp')] == []
+
+
+def test_reload_unmaps_the_previous_index(tmp_path):
+    path = tmp_path / 'knowledge_base.json'
+    shutil.copy(os.path.join(current_dir, 'knowledge_base.json'), path)
+    # Compile the sidecar index, so the next load maps it
+    KnowledgeBase(str(path)).close()
+    knowledge_base = ReloadingKnowledgeBase(str(path), retire_delay=0)
+    previous = knowledge_base.current
+    assert isinstance(previous.pattern_index, MappedPatternIndex)
+
+    data = json.loads(path.read_text(encoding='utf-8'))
+    data['reload_test'] = {"patterns": ["reload test pattern"], "responses": ["Reloaded!"]}
+    path.write_text(json.dumps(data), encoding='utf-8')
+    knowledge_base.reload(knowledge_base.read_file_state())
+
+    assert knowledge_base.current is not previous
+    assert previous.pattern_index.buffer.closed
+    assert knowledge_base.find_best_match("reload test pattern") == 'reload_test'
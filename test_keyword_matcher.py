@@ -0,0 +1,53 @@
+"""
+Tests for the single-pass keyword matcher (both the Aho-Corasick and regex engines)
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+import keyword_matcher
+from keyword_matcher import KeywordMatcher
+
+KEYWORDS = ['hi', 'this', 'his', 'hello', 'he', 'add', 'address', 'what is', '+', '-', '**', 'ai']
+
+
+@pytest.fixture(params=['automaton', 'regex'])
+def make_matcher(request, monkeypatch):
+    if request.param == 'regex':
+        monkeypatch.setattr(keyword_matcher, 'ahocorasick', None)
+    elif keyword_matcher.ahocorasick is None:
+        pytest.skip("pyahocorasick is not installed")
+    return KeywordMatcher
+
+
+def test_finds_overlapping_and_nested_keywords(make_matcher):
+    matcher = make_matcher(KEYWORDS)
+    assert matcher.find("this") == {'this', 'his', 'hi'}
+    assert matcher.find("address") == {'add', 'address'}
+    assert matcher.find("say hello") == {'he', 'hello'}
+
+
+def test_single_characters_and_phrases(make_matcher):
+    matcher = make_matcher(KEYWORDS)
+    assert matcher.find("what is 2 + 3") == {'what is', '+'}
+    assert matcher.find("2 ** 3") == {'**'}
+    assert matcher.find("") == set()
+
+
+def test_same_as_substring_test(make_matcher):
+    matcher = make_matcher(KEYWORDS)
+    rng = random.Random(3)
+    alphabet = 'adehilrstw +-*'
+    for _ in range(500):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+        assert matcher.find(text) == {k for k in KEYWORDS if k in text}, text
+
+
+def test_empty_keyword_set(make_matcher):
+    assert make_matcher([]).find("anything") == set()
@@ -0,0 +1,114 @@
+"""
+Tests for the Prometheus metrics, in one process and totalled over several
+"""
+
+import multiprocessing
+import os
+import sys
+
+import pytest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+import metrics
+from metrics import Counter, Gauge, Histogram
+
+
+def make_registry():
+    registry = []
+    return registry, {
+        'requests': Counter('requests_total', "Requests", ['source'], registry=registry),
+        'in_flight': Gauge('in_flight', "In flight", registry=registry),
+        'open': Gauge('circuit_open', "Open circuit", registry=registry, multiprocess_mode='max'),
+        'ratio': Gauge('hit_ratio', "Hit ratio", registry=registry, multiprocess_mode='all'),
+        'latency': Histogram('latency_seconds', "Latency", buckets=(0.1, 1.0), registry=registry),
+    }
+
+
+def test_render_single_process():
+    registry, m = make_registry()
+    m['requests'].labels('Groq').inc()
+    m['requests'].labels('Groq').inc(2)
+    m['in_flight'].set(4)
+    m['latency'].observe(0.05)
+    m['latency'].observe(5)
+
+    text = metrics.render(registry, directory='')
+    assert '# TYPE requests_total counter' in text
+    assert 'requests_total{source="Groq"} 3' in text
+    assert 'in_flight 4' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 2' in text
+    assert 'latency_seconds_sum 5.05' in text
+    assert 'latency_seconds_count 2' in text
+
+
+def test_label_values_are_escaped():
+    registry = []
+    Counter('errors_total', "Errors", ['message'], registry=registry).labels('a "quoted"\nline').inc()
+    assert 'errors_total{message="a \\"quoted\\"\\nline"} 1' in metrics.render(registry, directory='')
+
+
+def test_wrong_label_count():
+    registry, m = make_registry()
+    with pytest.raises(ValueError):
+        m['requests'].labels('Groq', 'extra')
+
+
+def other_worker(directory):
+    registry, m = make_registry()
+    m['requests'].labels('Groq').inc(2)
+    m['in_flight'].set(5)
+    m['open'].set(1)
+    m['ratio'].set(0.5)
+    m['latency'].observe(0.5)
+    metrics.export(registry, directory)
+
+
+def run_other_worker(directory):
+    process = multiprocessing.get_context('fork').Process(target=other_worker, args=(directory,))
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+    return process.pid
+
+
+def test_values_are_totalled_over_processes(tmp_path):
+    directory = str(tmp_path)
+    registry, m = make_registry()
+    m['requests'].labels('Groq').inc()
+    m['in_flight'].set(1)
+    m['ratio'].set(0.25)
+    m['latency'].observe(0.05)
+    other_pid = run_other_worker(directory)
+
+    combined = metrics.collect(registry, directory)
+    assert combined['requests_total'] == {('Groq',): 3}
+    assert combined['in_flight'] == {(): 6}
+    assert combined['circuit_open'] == {(): 1}
+    assert combined['hit_ratio'] == {(str(os.getpid()),): 0.25, (str(other_pid),): 0.5}
+    assert combined['latency_seconds'][()][0] == [1, 1, 0]
+    assert metrics.process_count(directory) == 2
+    assert metrics.current_values(m['in_flight'], directory) == {(): 6}
+
+    text = metrics.render(registry, directory)
+    assert f'hit_ratio{{pid="{other_pid}"}} 0.5' in text
+    assert 'latency_seconds_count 2' in text
+
+
+def test_stopped_process_keeps_its_counters(tmp_path):
+    directory = str(tmp_path)
+    registry, m = make_registry()
+    m['requests'].labels('Groq').inc()
+    other_pid = run_other_worker(directory)
+    metrics.mark_process_dead(other_pid, directory)
+
+    combined = metrics.collect(registry, directory)
+    assert combined['requests_total'] == {('Groq',): 3}
+    assert combined['latency_seconds'][()][0] == [0, 1, 0]
+    assert combined['in_flight'] == {(): 0}
+    assert metrics.process_count(directory) == 1
+
+    metrics.clear_directory(directory)
+    assert os.listdir(directory) == []
@@ -0,0 +1,78 @@
+"""
+Tests for the shared provider response cache and its use from the async provider calls
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from ai_service import AIService
+from response_cache import ResponseCache
+
+
+def test_get_put_and_normalized_prompts(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite3'))
+    assert cache.get('groq', "What is Python?") is None
+    cache.put('groq', "What is Python?", "A language.", {"model": "m"})
+
+    assert cache.get('groq', "  what is   python? ", {"model": "m"}) == "A language."
+    assert cache.get('groq', "What is Python?", {"model": "other"}) is None
+    assert cache.get('huggingface', "What is Python?", {"model": "m"}) is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite3'), max_bytes=300)
+    for i in range(3):
+        cache.put('groq', f"prompt {i}", "x" * 100)
+        time.sleep(0.01)
+    cache.get('groq', "prompt 0")
+    cache.put('groq', "prompt 3", "x" * 100)
+
+    assert cache.get('groq', "prompt 0") is not None
+    assert cache.get('groq', "prompt 1") is None
+    assert cache.stats()['bytes'] <= 300
+
+
+class SlowCache:
+    """Cache whose operations block like SQLite waiting for another process's lock"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.stored = []
+
+    def get(self, provider, prompt, params=None):
+        time.sleep(self.delay)
+        return None
+
+    def put(self, provider, prompt, response, params=None):
+        time.sleep(self.delay)
+        self.stored.append((provider, prompt, response))
+
+
+def test_async_cache_operations_do_not_block_the_event_loop():
+    service = AIService(response_cache=SlowCache(0.2))
+
+    async def run():
+        ticks = []
+
+        async def tick():
+            while True:
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.ensure_future(tick())
+        await asyncio.sleep(0)
+        assert await service.cached_response_async('groq', "hello", {}) is None
+        assert await service.cache_response_async('groq', "hello", "hi", {}) == "hi"
+        ticker.cancel()
+        return ticks
+
+    ticks = asyncio.run(run())
+    # The loop kept running other tasks while the cache waited
+    assert len(ticks) > 20
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.1
+    assert service.response_cache.stored == [('groq', "hello", "hi")]
@@ -0,0 +1,138 @@
+"""
+Tests for the confidence-based routing between local answers and the AI providers
+"""
+
+import json
+import os
+import shutil
+import sys
+
+import pytest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from ai_service import AIService
+from chat_pipeline import ChatPipeline
+from knowledge_base import KnowledgeBase, ReloadingKnowledgeBase
+
+
+@pytest.fixture(scope='module')
+def pipeline():
+    pipeline = ChatPipeline(KnowledgeBase(), AIService(response_cache=False), semantic_cache=False, routing_log='')
+    # Routing only happens when there is a provider to escalate to
+    pipeline.providers_enabled = lambda: True
+    return pipeline
+
+
+@pytest.mark.parametrize('prompt, answer', [
+    ("Calculate 25 + 15", "The calculation 25 + 15 = 40"),
+    ("(3+4)*2", "The calculation (3+4)*2 = 14"),
+    ("5 plus 7", "Adding 5 + 7 = 12"),
+    ("calculate: add 3, 4", "Adding 3 + 4 = 7"),
+])
+def test_calculations_are_answered_locally(pipeline, prompt, answer):
+    assert pipeline.route(prompt) == (answer, "AI Service")
+
+
+@pytest.mark.parametrize('prompt', [
+    "3 times I tried to install python - why does it fail?",
+    "I have 2 - 3 problems with my python setup",
+    "what is 2 + 2 in my python code, why does it print 22",
+    "sometimes 4",
+    "-3",
+])
+def test_numbers_in_questions_go_to_the_providers(pipeline, prompt):
+    assert pipeline.route(prompt) is None
+
+
+@pytest.mark.parametrize('prompt', [
+    "hey, what causes inflation?",
+    "hi, explain recursion",
+    "good morning! what is a monad?",
+    "hello world program in rust",
+    "thanks, but why is the sky blue?",
+    "bye the way, what is rust",
+    "help me with my essay",
+    "can you help me write a cover letter",
+])
+def test_questions_after_small_talk_go_to_the_providers(pipeline, prompt):
+    assert pipeline.route(prompt) is None
+
+
+@pytest.mark.parametrize('prompt, rule', [
+    ("hello", 'greetings'),
+    ("Hi there!", 'greetings'),
+    ("good evening everyone", 'greetings'),
+    ("see you later", 'goodbye'),
+    ("thank you so much", 'thanks'),
+    ("thanks for the help", 'thanks'),
+    ("can you help me?", 'help'),
+    ("what can you do?", 'help'),
+    ("how are you", 'small_talk'),
+])
+def test_plain_small_talk_is_answered_locally(pipeline, prompt, rule):
+    response = pipeline.route(prompt)
+    assert response is not None and response[1] == "AI Service"
+    assert pipeline.ai_service.classify_free_ai_response(prompt)[0] == rule
+
+
+def test_lone_number_has_low_confidence(pipeline):
+    rule, answer, confidence = pipeline.ai_service.classify_free_ai_response("3 times I tried to install python - why does it fail?")
+    assert rule == 'math'
+    assert not answer.startswith("The calculation")
+    assert confidence < pipeline.routing_threshold
+
+
+def test_long_math_message_is_less_confident(pipeline):
+    _, _, short = pipeline.ai_service.classify_free_ai_response("calculate 2 + 3")
+    _, _, long = pipeline.ai_service.classify_free_ai_response("2 + 3 is what my teacher wrote on the board today, can you check")
+    assert short == 1.0
+    assert long < pipeline.routing_threshold
+
+
+def test_route_uses_one_knowledge_base_across_a_reload(tmp_path):
+    original = tmp_path / 'original.json'
+    shutil.copy(os.path.join(current_dir, 'knowledge_base.json'), original)
+    path = tmp_path / 'knowledge_base.json'
+    data = json.loads(original.read_text(encoding='utf-8'))
+    data['reload_test'] = {"patterns": ["reload test pattern"], "responses": ["Reloaded!"]}
+    path.write_text(json.dumps(data), encoding='utf-8')
+    knowledge_base = ReloadingKnowledgeBase(str(path), retire_delay=0)
+    with_category = knowledge_base.current
+    without_category = KnowledgeBase(str(original))
+
+    def match_then_reload(user_input):
+        # A reload without the category lands between the match and the answer
+        result = KnowledgeBase.match(with_category, user_input)
+        knowledge_base.current = without_category
+        return result
+
+    with_category.match = match_then_reload
+    pipeline = ChatPipeline(knowledge_base, AIService(response_cache=False), semantic_cache=False, routing_log='')
+    pipeline.providers_enabled = lambda: True
+    assert pipeline.route("reload test pattern") == ("Reloaded!", "Knowledge Base")
+
+
+def test_routing_log_is_off_by_default(monkeypatch):
+    monkeypatch.delenv('ROUTING_LOG', raising=False)
+    pipeline = ChatPipeline(KnowledgeBase(), AIService(response_cache=False), semantic_cache=False)
+    assert pipeline.routing_log is None
+
+
+def test_routing_log_is_written_and_rotated(tmp_path, monkeypatch):
+    path = tmp_path / 'routing.jsonl'
+    monkeypatch.setenv('ROUTING_LOG_MAX_MB', str(2000 / 1024 / 1024))
+    pipeline = ChatPipeline(KnowledgeBase(), AIService(response_cache=False), semantic_cache=False, routing_log=str(path))
+    pipeline.providers_enabled = lambda: True
+    for i in range(40):
+        pipeline.route(f"hello {i}")
+        # One write per record, so the size is checked between them
+        pipeline.routing_log.close()
+    pipeline.close()
+    records = [json.loads(line) for name in ('routing.jsonl.1', 'routing.jsonl') for line in (tmp_path / name).read_text(encoding='utf-8').splitlines()]
+    assert records[-1]['message'] == "hello 39"
+    # The number makes it more than a greeting
+    assert records[-1]['decision'] == "providers"
+    assert (tmp_path / 'routing.jsonl.1').stat().st_size >= 2000
+    assert path.stat().st_size < 2000
@@ -0,0 +1,104 @@
+"""
+Tests for the declarative keyword rule engine
+"""
+
+import os
+import sys
+
+import pytest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from rule_engine import LONG_MESSAGE_FACTOR, OTHER_WORDS_FACTOR, PARTIAL_WORD_FACTOR, RuleEngine
+
+RULES = [
+    {"name": "greetings", "keywords": ["hello", "hi"], "confidence": 0.9, "max_words": 4, "response": "Hello!"},
+    {"name": "numbers", "keywords": ["number"], "handler_keywords": ["add"], "handler": "numbers"},
+    {
+        "name": "programming",
+        "keywords": ["code", "python"],
+        "branches": [
+            {"keywords": ["python"], "response": "Python!", "confidence": 0.8},
+            {"response": "Code!"}
+        ]
+    },
+    {"name": "fallback", "response": "Default"},
+]
+
+
+def numbers(text, hits):
+    if 'add' in hits:
+        return "Adding", 0.7
+    if any(c.isdigit() for c in text):
+        return "A number"
+    return None
+
+
+@pytest.fixture
+def engine():
+    return RuleEngine(RULES, {"numbers": numbers})
+
+
+def test_first_matching_rule_wins(engine):
+    assert engine.respond("hello") == ("greetings", "Hello!")
+    assert engine.respond("python code") == ("programming", "Python!")
+    assert engine.respond("some code") == ("programming", "Code!")
+    assert engine.respond("good day") == ("fallback", "Default")
+
+
+def test_handler_falls_through_on_none(engine):
+    assert engine.respond("number 5") == ("numbers", "A number")
+    assert engine.respond("number five") == ("fallback", "Default")
+
+
+def test_handler_keywords_reach_the_handler_without_selecting_the_rule(engine):
+    assert engine.classify("add a number") == ("numbers", "Adding", 0.7)
+    assert engine.respond("add 3 and 4") == ("fallback", "Default")
+
+
+def test_confidence_from_rule_and_branch(engine):
+    assert engine.classify("hello") == ("greetings", "Hello!", 0.9)
+    assert engine.classify("python") == ("programming", "Python!", 0.8)
+    assert engine.classify("code") == ("programming", "Code!", 0.5)
+    assert engine.classify("number 1")[2] == 0.5
+
+
+def test_partial_word_penalty(engine):
+    # "hi" only inside "this"
+    name, _, confidence = engine.classify("this")
+    assert name == "greetings"
+    assert confidence == pytest.approx(0.9 * PARTIAL_WORD_FACTOR)
+
+
+def test_long_message_penalty(engine):
+    _, _, confidence = engine.classify("hello there my good old friend")
+    assert confidence == pytest.approx(0.9 * LONG_MESSAGE_FACTOR)
+
+
+def test_other_words_penalty():
+    engine = RuleEngine([{"name": "thanks", "keywords": ["thanks", "thank you"], "confidence": 0.9,
+                          "max_other_words": 0, "filler_words": ["lot", "much"], "response": "Welcome!"}])
+    # Stop words, filler words and repeated keywords do not count
+    assert engine.classify("Thank you so much, thanks a lot!")[2] == 0.9
+    _, _, confidence = engine.classify("thanks, but why is the sky blue?")
+    assert confidence == pytest.approx(0.9 * OTHER_WORDS_FACTOR)
+
+
+def test_unknown_handler_is_rejected():
+    with pytest.raises(ValueError):
+        RuleEngine([{"name": "broken", "keywords": ["x"], "handler": "missing"}])
+
+
+def test_no_rule_matches():
+    assert RuleEngine([{"name": "only", "keywords": ["x"], "response": "X"}]).classify("abc") == (None, None, 0.0)
+
+
+def test_rule_stats_count_hits(engine):
+    engine.respond("hello")
+    engine.respond("number five")
+    stats = {s['name']: s for s in engine.rule_stats()}
+    assert stats['greetings']['hits'] == 1
+    assert stats['numbers']['evaluations'] == 1
+    assert stats['numbers']['hits'] == 0
+    assert stats['fallback']['hits'] == 1
@@ -0,0 +1,66 @@
+"""
+Tests for the bounded arithmetic evaluator
+"""
+
+import os
+import sys
+
+import pytest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from safe_math import MathError, SafeMathEvaluator
+
+
+@pytest.fixture
+def evaluator():
+    return SafeMathEvaluator()
+
+
+@pytest.mark.parametrize('expression', [
+    "25 + 15", "2 + 3 * 4", "(2 + 3) * 4", "10 - 4 - 3", "2 ** 3 ** 2", "-2 ** 2", "2 ** -1",
+    "7 // 2", "-7 // 2", "10 / 4", "1.5 * 2", ".5 + 1", "5.", "2 * -3", "- - 3", "((2))", "100 / 3 * 3",
+    "2 ** 10 - 1", "1 + 2 * 3 - 4 / 5",
+])
+def test_same_results_as_eval(evaluator, expression):
+    assert evaluator.evaluate(expression) == eval(expression)
+
+
+@pytest.mark.parametrize('expression', ["9**9**9", "9**9**9**9", "10 ** 5000", "2 ** 4097", "(10 ** 1000) * (10 ** 1000) * (10 ** 1000) * (10 ** 1000) * (10 ** 1000)"])
+def test_huge_results_are_refused(evaluator, expression):
+    with pytest.raises(MathError):
+        evaluator.evaluate(expression)
+
+
+def test_limits(evaluator):
+    assert evaluator.evaluate("2 ** 4000") == 2 ** 4000
+    with pytest.raises(MathError):
+        evaluator.evaluate("1 + " * 200 + "1")
+    with pytest.raises(MathError):
+        evaluator.evaluate("(" * 40 + "1" + ")" * 40)
+    with pytest.raises(MathError):
+        evaluator.evaluate("-" * 40 + "1")
+
+
+@pytest.mark.parametrize('expression', ["1 / 0", "1 // 0", "0 ** -1", "5 / (2 - 2)"])
+def test_division_by_zero(evaluator, expression):
+    with pytest.raises(MathError):
+        evaluator.evaluate(expression)
+
+
+@pytest.mark.parametrize('expression', [
+    "__import__('os')", "abs(-1)", "x + 1", "1 if 1 else 2", "[1, 2]", "1; 2", "True + 1", "1e3", "0x10",
+    "05 + 1", "2 % 3", "1 +", "(1 + 2", "1 + 2)", "", "lambda: 1",
+])
+def test_names_and_invalid_syntax_are_rejected(evaluator, expression):
+    with pytest.raises(MathError):
+        evaluator.evaluate(expression)
+
+
+def test_errors_are_cached_and_raised_again(evaluator):
+    for _ in range(2):
+        with pytest.raises(MathError):
+            evaluator.evaluate("abs(1)")
+    assert evaluator.evaluate("1 + 1") == 2
+    assert evaluator.evaluate("1 + 1") == 2
@@ -0,0 +1,48 @@
+"""
+Tests for the near-duplicate answer cache and its audit log
+"""
+
+import json
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from semantic_cache import SemanticCache
+from text_processing import ENGLISH_STOP_WORDS
+
+
+def preprocess(text):
+    """Lowercased words without stop words, like the knowledge base preprocessing"""
+    words = (word.strip('?!.,').replace("'", '').lower() for word in text.split())
+    return ' '.join(word for word in words if word not in ENGLISH_STOP_WORDS)
+
+
+def test_reworded_prompt_is_a_hit(tmp_path):
+    cache = SemanticCache(preprocess, audit_log='')
+    cache.put("What is Python?", "A programming language.", "Groq")
+
+    assert cache.get("what's python") == ("A programming language.", "Groq")
+    assert cache.get("what is rust") is None
+    assert cache.stats()['near_hits'] == 1
+
+
+def test_audit_log_is_off_by_default(monkeypatch):
+    monkeypatch.delenv('SEMANTIC_CACHE_AUDIT_LOG', raising=False)
+    assert SemanticCache(preprocess).audit_log is None
+
+
+def test_near_hits_are_audited(tmp_path):
+    path = tmp_path / 'audit.jsonl'
+    cache = SemanticCache(preprocess, audit_log=str(path))
+    cache.put("What is Python?", "A programming language.", "Groq")
+    cache.get("What is Python?")
+    cache.get("what's python")
+    cache.close()
+
+    records = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert len(records) == 1
+    assert records[0]['prompt'] == "what's python"
+    assert records[0]['cached_prompt'] == "What is Python?"
+    assert records[0]['similarity'] == 1.0
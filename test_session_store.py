@@ -0,0 +1,96 @@
+"""
+Tests for the web sessions shared by the server processes through SQLite
+"""
+
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from session_store import SessionStore, valid_session_id
+
+
+def two_workers(tmp_path, **kwargs):
+    """Two stores on one file, as in two gunicorn workers"""
+    path = str(tmp_path / 'sessions.sqlite3')
+    return SessionStore(path=path, **kwargs), SessionStore(path=path, **kwargs)
+
+
+def test_follow_up_on_another_worker_sees_the_history(tmp_path):
+    first, second = two_workers(tmp_path)
+    first.add_exchange("s1", "What is Python?", "A programming language.")
+
+    assert second.history("s1") == [
+        {"role": "user", "content": "What is Python?"},
+        {"role": "assistant", "content": "A programming language."},
+    ]
+
+
+def test_cached_session_is_refreshed_after_another_worker_changed_it(tmp_path):
+    first, second = two_workers(tmp_path)
+    first.add_exchange("s1", "one", "1")
+    second.add_exchange("s1", "two", "2")
+    first.add_exchange("s1", "three", "3")
+
+    expected = ["one", "1", "two", "2", "three", "3"]
+    assert [m["content"] for m in first.history("s1")] == expected
+    assert [m["content"] for m in second.history("s1")] == expected
+
+
+def test_concurrent_update_of_the_same_version_keeps_the_first(tmp_path, monkeypatch):
+    first, second = two_workers(tmp_path)
+    first.add_exchange("s1", "from first", "a")
+    # second read the session just before the first's exchange was stored
+    read = second.read
+    monkeypatch.setattr(second, 'read', lambda session_id, version: None)
+    second.add_exchange("s1", "from second", "b")
+    monkeypatch.setattr(second, 'read', read)
+
+    assert second.stats()["conflicts"] == 1
+    assert [m["content"] for m in second.history("s1")] == ["from first", "a"]
+
+
+def test_evicted_sessions_are_read_back(tmp_path):
+    store = SessionStore(path=str(tmp_path / 'sessions.sqlite3'), max_bytes=5000)
+    for i in range(50):
+        store.add_exchange(f"s{i}", f"hello {i}", f"answer {i}")
+    assert len(store) < 50
+    assert store.stats()["evictions"] > 0
+
+    assert store.history("s0")[0]["content"] == "hello 0"
+    assert store.stats()["loaded"] >= 1
+
+
+def test_idle_sessions_expire(tmp_path):
+    first, second = two_workers(tmp_path, idle_timeout=0.1)
+    first.add_exchange("s1", "hi", "there")
+    time.sleep(0.2)
+
+    assert first.history("s1") == []
+    assert second.history("s1") == []
+
+
+def test_forget(tmp_path):
+    first, second = two_workers(tmp_path)
+    first.add_exchange("s1", "hi", "there")
+    first.forget("s1")
+
+    assert second.history("s1") == []
+
+
+def test_memory_only_store():
+    store = SessionStore(path='')
+    store.add_exchange("s1", "hi", "there")
+
+    assert len(store.history("s1")) == 2
+    assert SessionStore(path='').history("s1") == []
+
+
+def test_session_ids():
+    store = SessionStore(path='')
+    assert store.session_id("abc-123_X") == "abc-123_X"
+    assert valid_session_id(store.session_id("../bad id"))
+    assert store.session_id(None) != store.session_id(None)
+    assert not valid_session_id("x" * 65)
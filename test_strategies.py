@@ -0,0 +1,120 @@
+"""
+Tests for the provider strategies of ChatPipeline: sequential, hedged, race and the deadline
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from ai_service import AIService
+from chat_pipeline import ChatPipeline
+from knowledge_base import KnowledgeBase
+
+
+@pytest.fixture(scope='module')
+def knowledge_base():
+    return KnowledgeBase()
+
+
+class StubProvider:
+    """Async provider that answers after delay seconds, recording when it started and whether it was cancelled"""
+
+    def __init__(self, name, delay, answer, events):
+        self.name = name
+        self.delay = delay
+        self.answer = answer
+        self.events = events
+        self.cancelled = False
+
+    async def __call__(self, user_input, history=None):
+        self.events.append((self.name, asyncio.get_running_loop().time()))
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return self.answer
+
+
+def make_pipeline(knowledge_base, strategy, groq, huggingface, hedge_delay=0.1, deadline=None):
+    """Pipeline asking the stub providers, given as (delay, answer) pairs"""
+    pipeline = ChatPipeline(knowledge_base, AIService(response_cache=False), strategy=strategy,
+                            hedge_delay=hedge_delay, deadline=deadline, semantic_cache=False, routing_log='')
+    pipeline.events = []
+    pipeline.stubs = {
+        "Groq": StubProvider("Groq", *groq, pipeline.events),
+        "Hugging Face": StubProvider("Hugging Face", *huggingface, pipeline.events),
+    }
+    pipeline.providers = list(pipeline.stubs.items())
+    return pipeline
+
+
+def ask(pipeline, deadline=None):
+    """(response, source, seconds taken) of pipeline.answer, with each provider's start time relative to the call"""
+    async def run():
+        start = asyncio.get_running_loop().time()
+        response, source = await pipeline.answer("tell me about tides", pipeline.providers, deadline)
+        pipeline.started = {name: at - start for name, at in pipeline.events}
+        return response, source, asyncio.get_running_loop().time() - start
+    return asyncio.run(run())
+
+
+def test_sequential_asks_the_next_provider_after_a_failure(knowledge_base):
+    pipeline = make_pipeline(knowledge_base, 'sequential', (0.01, None), (0.01, "from hf"))
+    response, source, _ = ask(pipeline)
+    assert (response, source) == ("from hf", "Hugging Face")
+    assert [name for name, _ in pipeline.events] == ["Groq", "Hugging Face"]
+
+
+def test_hedged_does_not_start_the_backup_when_the_first_answers_in_time(knowledge_base):
+    pipeline = make_pipeline(knowledge_base, 'hedged', (0.02, "from groq"), (0.01, "from hf"), hedge_delay=0.2)
+    response, source, _ = ask(pipeline)
+    assert (response, source) == ("from groq", "Groq")
+    assert "Hugging Face" not in pipeline.started
+
+
+def test_hedged_starts_the_backup_after_the_delay_and_cancels_the_loser(knowledge_base):
+    pipeline = make_pipeline(knowledge_base, 'hedged', (1.0, "from groq"), (0.01, "from hf"), hedge_delay=0.1)
+    response, source, took = ask(pipeline)
+    assert (response, source) == ("from hf", "Hugging Face")
+    assert 0.1 <= pipeline.started["Hugging Face"] < 0.3
+    assert took < 0.5
+    assert pipeline.stubs["Groq"].cancelled
+
+
+def test_hedged_starts_the_backup_at_once_when_the_first_fails(knowledge_base):
+    pipeline = make_pipeline(knowledge_base, 'hedged', (0.01, None), (0.01, "from hf"), hedge_delay=1.0)
+    response, source, took = ask(pipeline)
+    assert (response, source) == ("from hf", "Hugging Face")
+    assert took < 0.5
+
+
+def test_race_starts_all_providers_and_cancels_the_losers(knowledge_base):
+    pipeline = make_pipeline(knowledge_base, 'race', (1.0, "from groq"), (0.05, "from hf"), hedge_delay=10)
+    response, source, took = ask(pipeline)
+    assert (response, source) == ("from hf", "Hugging Face")
+    assert pipeline.started["Groq"] < 0.05 and pipeline.started["Hugging Face"] < 0.05
+    assert took < 0.5
+    assert pipeline.stubs["Groq"].cancelled
+    assert not pipeline.stubs["Hugging Face"].cancelled
+
+
+def test_race_keeps_waiting_when_the_fastest_fails(knowledge_base):
+    pipeline = make_pipeline(knowledge_base, 'race', (0.1, "from groq"), (0.01, None))
+    response, source, _ = ask(pipeline)
+    assert (response, source) == ("from groq", "Groq")
+
+
+@pytest.mark.parametrize('strategy', ['sequential', 'hedged', 'race'])
+def test_deadline_falls_back_to_the_local_responder(knowledge_base, strategy):
+    pipeline = make_pipeline(knowledge_base, strategy, (1.0, "from groq"), (1.0, "from hf"), hedge_delay=0.05)
+    response, source, took = ask(pipeline, deadline=0.2)
+    assert source == "AI Service"
+    assert response == pipeline.ai_service.get_free_ai_response("tell me about tides")
+    assert took < 0.5
+    assert all(stub.cancelled for name, stub in pipeline.stubs.items() if name in pipeline.started)
@@ -0,0 +1,95 @@
+"""
+Tests for the WebSocket chat channel: the per-process cap and the idle close
+"""
+
+import base64
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+
+import pytest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+pytest.importorskip('flask_sock')
+os.environ.setdefault('SESSION_STORE_PATH', '')
+
+from werkzeug.serving import make_server
+
+import web_app
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(web_app, 'websocket_slots', threading.BoundedSemaphore(1))
+    monkeypatch.setattr(web_app, 'WEBSOCKET_IDLE_TIMEOUT', 0.5)
+    httpd = make_server('127.0.0.1', 0, web_app.app, threaded=True)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_port
+    httpd.shutdown()
+    thread.join()
+
+
+def open_socket(port):
+    """Connect and complete the handshake; returns the socket and the bytes read past it"""
+    sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+    key = base64.b64encode(os.urandom(16)).decode()
+    sock.sendall((f"GET /chat/ws HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\n"
+                  f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode())
+    data = b''
+    while b'\r\n\r\n' not in data:
+        data += sock.recv(4096)
+    head, rest = data.split(b'\r\n\r\n', 1)
+    assert head.startswith(b'HTTP/1.1 101')
+    return sock, rest
+
+
+def read_frame(sock, buffered):
+    """(opcode, payload, rest) of the next unmasked server frame"""
+    data = buffered
+    while True:
+        if len(data) >= 2:
+            length, offset = data[1] & 0x7f, 2
+            if length == 126:
+                length, offset = (struct.unpack('!H', data[2:4])[0], 4) if len(data) >= 4 else (None, 0)
+            if length is not None and len(data) >= offset + length:
+                return data[0] & 0x0f, data[offset:offset + length], data[offset + length:]
+        chunk = sock.recv(4096)
+        assert chunk, "connection closed without a close frame"
+        data += chunk
+
+
+def test_session_then_idle_close(server):
+    sock, rest = open_socket(server)
+    opcode, payload, rest = read_frame(sock, rest)
+    assert opcode == 1 and json.loads(payload)['type'] == 'session'
+    opcode, payload, rest = read_frame(sock, rest)
+    assert opcode == 8 and struct.unpack('!H', payload[:2])[0] == 1000
+    sock.close()
+
+
+def test_refused_over_the_cap(server):
+    first, rest = open_socket(server)
+    opcode, payload, rest = read_frame(first, rest)
+    assert json.loads(payload)['type'] == 'session'
+
+    second, extra = open_socket(server)
+    opcode, payload, _ = read_frame(second, extra)
+    assert opcode == 8 and struct.unpack('!H', payload[:2])[0] == 1013
+    second.close()
+
+    # The slot is free again once the first socket is closed for idling
+    opcode, payload, _ = read_frame(first, rest)
+    assert opcode == 8
+    first.close()
+    assert web_app.websocket_slots.acquire(timeout=2)
+    web_app.websocket_slots.release()
+    third, extra = open_socket(server)
+    opcode, payload, _ = read_frame(third, extra)
+    assert opcode == 1 and json.loads(payload)['type'] == 'session'
+    third.close()
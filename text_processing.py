@@ -0,0 +1,118 @@
+"""
+Fast text preprocessing for the knowledge base
+
+A built-in tokenizer and stop-word list that reproduce NLTK's results on
+normalized (lowercase, punctuation-free) text, and a precomputed lemma table
+limited to the vocabulary of the knowledge base, so matching does not need to
+load NLTK or WordNet per process. NLTK is only used, when installed, to compute
+the lemma table at compile time and as an optional fallback for other words.
+"""
+
+import re
+
+# Bump when preprocessing changes, so compiled indexes are rebuilt
+PREPROCESSING_VERSION = 'fast-1'
+
+PUNCTUATION = re.compile(r'[^\w\s]')
+
+# NLTK's English stop-word list
+ENGLISH_STOP_WORDS = frozenset([
+    'i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'ourselves', 'you', "you're", "you've", "you'll",
+    "you'd", 'your', 'yours', 'yourself', 'yourselves', 'he', 'him', 'his', 'himself', 'she', "she's",
+    'her', 'hers', 'herself', 'it', "it's", 'its', 'itself', 'they', 'them', 'their', 'theirs',
+    'themselves', 'what', 'which', 'who', 'whom', 'this', 'that', "that'll", 'these', 'those', 'am',
+    'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'having', 'do', 'does',
+    'did', 'doing', 'a', 'an', 'the', 'and', 'but', 'if', 'or', 'because', 'as', 'until', 'while',
+    'of', 'at', 'by', 'for', 'with', 'about', 'against', 'between', 'into', 'through', 'during',
+    'before', 'after', 'above', 'below', 'to', 'from', 'up', 'down', 'in', 'out', 'on', 'off', 'over',
+    'under', 'again', 'further', 'then', 'once', 'here', 'there', 'when', 'where', 'why', 'how',
+    'all', 'any', 'both', 'each', 'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not',
+    'only', 'own', 'same', 'so', 'than', 'too', 'very', 's', 't', 'can', 'will', 'just', 'don',
+    "don't", 'should', "should've", 'now', 'd', 'll', 'm', 'o', 're', 've', 'y', 'ain', 'aren',
+    "aren't", 'couldn', "couldn't", 'didn', "didn't", 'doesn', "doesn't", 'hadn', "hadn't", 'hasn',
+    "hasn't", 'haven', "haven't", 'isn', "isn't", 'ma', 'mightn', "mightn't", 'mustn', "mustn't",
+    'needn', "needn't", 'shan', "shan't", 'shouldn', "shouldn't", 'wasn', "wasn't", 'weren',
+    "weren't", 'won', "won't", 'wouldn', "wouldn't"
+])
+
+# Contractions NLTK's word tokenizer splits even without apostrophes
+TOKEN_SPLITS = {
+    'cannot': ('can', 'not'),
+    'gimme': ('gim', 'me'),
+    'gonna': ('gon', 'na'),
+    'gotta': ('got', 'ta'),
+    'lemme': ('lem', 'me'),
+    'wanna': ('wan', 'na'),
+}
+
+
+def normalize(text):
+    """Lowercase text and strip punctuation and special characters"""
+    return PUNCTUATION.sub('', text.lower())
+
+
+def fast_tokenize(text):
+    """Tokenize normalized text exactly like nltk.word_tokenize, without NLTK"""
+    tokens = []
+    for word in text.split():
+        split = TOKEN_SPLITS.get(word)
+        if split:
+            tokens.extend(split)
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def load_wordnet_lemmatizer():
+    """Return NLTK's WordNet lemmatizer with WordNet loaded, or None if NLTK or its data is missing"""
+    try:
+        from nltk.corpus import wordnet
+        from nltk.stem import WordNetLemmatizer
+        wordnet.ensure_loaded()
+        return WordNetLemmatizer()
+    except (ImportError, LookupError):
+        return None
+
+
+def noun_inflections(lemma):
+    """Surface forms WordNet's noun morphology reduces to lemma (the inverse of its suffix rules)"""
+    forms = {lemma + 's'}
+    if lemma.endswith(('s', 'x', 'z', 'ch', 'sh')):
+        forms.add(lemma + 'es')
+    if lemma.endswith('man'):
+        forms.add(lemma[:-3] + 'men')
+    if lemma.endswith('y'):
+        forms.add(lemma[:-1] + 'ies')
+    if lemma.endswith('ful') and len(lemma) > 3:
+        forms.update(form + 'ful' for form in noun_inflections(lemma[:-3]))
+    return forms
+
+
+def build_lemma_table(vocabulary, lemmatizer=None):
+    """Map every surface form that lemmatizes into the vocabulary to its lemma
+
+    Without a lemmatizer, words are their own lemma (as when WordNet is missing).
+    """
+    if lemmatizer is None:
+        return {word: word for word in vocabulary}
+
+    from nltk.corpus import wordnet
+
+    lemmatize = lemmatizer.lemmatize
+    vocabulary_lemmas = {lemmatize(word) for word in vocabulary}
+
+    forms = set(vocabulary) | vocabulary_lemmas
+    for lemma in vocabulary_lemmas:
+        forms.update(noun_inflections(lemma))
+    # Irregular plurals such as geese -> goose
+    exceptions = getattr(wordnet, '_exception_map', {}).get('n', {})
+    for form, lemmas in exceptions.items():
+        if not vocabulary_lemmas.isdisjoint(lemmas):
+            forms.add(form)
+
+    table = {}
+    for form in forms:
+        lemma = lemmatize(form)
+        if form in vocabulary or lemma in vocabulary_lemmas:
+            table[form] = lemma
+    return table
@@ -1,21 +1,76 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, request, jsonify, render_template_string
+import gzip
+import hashlib
 import json
 import sys
 import os
+import threading
 from datetime import datetime
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+except ImportError:
+    Sock = ConnectionClosed = None
+
 # Add current directory to Python path
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(current_dir)
 
-from knowledge_base import KnowledgeBase
+from knowledge_base import ReloadingKnowledgeBase
 from ai_service import AIService
+from chat_pipeline import CHAT_IN_FLIGHT, ChatPipeline
+from session_store import SessionStore
+import metrics
 
 app = Flask(__name__)
+# WebSocket chat channel, when flask-sock is installed
+sock = Sock(app) if Sock is not None else None
 
 # Initialize chatbot components
-knowledge_base = KnowledgeBase()
+# Edits to knowledge_base.json are picked up without a restart
+knowledge_base = ReloadingKnowledgeBase()
 ai_service = AIService()
+# Provider calls of all request threads share one event loop
+pipeline = ChatPipeline(knowledge_base, ai_service)
+# Recent turns of each browser conversation, sent along with its next message
+sessions = SessionStore()
+started = datetime.now()
+
+def cache_values(attribute):
+    """An attribute of each enabled cache, as metric values by cache name"""
+    caches = {'response': ai_service.response_cache, 'semantic': pipeline.semantic_cache}
+    return {(name,): getattr(cache, attribute) for name, cache in caches.items() if cache is not None}
+
+def cache_hit_ratios():
+    hits, misses = cache_values('hits'), cache_values('misses')
+    return {name: hits[name] / (hits[name] + misses[name]) if hits[name] + misses[name] else 0.0 for name in hits}
+
+# Metrics read from the components when /metrics is scraped
+metrics.Counter('cache_hits_total', "Cache lookups answered, by cache", ['cache'], callback=lambda: cache_values('hits'))
+metrics.Counter('cache_misses_total', "Cache lookups not answered, by cache", ['cache'], callback=lambda: cache_values('misses'))
+metrics.Gauge('cache_hit_ratio', "Share of cache lookups answered since the process started", ['cache'], callback=cache_hit_ratios,
+              multiprocess_mode='all')
+metrics.Counter('provider_circuit_rejections_total', "Provider calls skipped by an open circuit breaker", ['provider'],
+                callback=lambda: {(name,): breaker.rejected for name, breaker in ai_service.breakers.items()})
+metrics.Gauge('provider_circuit_open', "1 while a provider's circuit breaker is open", ['provider'],
+              callback=lambda: {(name,): int(status['state'] == 'open') for name, status in ai_service.breaker_status().items()},
+              multiprocess_mode='max')
+metrics.Gauge('chat_sessions', "Web conversation sessions in memory", callback=lambda: {(): len(sessions)})
+metrics.Gauge('chat_sessions_bytes', "Estimated memory used by the sessions", callback=lambda: {(): sessions.bytes})
+WEBSOCKET_CONNECTIONS = metrics.Gauge('websocket_connections', "Open chat WebSocket connections")
+WEBSOCKET_REJECTED = metrics.Counter('websocket_rejected_total', "Chat WebSockets refused because all slots were taken")
+
+# Seconds a chat WebSocket may stay silent before it is closed; the page opens a new one with its next message
+WEBSOCKET_IDLE_TIMEOUT = float(os.getenv('WEBSOCKET_IDLE_TIMEOUT', '300'))
+# Open WebSockets per process at most. In a threaded worker each holds a thread, so
+# gunicorn.conf.py sets this below the thread count to leave threads for HTTP requests
+websocket_slots = threading.BoundedSemaphore(int(os.getenv('WEBSOCKET_MAX_CONNECTIONS', '100')))
 
 # HTML template for web interface
 HTML_TEMPLATE = """
@@ -166,6 +221,152 @@ HTML_TEMPLATE = """
     </div>
 
     <script>
+        // Given by the server with the first answer; ties the following messages to this conversation
+        let sessionId = null;
+
+        // One WebSocket per page, opened with the first message; null until then or after it closed
+        let socket = null;
+        let socketUnavailable = !window.WebSocket;
+        let nextRequestId = 1;
+        const pendingRequests = {};
+
+        function openSocket() {
+            // Resolves to an open WebSocket, or null if the server does not offer one
+            return new Promise(resolve => {
+                const scheme = location.protocol === 'https:' ? 'wss:' : 'ws:';
+                const query = sessionId ? '?session_id=' + encodeURIComponent(sessionId) : '';
+                const ws = new WebSocket(scheme + '//' + location.host + '/chat/ws' + query);
+                let opened = false;
+                ws.onopen = () => { opened = true; resolve(ws); };
+                ws.onmessage = event => {
+                    const data = JSON.parse(event.data);
+                    if (data.type === 'session') {
+                        sessionId = data.session_id;
+                    } else if (pendingRequests[data.id]) {
+                        pendingRequests[data.id].handle(data);
+                    }
+                };
+                ws.onclose = event => {
+                    if (!opened) {
+                        socketUnavailable = true;
+                        resolve(null);
+                        return;
+                    }
+                    // Closed when idle: the next message opens a new one. 1013: the server is
+                    // out of WebSocket slots, so this page uses HTTP from now on
+                    socket = null;
+                    if (event.code === 1013) socketUnavailable = true;
+                    // Unanswered requests fall back to HTTP
+                    Object.values(pendingRequests).forEach(request => request.abort());
+                };
+            });
+        }
+
+        async function socketMessage(message) {
+            // Send a message over the WebSocket and show the answer as it streams in; false if that failed
+            if (socketUnavailable) return false;
+            if (!socket) socket = await openSocket();
+            if (!socket) return false;
+
+            return new Promise(resolve => {
+                const id = nextRequestId++;
+                let botMessage = null;
+                const finish = result => {
+                    delete pendingRequests[id];
+                    resolve(result);
+                };
+                pendingRequests[id] = {
+                    handle(event) {
+                        if (event.type === 'typing') {
+                            showTypingIndicator();
+                            return;
+                        }
+                        if (!botMessage && (event.type === 'chunk' || event.type === 'done')) {
+                            hideTypingIndicator();
+                            botMessage = addStreamingMessage();
+                        }
+                        if (event.type === 'chunk') {
+                            botMessage.append(event.text);
+                            botMessage.setSource(event.source);
+                        } else if (event.type === 'done') {
+                            botMessage.setSource(event.source);
+                            sessionId = event.session_id || sessionId;
+                            finish(true);
+                        } else if (event.type === 'error') {
+                            finish(botMessage !== null);
+                        }
+                    },
+                    abort() {
+                        finish(botMessage !== null);
+                    }
+                };
+                socket.send(JSON.stringify({ type: 'message', id: id, message: message }));
+            });
+        }
+
+        function addStreamingMessage() {
+            // Bot message whose text and source tag are filled in as the answer streams in
+            const messagesContainer = document.getElementById('messages');
+            const messageDiv = document.createElement('div');
+            messageDiv.className = 'message bot-message';
+            messageDiv.innerHTML = '<strong>ChatBot:</strong> <span></span><div class="source-tag"></div>';
+            messagesContainer.appendChild(messageDiv);
+            return {
+                append(text) {
+                    messageDiv.querySelector('span').textContent += text;
+                    messagesContainer.scrollTop = messagesContainer.scrollHeight;
+                },
+                setSource(source) {
+                    messageDiv.querySelector('.source-tag').textContent = source;
+                }
+            };
+        }
+
+        async function streamMessage(message) {
+            // Read server-sent events from /chat/stream; returns false if no answer arrived
+            const response = await fetch('/chat/stream', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ message: message, session_id: sessionId })
+            });
+            if (!response.ok || !response.body) return false;
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let botMessage = null;
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                let boundary;
+                while ((boundary = buffer.indexOf('\\n\\n')) !== -1) {
+                    const frame = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+                    const dataLine = frame.split('\\n').find(line => line.startsWith('data: '));
+                    if (!dataLine) continue;
+                    const event = JSON.parse(dataLine.slice(6));
+                    if (event.type === 'error') {
+                        // Before any chunk, the caller falls back to /chat
+                        reader.cancel();
+                        return botMessage !== null;
+                    }
+                    if (!botMessage && (event.type === 'chunk' || event.type === 'done')) {
+                        hideTypingIndicator();
+                        botMessage = addStreamingMessage();
+                    }
+                    if (event.type === 'chunk') {
+                        botMessage.append(event.text);
+                        botMessage.setSource(event.source);
+                    } else if (event.type === 'done') {
+                        botMessage.setSource(event.source);
+                        sessionId = event.session_id || sessionId;
+                    }
+                }
+            }
+            return botMessage !== null;
+        }
+
         function addMessage(content, isUser = false, source = '') {
             const messagesContainer = document.getElementById('messages');
             const messageDiv = document.createElement('div');
@@ -208,15 +409,30 @@ HTML_TEMPLATE = """
             showTypingIndicator();
             
             try {
+                try {
+                    if (await socketMessage(message)) return;
+                } catch (error) {
+                    console.error('WebSocket failed, using HTTP:', error);
+                }
+
+                if (window.ReadableStream && window.TextDecoder) {
+                    try {
+                        if (await streamMessage(message)) return;
+                    } catch (error) {
+                        console.error('Streaming failed, retrying without:', error);
+                    }
+                }
+
                 const response = await fetch('/chat', {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json',
                     },
-                    body: JSON.stringify({ message: message })
+                    body: JSON.stringify({ message: message, session_id: sessionId })
                 });
                 
                 const data = await response.json();
+                sessionId = data.session_id || sessionId;
                 
                 // Hide typing indicator
                 hideTypingIndicator();
@@ -246,30 +462,63 @@ HTML_TEMPLATE = """
 </html>
 """
 
-def get_response(user_input):
+# Seconds browsers may reuse the page without asking again; afterwards they revalidate with its ETag
+INDEX_MAX_AGE = int(os.getenv('WEB_INDEX_MAX_AGE', '300'))
+
+def build_page_variants(html):
+    """The page body per content encoding, precompressed, with a strong ETag for each"""
+    body = html.encode('utf-8')
+    variants = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=11)
+    # Each encoding is a different representation, so it needs its own ETag
+    return {
+        encoding: (data, '"%s"' % hashlib.sha256(data).hexdigest()[:32])
+        for encoding, data in variants.items()
+    }
+
+# The template has no variables, so it is rendered once
+with app.app_context():
+    INDEX_VARIANTS = build_page_variants(render_template_string(HTML_TEMPLATE))
+
+def preferred_encoding(variants):
+    """The smallest encoding of the page that the client accepts"""
+    for encoding in ('br', 'gzip'):
+        if encoding in variants and request.accept_encodings[encoding]:
+            return encoding
+    return 'identity'
+
+def get_response(user_input, history=None):
     """Get the best available response for user input"""
-    
-    # First, try AI services if available
-    ai_response = ai_service.get_groq_response(user_input)
-    if ai_response:
-        return ai_response, "Groq"
-    
-    ai_response = ai_service.get_huggingface_response(user_input)
-    if ai_response:
-        return ai_response, "Hugging Face"
-    
-    ai_response = ai_service.get_free_ai_response(user_input)
-    if ai_response:
-        return ai_response, "AI Service"
-    
-    # Fall back to knowledge base
-    kb_response = knowledge_base.get_response(user_input)
-    return kb_response, "Knowledge Base"
+    return pipeline.get_response(user_input, history=history)
+
+# Messages that exercise the local responders when a worker warms up
+WARM_UP_MESSAGES = ["Hello there!", "What can you help me with?", "Can you calculate 15 + 25?", "What is Python?"]
+
+def warm_up():
+    """Prepare a server process for traffic: start the event loop, touch the indexes, render the page"""
+    pipeline.get_loop()
+    for message in WARM_UP_MESSAGES:
+        # The local responders only: no API calls, nothing logged
+        knowledge_base.get_response(message)
+        ai_service.get_free_ai_response(message)
+    app.test_client().get('/')
 
 @app.route('/')
 def index():
-    """Serve the main chat interface"""
-    return render_template_string(HTML_TEMPLATE)
+    """Serve the main chat interface, precompressed and revalidated by ETag"""
+    encoding = preferred_encoding(INDEX_VARIANTS)
+    body, etag = INDEX_VARIANTS[encoding]
+    headers = {
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={INDEX_MAX_AGE}',
+        'Vary': 'Accept-Encoding'
+    }
+    if request.if_none_match.contains_weak(etag.strip('"')):
+        return Response(status=304, headers=headers)
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return Response(body, mimetype='text/html', headers=headers)
 
 @app.route('/chat', methods=['POST'])
 def chat():
@@ -281,12 +530,15 @@ def chat():
         if not user_message:
             return jsonify({'error': 'No message provided'}), 400
         
-        # Get response from chatbot
-        response, source = get_response(user_message)
+        # Get response from chatbot, in the context of the conversation so far
+        session_id = sessions.session_id(data.get('session_id'))
+        response, source = get_response(user_message, history=sessions.history(session_id))
+        sessions.add_exchange(session_id, user_message, response)
         
         return jsonify({
             'response': response,
             'source': source,
+            'session_id': session_id,
             'timestamp': datetime.now().isoformat()
         })
         
@@ -297,21 +549,135 @@ def chat():
             'error': str(e)
         }), 500
 
+@app.route('/chat/stream', methods=['GET', 'POST'])
+def chat_stream():
+    """Stream the answer to a chat message as server-sent events"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+    else:
+        data = request.args
+    user_message = data.get('message', '')
+    
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+    session_id = sessions.session_id(data.get('session_id'))
+    history = sessions.history(session_id)
+    
+    def events():
+        try:
+            for event in pipeline.stream_response(user_message, history=history):
+                event['timestamp'] = datetime.now().isoformat()
+                if event['type'] == 'done':
+                    sessions.add_exchange(session_id, user_message, event['response'])
+                    event['session_id'] = session_id
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        except Exception as e:
+            error = {'type': 'error', 'error': str(e)}
+            yield f"event: error\ndata: {json.dumps(error)}\n\n"
+    
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def chat_socket(ws):
+    """WebSocket chat channel: one connection per page, carrying all its messages
+    
+    Client -> server: {"type": "message", "id": ..., "message": ...}
+    Server -> client: {"type": "session", "session_id": ...} once, then per message
+    {"type": "typing"}, {"type": "chunk", ...} events and a {"type": "done", ...}
+    (or {"type": "error", ...}) event, all carrying the message's id.
+    
+    The server closes a connection idle for WEBSOCKET_IDLE_TIMEOUT seconds, and
+    refuses one with code 1013 when this process has no WebSocket slot left.
+    """
+    if not websocket_slots.acquire(blocking=False):
+        WEBSOCKET_REJECTED.inc()
+        ws.close(reason=1013, message='Too many WebSocket connections, use HTTP')
+        return
+    session_id = sessions.session_id(request.args.get('session_id'))
+    WEBSOCKET_CONNECTIONS.inc()
+    try:
+        ws.send(json.dumps({'type': 'session', 'session_id': session_id}))
+        while True:
+            # Raises ConnectionClosed when the client goes away, which ends the handler
+            data = ws.receive(timeout=WEBSOCKET_IDLE_TIMEOUT)
+            if data is None:
+                ws.close(reason=1000, message='Idle timeout')
+                return
+            try:
+                request_data = json.loads(data)
+                request_id = request_data.get('id')
+                user_message = request_data.get('message', '')
+            except (ValueError, TypeError, AttributeError):
+                ws.send(json.dumps({'type': 'error', 'error': 'Invalid JSON message'}))
+                continue
+            if not user_message:
+                ws.send(json.dumps({'type': 'error', 'id': request_id, 'error': 'No message provided'}))
+                continue
+            
+            ws.send(json.dumps({'type': 'typing', 'id': request_id}))
+            try:
+                for event in pipeline.stream_response(user_message, history=sessions.history(session_id)):
+                    event['id'] = request_id
+                    event['timestamp'] = datetime.now().isoformat()
+                    if event['type'] == 'done':
+                        sessions.add_exchange(session_id, user_message, event['response'])
+                        event['session_id'] = session_id
+                    ws.send(json.dumps(event))
+            except ConnectionClosed:
+                raise
+            except Exception as e:
+                ws.send(json.dumps({'type': 'error', 'id': request_id, 'error': str(e)}))
+    finally:
+        WEBSOCKET_CONNECTIONS.dec()
+        websocket_slots.release()
+
+if sock is not None:
+    sock.route('/chat/ws')(chat_socket)
+
 @app.route('/health')
 def health():
-    """Health check endpoint"""
+    """Health check endpoint: the state of each responder"""
+    breakers = ai_service.breaker_status()
+    configured = {'groq': ai_service.groq_enabled(), 'huggingface': ai_service.huggingface_enabled()}
+    services = {
+        'knowledge_base': 'active' if knowledge_base.data else 'empty',
+        # The rule-based responder is local and always available
+        'ai_service': 'active'
+    }
+    for name, enabled in configured.items():
+        if not enabled:
+            services[name] = 'not_configured'
+        else:
+            services[name] = 'unavailable' if breakers[name]['state'] == 'open' else 'active'
+    # Still answering, but only from the local responders
+    degraded = services['knowledge_base'] != 'active' or (
+        any(configured.values()) and all(services[name] == 'unavailable' for name in configured if configured[name])
+    )
+    
     return jsonify({
-        'status': 'healthy',
+        'status': 'degraded' if degraded else 'healthy',
         'timestamp': datetime.now().isoformat(),
-        'services': {
-            'knowledge_base': 'active',
-            'ai_service': 'active'
-        }
+        'uptime_seconds': round((datetime.now() - started).total_seconds()),
+        'services': services,
+        # Server processes answering requests, and their messages in flight
+        'workers': metrics.process_count(),
+        'requests_in_flight': int(sum(metrics.current_values(CHAT_IN_FLIGHT).values())),
+        # Circuit breaker per AI provider: closed (working), open (skipped) or half_open (probing)
+        'providers': breakers,
+        'sessions': sessions.stats()
     })
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Metrics in the Prometheus text format, totalled over the server processes (see metrics.py)"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 if __name__ == '__main__':
     print("🚀 Starting AI ChatBot Web Interface...")
     print("📱 Open your browser and go to: http://localhost:5000")
     print("🛑 Press Ctrl+C to stop the server")
+    print("🏭 For production, run: gunicorn web_app:app")
     
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file